@@ -0,0 +1,75 @@
+"""Compares reading the spectra of a mzMLb file with `ChunkedMzMLb` and pyteomics' `MzMLb`.
+
+The spectra are read like the search reads them: by ID, with the peak arrays
+decoded on access. Requires `h5py`.
+
+Run from the repository root with `python -m benchmarks.mzmlb_benchmark`.
+"""
+
+# std imports
+import argparse
+import tempfile
+import timeit
+from functools import partial
+from pathlib import Path
+from typing import List, Type
+
+# external imports
+from pyteomics.mzmlb import MzMLb
+
+from benchmarks.synthetic import write_analytes, write_mzmlb
+from macdii.mzmlb_reader import ChunkedMzMLb
+
+
+def read_spectra(reader_class: Type[MzMLb], mzmlb_path: Path, ids: List[str]) -> None:
+    """Read the given spectra and decode their peak arrays."""
+    with reader_class(str(mzmlb_path), decode_binary=False) as reader:
+        for spectrum_id in ids:
+            spectrum = reader.get_by_id(spectrum_id)
+            spectrum["m/z array"].decode()
+            spectrum["intensity array"].decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--spectra", type=int, default=20000, help="Number of spectra of the file."
+    )
+    parser.add_argument(
+        "--peaks", type=int, default=200, help="Number of peaks per spectrum."
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_path = Path(tmp_dir)
+        analytes = write_analytes(tmp_path.joinpath("analytes.tsv"), 500)
+        mzmlb_path = tmp_path.joinpath("synthetic.mzMLb")
+        write_mzmlb(mzmlb_path, analytes, spectra=args.spectra, peaks=args.peaks)
+        with MzMLb(str(mzmlb_path)) as reader:
+            ids = list(reader.index["spectrum"].keys())
+
+        print("spectra\tpyteomics_s\tchunked_s\tspeedup")
+        # All spectra and the middle half, like a retention time window
+        for window in (ids, ids[len(ids) // 4 : len(ids) * 3 // 4]):
+            pyteomics_time = min(
+                timeit.repeat(
+                    partial(read_spectra, MzMLb, mzmlb_path, window),
+                    number=1,
+                    repeat=3,
+                )
+            )
+            chunked_time = min(
+                timeit.repeat(
+                    partial(read_spectra, ChunkedMzMLb, mzmlb_path, window),
+                    number=1,
+                    repeat=3,
+                )
+            )
+            print(
+                f"{len(window)}\t{pyteomics_time:.2f}\t{chunked_time:.2f}\t"
+                f"{pyteomics_time / chunked_time:.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Measures the throughput of the MaCDII pipeline on synthetic PRM data.
+
+Reports wall and CPU time of each stage (loading the analytes, parsing, searching, writing the matches,
+quantification, writing the quantification) and spectra per second, followed by a
+full `python -m macdii` run in a child process with its wall time and peak RSS.
+
+Run from the repository root with `python -m benchmarks.pipeline_benchmark --help`.
+"""
+
+# std imports
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+# external imports
+from pyteomics.mzml import read as read_mzml
+
+from benchmarks.synthetic import add_arguments, write_dataset
+from macdii.analyte_match import AnalyteMatch, MatchTable
+from macdii.analyte_quantification import AnalyteQuantification
+from macdii.analyte_table import AnalyteTable
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzmls
+
+RT_START = 0.0
+RT_STOP = 1e9
+PRECURSOR_TOLERANCE = 10.0
+FRAGMENT_TOLERANCE = 100.0
+
+
+def measure(function: Callable[[], Any], repeat: int) -> Tuple[float, float, Any]:
+    """Best wall and CPU time in seconds of multiple calls and the result of the last call."""
+    best_wall = best_cpu = float("inf")
+    result = None
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        result = function()
+        best_wall = min(best_wall, time.perf_counter() - wall_start)
+        best_cpu = min(best_cpu, time.process_time() - cpu_start)
+    return best_wall, best_cpu, result
+
+
+def run_main(main_args: List[str]) -> Tuple[float, float, float]:
+    """
+    Run `python -m macdii` in a child process.
+
+    Returns
+    -------
+    Tuple[float, float, float]
+        Wall time and CPU time in seconds and peak RSS in MiB of the child process.
+    """
+    wall_start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "macdii", *main_args])
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - wall_start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"MaCDII failed with exit code {process.returncode}")
+    # `ru_maxrss` is in KiB on Linux and in bytes on macOS
+    peak_rss = usage.ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+    return wall, usage.ru_utime + usage.ru_stime, peak_rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_arguments(parser)
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=None,
+        help="Folder for the synthetic data and results, a temporary folder if omitted.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Repetitions per stage, the best is reported.",
+    )
+    parser.add_argument(
+        "--main-args",
+        type=str,
+        default="",
+        help="Additional arguments for the full MaCDII run, e.g. '--jobs 4 --stream'.",
+    )
+    parser.add_argument(
+        "--json",
+        type=Path,
+        default=None,
+        help="Also write the results to this JSON file, e.g. to compare runs.",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir if args.data_dir is not None else Path(tmp_dir)
+        analytes_path, mzml_paths = write_dataset(data_dir, args)
+        output_dir = data_dir.joinpath("results")
+        output_dir.mkdir(exist_ok=True)
+        spectra = args.files * args.spectra
+
+        def load_analytes():
+            with analytes_path.open("r", encoding="utf-8") as analytes_file:
+                return AnalyteTable.from_tsv(
+                    analytes_file,
+                    PRECURSOR_TOLERANCE,
+                    PRECURSOR_TOLERANCE,
+                    FRAGMENT_TOLERANCE,
+                    FRAGMENT_TOLERANCE,
+                )
+
+        def parse():
+            for mzml_path in mzml_paths:
+                for _ in read_mzml(str(mzml_path)):
+                    pass
+
+        def search():
+            matches = MatchTable(analytes)
+            for table in search_mzmls(
+                mzml_paths, precursor_index, fragment_matcher, RT_START, RT_STOP
+            ):
+                matches.extend(table)
+            return matches
+
+        results: Dict[str, Dict[str, float]] = {}
+        wall, cpu, analytes = measure(load_analytes, args.repeat)
+        results["load_analytes"] = {"wall_s": wall, "cpu_s": cpu}
+        precursor_index = PrecursorIndex(analytes)
+        fragment_matcher = FragmentMatcher(analytes)
+        wall, cpu, _ = measure(parse, args.repeat)
+        results["parse"] = {"wall_s": wall, "cpu_s": cpu}
+        wall, cpu, matches = measure(search, args.repeat)
+        results["search"] = {"wall_s": wall, "cpu_s": cpu}
+        wall, cpu, _ = measure(
+            lambda: AnalyteMatch.to_file(
+                output_dir.joinpath("quanitfier_matches.tsv"), matches
+            ),
+            args.repeat,
+        )
+        results["write_matches"] = {"wall_s": wall, "cpu_s": cpu}
+        wall, cpu, quantifications = measure(
+            lambda: AnalyteQuantification.from_matches(matches), args.repeat
+        )
+        results["quantification"] = {"wall_s": wall, "cpu_s": cpu}
+        wall, cpu, _ = measure(
+            lambda: AnalyteQuantification.to_file(
+                output_dir.joinpath("quantification.tsv"), quantifications
+            ),
+            args.repeat,
+        )
+        results["write_quantification"] = {"wall_s": wall, "cpu_s": cpu}
+
+        best_main = (float("inf"), 0.0, 0.0)
+        for _ in range(args.repeat):
+            best_main = min(
+                best_main,
+                run_main(
+                    [
+                        *shlex.split(args.main_args),
+                        str(RT_START),
+                        str(RT_STOP),
+                        str(PRECURSOR_TOLERANCE),
+                        str(PRECURSOR_TOLERANCE),
+                        str(FRAGMENT_TOLERANCE),
+                        str(FRAGMENT_TOLERANCE),
+                        str(analytes_path),
+                        str(output_dir),
+                        *(str(mzml_path) for mzml_path in mzml_paths),
+                    ]
+                ),
+            )
+        results["main"] = {
+            "wall_s": best_main[0],
+            "cpu_s": best_main[1],
+            "peak_rss_mib": best_main[2],
+        }
+
+    print(f"spectra: {spectra}, matches: {len(matches)}")
+    print("stage\twall_s\tcpu_s\tspectra_per_s")
+    for stage, result in results.items():
+        result["spectra_per_s"] = spectra / result["wall_s"]
+        print(
+            f"{stage}\t{result['wall_s']:.3f}\t{result['cpu_s']:.3f}\t"
+            f"{result['spectra_per_s']:.0f}"
+        )
+    print(f"main peak RSS: {results['main']['peak_rss_mib']:.1f} MiB")
+
+    if args.json is not None:
+        args.json.write_text(
+            json.dumps(
+                {
+                    "parameters": {
+                        key: str(value) if isinstance(value, Path) else value
+                        for key, value in vars(args).items()
+                    },
+                    "spectra": spectra,
+                    "matches": len(matches),
+                    "stages": results,
+                },
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+
+
+if __name__ == "__main__":
+    main()
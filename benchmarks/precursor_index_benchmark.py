@@ -0,0 +1,83 @@
+"""Compares the precursor lookup via `PrecursorIndex` with testing every analyte.
+
+Run with `python benchmarks/precursor_index_benchmark.py`.
+"""
+
+# std imports
+import argparse
+import random
+import timeit
+from functools import partial
+from typing import List
+
+from macdii.analyte import Analyte
+from macdii.precursor_index import PrecursorIndex
+
+
+def random_analytes(size: int, rng: random.Random, tolerance: float) -> list:
+    """Create random analytes with precursors in a typical lipid m/z range."""
+    return [
+        Analyte(
+            f"analyte{idx}",
+            rng.uniform(200.0, 1000.0),
+            rng.uniform(50.0, 200.0),
+            rng.uniform(50.0, 200.0),
+            tolerance,
+            tolerance,
+            20,
+            20,
+        )
+        for idx in range(size)
+    ]
+
+
+def linear_lookup(analytes: List[Analyte], queries: List[float]) -> None:
+    """Test every analyte for each query."""
+    for mz in queries:
+        [analyte for analyte in analytes if analyte.precursor_contains(mz)]
+
+
+def indexed_lookup(index: PrecursorIndex, queries: List[float]) -> None:
+    """Look up the candidates of each query in the index."""
+    for mz in queries:
+        index.candidates(mz)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[100, 1000, 5000, 20000],
+        help="Library sizes to benchmark.",
+    )
+    parser.add_argument(
+        "--queries", type=int, default=2000, help="Precursor m/z lookups per size."
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=10.0, help="Precursor tolerance in ppm."
+    )
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print("library_size\tlinear_us_per_query\tindex_us_per_query\tspeedup")
+    for size in args.sizes:
+        analytes = random_analytes(size, rng, args.tolerance)
+        queries = [rng.uniform(200.0, 1000.0) for _ in range(args.queries)]
+        index = PrecursorIndex(analytes)
+
+        # Bound to the analytes and queries of this size
+        linear = partial(linear_lookup, analytes, queries)
+        indexed = partial(indexed_lookup, index, queries)
+
+        linear_time = min(timeit.repeat(linear, number=1, repeat=3))
+        index_time = min(timeit.repeat(indexed, number=1, repeat=3))
+        print(
+            f"{size}\t{linear_time / args.queries * 1e6:.2f}\t"
+            f"{index_time / args.queries * 1e6:.2f}\t{linear_time / index_time:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
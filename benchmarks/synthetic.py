@@ -0,0 +1,420 @@
+"""Generates synthetic direct-infusion PRM mzML files and matching analyte TSVs.
+
+Each MS2 spectrum targets one analyte of the list (cycling through the list like a PRM
+method) and contains its quantifier and qualifier ions among random noise peaks.
+
+Run with `python benchmarks/synthetic.py --help`.
+"""
+
+# std imports
+import argparse
+import base64
+import zlib
+from functools import partial
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# external imports
+import numpy as np
+
+
+class SyntheticAnalyte(NamedTuple):
+    """Analyte as written into the analyte TSV."""
+
+    name: str
+    precursor_mz: float
+    quantifier_mz: float
+    qualifier_mz: float
+
+
+def write_analytes(path: Path, count: int, seed: int = 0) -> List[SyntheticAnalyte]:
+    """
+    Write an analyte TSV with random lipid-like m/z values.
+    Every 7th analyte has no qualifier (qualifier m/z 0.0).
+
+    Parameters
+    ----------
+    path : Path
+        TSV file path.
+    count : int
+        Number of analytes.
+    seed : int
+        Random seed, by default 0.
+
+    Returns
+    -------
+    List[SyntheticAnalyte]
+        Written analytes.
+    """
+    rng = np.random.default_rng(seed)
+    analytes = []
+    for idx in range(count):
+        precursor_mz = round(rng.uniform(200.0, 900.0), 4)
+        quantifier_mz = round(rng.uniform(60.0, precursor_mz), 4)
+        qualifier_mz = round(rng.uniform(60.0, precursor_mz), 4) if idx % 7 else 0.0
+        analytes.append(
+            SyntheticAnalyte(f"A{idx}", precursor_mz, quantifier_mz, qualifier_mz)
+        )
+    with path.open("w", encoding="utf-8") as tsv_file:
+        tsv_file.write("analyte\tprecursor_mz\tquantifier_mz\tqualifier_mz\n")
+        for analyte in analytes:
+            tsv_file.write("\t".join(str(value) for value in analyte) + "\n")
+    return analytes
+
+
+def write_mzml(
+    path: Path,
+    analytes: List[SyntheticAnalyte],
+    spectra: int = 2000,
+    peaks: int = 200,
+    ms1_every: int = 10,
+    compression: bool = True,
+    indexed: bool = True,
+    unsorted: bool = False,
+    minutes_per_scan: float = 0.01,
+    seed: int = 0,
+) -> None:
+    """
+    Write a synthetic PRM mzML file.
+
+    Parameters
+    ----------
+    path : Path
+        mzML file path.
+    analytes : List[SyntheticAnalyte]
+        Analytes targeted by the MS2 spectra, random precursors if empty.
+    spectra : int
+        Number of spectra, by default 2000.
+    peaks : int
+        Number of peaks per spectrum, by default 200.
+    ms1_every : int
+        Every n-th spectrum is a MS1 spectrum, by default 10. No MS1 spectra if < 1.
+    compression : bool
+        zlib compress the binary arrays, by default True.
+    indexed : bool
+        Write an indexed mzML with offset index, by default True.
+    unsorted : bool
+        Shuffle the peaks instead of sorting them by m/z, by default False.
+    minutes_per_scan : float
+        Scan start time difference of consecutive spectra, by default 0.01.
+    seed : int
+        Random seed, by default 0.
+    """
+    rng = np.random.default_rng(seed)
+    offsets: List[Tuple[str, int]] = []
+    with path.open("wb") as mzml_file:
+        if indexed:
+            mzml_file.write(
+                b'<?xml version="1.0" encoding="utf-8"?>\n'
+                b'<indexedmzML xmlns="http://psi.hupo.org/ms/mzml">\n'
+            )
+        else:
+            mzml_file.write(b'<?xml version="1.0" encoding="utf-8"?>\n')
+        mzml_file.write(
+            b'<mzML xmlns="http://psi.hupo.org/ms/mzml" version="1.1.0">\n'
+            b'<cvList count="2"><cv id="MS" fullName="PSI-MS" URI="https://purl.obolibrary.org/obo/ms.obo"/>'
+            b'<cv id="UO" fullName="Unit Ontology" URI="https://purl.obolibrary.org/obo/uo.obo"/></cvList>\n'
+            b'<run id="synthetic">\n' + f'<spectrumList count="{spectra}">\n'.encode()
+        )
+        for idx in range(spectra):
+            ms_level = 1 if ms1_every > 0 and idx % ms1_every == 0 else 2
+            target: Optional[SyntheticAnalyte] = None
+            if ms_level == 2 and len(analytes) > 0:
+                target = analytes[idx % len(analytes)]
+            spectrum_id = f"controllerType=0 controllerNumber=1 scan={idx + 1}"
+            offsets.append((spectrum_id, mzml_file.tell()))
+            mzml_file.write(
+                _spectrum(
+                    rng,
+                    idx,
+                    spectrum_id,
+                    ms_level,
+                    target,
+                    peaks,
+                    partial(_binary_array, compression=compression),
+                    unsorted,
+                    idx * minutes_per_scan,
+                )
+            )
+        mzml_file.write(b"</spectrumList>\n</run>\n</mzML>\n")
+        if indexed:
+            _write_index(mzml_file, offsets)
+
+
+def write_mzmlb(
+    path: Path,
+    analytes: List[SyntheticAnalyte],
+    spectra: int = 2000,
+    peaks: int = 200,
+    ms1_every: int = 10,
+    minutes_per_scan: float = 0.01,
+    seed: int = 0,
+) -> None:
+    """
+    Write a synthetic PRM mzMLb file, the mzML is stored in a HDF5 dataset and the
+    peaks of all spectra in one (zlib compressed) dataset per array type.
+    The spectra are the same as written by `write_mzml` with the same arguments.
+    Requires `h5py`.
+
+    Parameters
+    ----------
+    path : Path
+        mzMLb file path.
+    analytes : List[SyntheticAnalyte]
+        Analytes targeted by the MS2 spectra, random precursors if empty.
+    spectra : int
+        Number of spectra, by default 2000.
+    peaks : int
+        Number of peaks per spectrum, by default 200.
+    ms1_every : int
+        Every n-th spectrum is a MS1 spectrum, by default 10. No MS1 spectra if < 1.
+    minutes_per_scan : float
+        Scan start time difference of consecutive spectra, by default 0.01.
+    seed : int
+        Random seed, by default 0.
+    """
+    import h5py
+
+    rng = np.random.default_rng(seed)
+    arrays: Dict[str, List[np.ndarray]] = {}
+    array_lengths: Dict[str, int] = {}
+
+    def external_array(
+        array: np.ndarray, precision_param: str, array_param: str
+    ) -> str:
+        dataset = f"spectrum_MS_{array.dtype.name}"
+        offset = array_lengths.get(dataset, 0)
+        arrays.setdefault(dataset, []).append(array)
+        array_lengths[dataset] = offset + len(array)
+        return (
+            '<binaryDataArray encodedLength="0">'
+            f"{precision_param}"
+            '<cvParam cvRef="MS" accession="MS:1000576" name="no compression" value=""/>'
+            f"{array_param}"
+            '<cvParam cvRef="MS" accession="MS:1002841" name="external HDF5 dataset" '
+            f'value="{dataset}"/>'
+            '<cvParam cvRef="MS" accession="MS:1002842" name="external offset" '
+            f'value="{offset}"/>'
+            '<cvParam cvRef="MS" accession="MS:1002843" name="external array length" '
+            f'value="{len(array)}"/>'
+            "<binary></binary></binaryDataArray>"
+        )
+
+    xml = bytearray(
+        b'<?xml version="1.0" encoding="utf-8"?>\n'
+        b'<mzML xmlns="http://psi.hupo.org/ms/mzml" version="1.1.0">\n'
+        b'<cvList count="2"><cv id="MS" fullName="PSI-MS" URI="https://purl.obolibrary.org/obo/ms.obo"/>'
+        b'<cv id="UO" fullName="Unit Ontology" URI="https://purl.obolibrary.org/obo/uo.obo"/></cvList>\n'
+        b'<run id="synthetic">\n' + f'<spectrumList count="{spectra}">\n'.encode()
+    )
+    spectrum_ids: List[str] = []
+    offsets: List[int] = []
+    for idx in range(spectra):
+        ms_level = 1 if ms1_every > 0 and idx % ms1_every == 0 else 2
+        target: Optional[SyntheticAnalyte] = None
+        if ms_level == 2 and len(analytes) > 0:
+            target = analytes[idx % len(analytes)]
+        spectrum_id = f"controllerType=0 controllerNumber=1 scan={idx + 1}"
+        spectrum_ids.append(spectrum_id)
+        offsets.append(len(xml))
+        xml += _spectrum(
+            rng,
+            idx,
+            spectrum_id,
+            ms_level,
+            target,
+            peaks,
+            external_array,
+            False,
+            idx * minutes_per_scan,
+        )
+    offsets.append(len(xml))
+    xml += b"</spectrumList>\n</run>\n</mzML>\n"
+
+    with h5py.File(path, "w") as mzmlb_file:
+        mzmlb_file.create_dataset("mzML", data=np.frombuffer(xml, dtype=np.uint8))
+        mzmlb_file["mzML"].attrs["version"] = "mzMLb 1.0"
+        mzmlb_file.create_dataset("mzML_spectrumIndex", data=np.array(offsets))
+        mzmlb_file.create_dataset(
+            "mzML_spectrumIndex_idRef",
+            data=np.frombuffer(
+                b"".join(f"{spectrum_id}\0".encode() for spectrum_id in spectrum_ids),
+                dtype=np.uint8,
+            ),
+        )
+        mzmlb_file.create_dataset("mzML_chromatogramIndex", data=np.array([len(xml)]))
+        mzmlb_file.create_dataset(
+            "mzML_chromatogramIndex_idRef", data=np.zeros(0, dtype=np.uint8)
+        )
+        for dataset, dataset_arrays in arrays.items():
+            mzmlb_file.create_dataset(
+                dataset,
+                data=np.concatenate(dataset_arrays),
+                chunks=True,
+                compression="gzip",
+            )
+
+
+def _spectrum(
+    rng: np.random.Generator,
+    idx: int,
+    spectrum_id: str,
+    ms_level: int,
+    target: Optional[SyntheticAnalyte],
+    peaks: int,
+    binary_array: Callable[[np.ndarray, str, str], str],
+    unsorted: bool,
+    scan_start_time: float,
+) -> bytes:
+    """Create the XML of a single spectrum."""
+    mz_array = rng.uniform(50.0, 1000.0, peaks)
+    precursor_mz = rng.uniform(100.0, 1000.0)
+    if target is not None:
+        precursor_mz = target.precursor_mz * (1 + rng.uniform(-5e-6, 5e-6))
+        mz_array[0] = target.quantifier_mz + rng.uniform(-0.005, 0.005)
+        if target.qualifier_mz > 0.0 and peaks > 1:
+            mz_array[1] = target.qualifier_mz + rng.uniform(-0.005, 0.005)
+    if unsorted:
+        rng.shuffle(mz_array)
+    else:
+        mz_array.sort()
+    intensity_array = rng.uniform(1.0, 1e6, peaks).astype(np.float32)
+    xml = (
+        f'<spectrum index="{idx}" id="{spectrum_id}" defaultArrayLength="{peaks}">\n'
+        f'<cvParam cvRef="MS" accession="MS:1000511" name="ms level" value="{ms_level}"/>\n'
+        '<scanList count="1"><scan><cvParam cvRef="MS" accession="MS:1000016" '
+        f'name="scan start time" value="{scan_start_time}" unitCvRef="UO" '
+        'unitAccession="UO:0000031" unitName="minute"/></scan></scanList>\n'
+    )
+    if ms_level == 2:
+        xml += (
+            '<precursorList count="1"><precursor><selectedIonList count="1"><selectedIon>'
+            '<cvParam cvRef="MS" accession="MS:1000744" name="selected ion m/z" '
+            f'value="{precursor_mz}" unitCvRef="MS" unitAccession="MS:1000040" unitName="m/z"/>'
+            '<cvParam cvRef="MS" accession="MS:1000041" name="charge state" value="1"/>'
+            "</selectedIon></selectedIonList></precursor></precursorList>\n"
+        )
+    xml += (
+        '<binaryDataArrayList count="2">'
+        + binary_array(
+            mz_array,
+            '<cvParam cvRef="MS" accession="MS:1000523" name="64-bit float" value=""/>',
+            '<cvParam cvRef="MS" accession="MS:1000514" name="m/z array" value="" '
+            'unitCvRef="MS" unitAccession="MS:1000040" unitName="m/z"/>',
+        )
+        + binary_array(
+            intensity_array,
+            '<cvParam cvRef="MS" accession="MS:1000521" name="32-bit float" value=""/>',
+            '<cvParam cvRef="MS" accession="MS:1000515" name="intensity array" value="" '
+            'unitCvRef="MS" unitAccession="MS:1000131" unitName="number of detector counts"/>',
+        )
+        + "</binaryDataArrayList>\n</spectrum>\n"
+    )
+    return xml.encode()
+
+
+def _binary_array(
+    array: np.ndarray, precision_param: str, array_param: str, compression: bool
+) -> str:
+    """Create the XML of a binary data array."""
+    data = array.tobytes()
+    if compression:
+        data = zlib.compress(data)
+        compression_param = '<cvParam cvRef="MS" accession="MS:1000574" name="zlib compression" value=""/>'
+    else:
+        compression_param = '<cvParam cvRef="MS" accession="MS:1000576" name="no compression" value=""/>'
+    encoded = base64.b64encode(data).decode()
+    return (
+        f'<binaryDataArray encodedLength="{len(encoded)}">'
+        f"{precision_param}{compression_param}{array_param}"
+        f"<binary>{encoded}</binary></binaryDataArray>"
+    )
+
+
+def _write_index(mzml_file: BinaryIO, offsets: List[Tuple[str, int]]) -> None:
+    """Write the spectrum offset index and close the indexed mzML."""
+    index_offset = mzml_file.tell()
+    mzml_file.write(b'<indexList count="1">\n<index name="spectrum">\n')
+    mzml_file.writelines(
+        f'<offset idRef="{spectrum_id}">{offset}</offset>\n'.encode()
+        for spectrum_id, offset in offsets
+    )
+    mzml_file.write(b"</index>\n</indexList>\n")
+    mzml_file.write(
+        f"<indexListOffset>{index_offset}</indexListOffset>\n</indexedmzML>\n".encode()
+    )
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the arguments describing the synthetic data to a parser."""
+    parser.add_argument("--files", type=int, default=3, help="Number of mzML files.")
+    parser.add_argument(
+        "--spectra", type=int, default=2000, help="Number of spectra per mzML file."
+    )
+    parser.add_argument("--peaks", type=int, default=200, help="Peaks per spectrum.")
+    parser.add_argument(
+        "--ms1-every",
+        type=int,
+        default=10,
+        help="Every n-th spectrum is a MS1 spectrum, 0 for MS2 only.",
+    )
+    parser.add_argument("--analytes", type=int, default=300, help="Number of analytes.")
+    parser.add_argument(
+        "--no-compression",
+        action="store_true",
+        help="Write the binary arrays without zlib compression.",
+    )
+    parser.add_argument(
+        "--no-index", action="store_true", help="Write mzML files without offset index."
+    )
+
+
+def write_dataset(folder: Path, args: argparse.Namespace) -> Tuple[Path, List[Path]]:
+    """
+    Write an analyte TSV and mzML files as described by the parsed arguments.
+
+    Parameters
+    ----------
+    folder : Path
+        Output folder.
+    args : argparse.Namespace
+        Arguments added by `add_arguments`.
+
+    Returns
+    -------
+    Tuple[Path, List[Path]]
+        Analyte TSV and mzML files.
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    analytes_path = folder.joinpath("analytes.tsv")
+    analytes = write_analytes(analytes_path, args.analytes)
+    mzml_paths = []
+    for file_idx in range(args.files):
+        mzml_path = folder.joinpath(f"synthetic_{file_idx}.mzML")
+        write_mzml(
+            mzml_path,
+            analytes,
+            spectra=args.spectra,
+            peaks=args.peaks,
+            ms1_every=args.ms1_every,
+            compression=not args.no_compression,
+            indexed=not args.no_index,
+            seed=file_idx,
+        )
+        mzml_paths.append(mzml_path)
+    return analytes_path, mzml_paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output_folder", type=Path, help="Output folder.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    analytes_path, mzml_paths = write_dataset(args.output_folder, args)
+    print(analytes_path)
+    for mzml_path in mzml_paths:
+        print(mzml_path)
+
+
+if __name__ == "__main__":
+    main()
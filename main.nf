@@ -13,6 +13,9 @@ params.precursorToleranceUpper = 10
 params.fragmentToleranceLower = 20000 // 0.02 DA
 params.fragmentToleranceUpper = 20000 // 0.02 DA
 params.output_type = "tsv"
+// CPUs requested for searching each mzML file, large files are split into spectrum ranges
+// which are searched in parallel (`--jobs`)
+params.jobs = 1
 
 // Runtime parameters
 // Memory for the Thermo Raw File Parser, used 24 GB for a Raw file with 257409 MS scans
@@ -80,11 +83,16 @@ process convert_bruker_raw_folders {
     """
 }
 
-process macdaii {
-    publishDir params.resultsFolder, mode: 'move'
-
+/**
+ * Search the analytes in a single mzML file, as soon as it is available
+ * @params mzml_file mzML file
+ *
+ * @return Folder with the partial result (matches) of the mzML file
+ */
+process macdii_search {
     label "macdii_image"
-    cpus 1
+
+    cpus params.jobs
 
     input:
     val rt_start
@@ -94,7 +102,31 @@ process macdaii {
     val fragment_tolerance_lower
     val fragment_tolerance_upper
     path analytes
-    path mzml_files
+    path mzml_file
+
+    output:
+    path "${mzml_file.getName()}.partial"
+
+    script:
+    """
+    mkdir ${mzml_file.getName()}.partial
+    python -m macdii --output-type parquet --jobs ${task.cpus} ${rt_start} ${rt_end} ${precursor_tolerance_lower} ${precursor_tolerance_upper} ${fragment_tolerance_lower} ${fragment_tolerance_upper} ${analytes} ./${mzml_file.getName()}.partial ${mzml_file}
+    """
+}
+
+/**
+ * Merge the partial results of all mzML files and quantify the analytes
+ * @params partials Folders with the partial results, sorted by mzML file name
+ *
+ * @return Folder with the results
+ */
+process macdii_merge {
+    publishDir params.resultsFolder, mode: 'move'
+
+    label "macdii_image"
+
+    input:
+    path partials
 
     output:
     path "macdii_results"
@@ -102,7 +134,7 @@ process macdaii {
     script:
     """
     mkdir macdii_results
-    python -m macdii --output-type ${params.output_type} ${rt_start} ${rt_end} ${precursor_tolerance_lower} ${precursor_tolerance_upper} ${fragment_tolerance_lower} ${fragment_tolerance_upper} ${analytes} ./macdii_results ${mzml_files.join(' ')}
+    python -m macdii merge --output-type ${params.output_type} ./macdii_results ${partials}
     """
 }
 
@@ -116,16 +148,15 @@ workflow  {
 	// Collect bruker folder
 	bruker_raw_folders = Channel.fromPath(params.spectraFolder + "/*.d", type: 'dir')
 
-	// Collect mzmls
-    mzmls = Channel.fromPath(params.spectraFolder + "/*.mzML")
+	// Collect mzmls, compressed ones are decompressed while reading
+    mzmls = Channel.fromPath(params.spectraFolder + "/*.{mzML,mzML.gz,mzML.zst}")
 
     // Convert into open formats
     thermo_mzmls = convert_thermo_raw_files(thermo_raw_files)
     bruker_mzmls = convert_bruker_raw_folders(bruker_raw_folders)
 
-    mzmls = mzmls.concat(thermo_mzmls, bruker_mzmls).collect()
-
-    results = macdaii(
+    // Scatter: each mzML file is searched as soon as it is available (`mix` does not wait for a channel to complete)
+    partials = macdii_search(
         params.rtStart,
         params.rtEnd,
         params.precursorToleranceLower,
@@ -133,6 +164,11 @@ workflow  {
         params.fragmentToleranceLower,
         params.fragmentToleranceUpper,
         analytes,
-        mzmls
+        mzmls.mix(thermo_mzmls, bruker_mzmls)
+    )
+
+    // Gather: merge in order of the file names, so the results do not depend on the task order
+    results = macdii_merge(
+        partials.collect(sort: { a, b -> a.getName() <=> b.getName() })
     )
 }
@@ -1,14 +1,17 @@
 """Mass Centric Direct Infusion Inspector for searching targeted m/z in mzML files.
 """
-from typing import List, Optional
+import signal
+import threading
+from argparse import Namespace
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Iterable, List, Optional
 
-from pyteomics.mzml import read as read_mzml
-
-from macdii.analyte import Analyte
-from macdii.analyte_match import AnalyteMatch, Peak, Precursor
-from macdii.analyte_quantification import AnalyteQuantification
 from macdii.cli import Cli
-from macdii.utils import time_to_seconds
+from macdii.metrics import Clock, Metrics, clock, stage
+
+# The modules of each command are imported after parsing the arguments,
+# so `--help` and argument errors do not wait for NumPy, pandas and pyteomics.
 
 
 def main():
@@ -17,9 +20,45 @@ def main():
     # Parse command line arguments
     args = Cli().parse()
 
-    analytes = []
-    with open(args.analytes_file, "r", encoding="utf-8") as file:
-        analytes = Analyte.from_tsv(
+    if args.command == "watch":
+        watch(args)
+        return
+
+    metrics = Metrics() if args.metrics else None
+    start = clock()
+
+    if args.command == "merge":
+        merge(args, metrics)
+        finish_metrics(metrics, start, args.output_folder)
+        return
+
+    if args.sweep:
+        sweep(args, metrics)
+        finish_metrics(metrics, start, args.output_folder)
+        return
+
+    from macdii.analyte_match import DF_COLUMNS as MATCH_DF_COLUMNS
+    from macdii.analyte_match import DF_DTYPES as MATCH_DF_DTYPES
+    from macdii.analyte_match import AnalyteMatch, MatchTable
+    from macdii.analyte_quantification import (
+        AnalyteQuantification,
+        QuantificationMatrix,
+        RunningQuantification,
+    )
+    from macdii.analyte_table import AnalyteTable
+    from macdii.fragment_matcher import FragmentMatcher
+    from macdii.incremental import Manifest, run_parameters, search_incremental
+    from macdii.mzml_reader import mzml_name
+    from macdii.parallel import search_mzmls_parallel
+    from macdii.precursor_index import PrecursorIndex
+    from macdii.search import search_mzmls
+    from macdii.spill import SpillingMatchTable
+    from macdii.utils import open_table_writer
+
+    with stage(metrics, "load_analytes"), open(
+        args.analytes_file, "r", encoding="utf-8"
+    ) as file:
+        analytes = AnalyteTable.from_tsv(
             file,
             args.precursor_tol_lower,
             args.precursor_tol_upper,
@@ -27,80 +66,246 @@ def main():
             args.fragment_tol_upper,
         )
 
-    # Create dictionaries to store matches for precursors, quantifiers, and qualifiers
-    matching_fragments: List[AnalyteMatch] = []
-
-    # Iterate over all mzML files and open them
-    for mzml_path in args.mzml_paths:
-        with mzml_path.open("rb") as mzml_file:
-            mzml = read_mzml(mzml_file)
-            # Iterate over all spectra in the mzML file
-            for spectrum in mzml:
-                # Get scan start time and check if it is within the specified range
-                scan_start_time = time_to_seconds(
-                    spectrum["scanList"]["scan"][0]["scan start time"],
-                    spectrum["scanList"]["scan"][0]["scan start time"].unit_info,
+    def search_files(mzml_paths: List[Path]) -> Iterable[MatchTable]:
+        if args.jobs > 1:
+            return search_mzmls_parallel(
+                mzml_paths,
+                analytes,
+                args.rt_start,
+                args.rt_stop,
+                args.jobs,
+                args.spectra_per_task,
+                args.cache_dir,
+                metrics,
+                args.reader_threads,
+            )
+        return search_mzmls(
+            mzml_paths,
+            PrecursorIndex(analytes),
+            FragmentMatcher(analytes),
+            args.rt_start,
+            args.rt_stop,
+            cache_dir=args.cache_dir,
+            metrics=metrics,
+            reader_threads=args.reader_threads,
+        )
+
+    tables: Iterable[MatchTable]
+    if args.incremental:
+        # Only new or changed files are searched
+        manifest = Manifest(
+            args.output_folder,
+            run_parameters(
+                args.analytes_file,
+                args.rt_start,
+                args.rt_stop,
+                args.precursor_tol_lower,
+                args.precursor_tol_upper,
+                args.fragment_tol_lower,
+                args.fragment_tol_upper,
+            ),
+        )
+        tables = search_incremental(args.mzml_paths, analytes, manifest, search_files)
+    else:
+        tables = search_files(args.mzml_paths)
+    if metrics is not None:
+        # Time spent waiting for the next table, including the stages of each file
+        tables = metrics.timed("search", tables)
+
+    matches_path = args.output_folder.joinpath(
+        f"quanitfier_matches.{args.output_type}"
+    )
+    quantification_path = args.output_folder.joinpath(
+        f"quantification.{args.output_type}"
+    )
+
+    quantification_matrix = None
+    if args.quantification_matrix:
+        quantification_matrix = QuantificationMatrix(
+            analytes, [mzml_name(mzml_path) for mzml_path in args.mzml_paths]
+        )
+
+    if args.stream or args.memory_limit is not None:
+        with ExitStack() as exit_stack:
+            if not args.stream:
+                # Collect the matches first, beyond the limit they are spilled to disk
+                spilling_table = exit_stack.enter_context(
+                    SpillingMatchTable(
+                        analytes,
+                        int(args.memory_limit * 2**20),
+                        args.spill_dir or args.output_folder,
+                    )
                 )
-                if not args.rt_start <= scan_start_time <= args.rt_stop:
-                    continue
-
-                if spectrum["ms level"] != 2:
-                    continue
-
-                if len(spectrum["precursorList"])== 0:
-                    continue
-
-                precursor = Precursor(
-                    spectrum["precursorList"]["precursor"][0][
-                        "selectedIonList"
-                    ]["selectedIon"][0]["selected ion m/z"],
-                    spectrum["precursorList"]["precursor"][0][
-                        "selectedIonList"
-                    ]["selectedIon"][0]["charge state"],
+                for table in tables:
+                    spilling_table.extend(table)
+                if metrics is not None:
+                    metrics.count("spill_files", spilling_table.spill_count)
+                tables = spilling_table.tables()
+            # Write the matches part by part and quantify on the fly
+            running_quantification = RunningQuantification(analytes)
+            with open_table_writer(
+                matches_path, MATCH_DF_COLUMNS, MATCH_DF_DTYPES
+            ) as writer:
+                for table in tables:
+                    with stage(metrics, "write_matches"):
+                        writer.write_columns(table.output_columns())
+                    with stage(metrics, "quantification"):
+                        running_quantification.add_table(table)
+                        if quantification_matrix is not None:
+                            quantification_matrix.add_table(table)
+        with stage(metrics, "quantification"):
+            analyte_quantifications = running_quantification.quantifications()
+    else:
+        matching_fragments = MatchTable(analytes)
+        for table in tables:
+            matching_fragments.extend(table)
+
+        # Write the matches to TSV files
+        with stage(metrics, "write_matches"):
+            AnalyteMatch.to_file(matches_path, matching_fragments)
+
+        with stage(metrics, "quantification"):
+            analyte_quantifications = AnalyteQuantification.from_matches(
+                matching_fragments
+            )
+            if quantification_matrix is not None:
+                quantification_matrix.add_table(matching_fragments)
+
+    with stage(metrics, "write_quantification"):
+        AnalyteQuantification.to_file(quantification_path, analyte_quantifications)
+        if quantification_matrix is not None:
+            quantification_matrix.to_file(
+                args.output_folder.joinpath(
+                    f"quantification_matrix.{args.output_type}"
+                )
+            )
+
+    finish_metrics(metrics, start, args.output_folder)
+
+
+def merge(args: Namespace, metrics: Optional[Metrics]) -> None:
+    """Merge and quantify the matches of partial results."""
+    from macdii.analyte_match import AnalyteMatch
+    from macdii.analyte_quantification import (
+        AnalyteQuantification,
+        QuantificationMatrix,
+    )
+    from macdii.merge import read_partial_matches
+
+    with stage(metrics, "read_partials"):
+        matching_fragments = read_partial_matches(args.partials)
+
+    with stage(metrics, "write_matches"):
+        AnalyteMatch.to_file(
+            args.output_folder.joinpath(f"quanitfier_matches.{args.output_type}"),
+            matching_fragments,
+        )
+
+    with stage(metrics, "quantification"):
+        analyte_quantifications = AnalyteQuantification.from_matches(
+            matching_fragments
+        )
+        quantification_matrix = None
+        if args.quantification_matrix:
+            # Only files and analytes with matches are known
+            quantification_matrix = QuantificationMatrix(
+                matching_fragments.analytes, matching_fragments.filenames
+            )
+            quantification_matrix.add_table(matching_fragments)
+
+    with stage(metrics, "write_quantification"):
+        AnalyteQuantification.to_file(
+            args.output_folder.joinpath(f"quantification.{args.output_type}"),
+            analyte_quantifications,
+        )
+        if quantification_matrix is not None:
+            quantification_matrix.to_file(
+                args.output_folder.joinpath(
+                    f"quantification_matrix.{args.output_type}"
                 )
+            )
+
+
+def watch(args: Namespace) -> None:
+    """Search the mzML files of the watched folder as they are completely written."""
+    from macdii.analyte_table import AnalyteTable
+    from macdii.watch import FolderWatcher, LiveQuantification, watch_folder
+
+    with open(args.analytes_file, "r", encoding="utf-8") as file:
+        analytes = AnalyteTable.from_tsv(
+            file,
+            args.precursor_tol_lower,
+            args.precursor_tol_upper,
+            args.fragment_tol_lower,
+            args.fragment_tol_upper,
+        )
+
+    # Finish the current file on Ctrl+C or SIGTERM, e.g. when a service is stopped,
+    # so the outputs stay consistent
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stop.set())
+
+    with LiveQuantification(
+        analytes,
+        args.output_folder,
+        args.output_type,
+        args.rt_start,
+        args.rt_stop,
+        args.quantification_matrix,
+        args.reader_threads,
+    ) as live_quantification:
+        watch_folder(
+            FolderWatcher(args.watch_folder, args.settle_time),
+            live_quantification,
+            args.poll_interval,
+            args.idle_timeout,
+            stop,
+        )
 
-                # Check if any analyte matches on of the measured ions
-                for analyte in analytes:
-                    if not analyte.precursor_contains(precursor.mz):
-                        continue
-
-                    quantifier_peak: Optional[Peak] = None
-                    qualifier_peak: Optional[Peak] = None
-
-                    for ion_idx, ion in enumerate(spectrum["m/z array"]):
-                        if analyte.quantifier_contains(ion):
-                            quantifier_peak = Peak(
-                                ion,
-                                spectrum["intensity array"][ion_idx],
-                            )
-                        elif analyte.qualifier_contains(ion):
-                            qualifier_peak = Peak(
-                                ion,
-                                spectrum["intensity array"][ion_idx],
-                            )
-
-                    if quantifier_peak is not None:
-                        matching_fragments.append(
-                            AnalyteMatch(
-                                analyte,
-                                mzml_path.name,
-                                spectrum["id"],
-                                precursor,
-                                quantifier_peak,
-                                qualifier_peak,
-                            )
-                        )
-
-    # Write the matches to TSV files
-
-    AnalyteMatch.to_file(
-        args.output_folder.joinpath(f"quanitfier_matches.{args.output_type}"),
-        matching_fragments
+
+def sweep(args: Namespace, metrics: Optional[Metrics]) -> None:
+    """Quantify the analytes with each configuration of the sweep grid."""
+    from macdii.analyte_quantification import AnalyteQuantification
+    from macdii.sweep import SweepConfiguration, sweep_mzmls
+
+    configurations = SweepConfiguration.grid(
+        args.sweep_rt or [(args.rt_start, args.rt_stop)],
+        args.sweep_precursor_tol
+        or [(args.precursor_tol_lower, args.precursor_tol_upper)],
+        args.sweep_fragment_tol or [(args.fragment_tol_lower, args.fragment_tol_upper)],
     )
 
-    analyte_quantifications = AnalyteQuantification.from_matches(matching_fragments)
+    with stage(metrics, "sweep"):
+        quantifications = sweep_mzmls(
+            args.mzml_paths,
+            args.analytes_file.read_text(encoding="utf-8"),
+            configurations,
+        )
+
+    with stage(metrics, "write_quantification"):
+        SweepConfiguration.to_file(
+            args.output_folder.joinpath(f"sweep_configurations.{args.output_type}"),
+            configurations,
+        )
+        for configuration, analyte_quantifications in zip(
+            configurations, quantifications
+        ):
+            AnalyteQuantification.to_file(
+                args.output_folder.joinpath(
+                    f"quantification_{configuration.name}.{args.output_type}"
+                ),
+                analyte_quantifications,
+            )
+
 
-    AnalyteQuantification.to_file(args.output_folder.joinpath(f"quantification.{args.output_type}"), analyte_quantifications)
+def finish_metrics(
+    metrics: Optional[Metrics], start: Clock, output_folder: Path
+) -> None:
+    """Add the total time and write the metrics, if enabled."""
+    if metrics is not None:
+        metrics.add_time("total", start)
+        metrics.to_file(output_folder.joinpath("metrics.json"))
 
 
 if __name__ == "__main__":
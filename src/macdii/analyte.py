@@ -147,4 +147,6 @@ class Analyte:
                 fragment_tolerance_upper,
             )
             for row in reader
+            # Empty lines, e.g. at the end of the file, like `AnalyteTable.from_tsv`
+            if len(row) > 0
         ]
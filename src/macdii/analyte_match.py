@@ -2,12 +2,28 @@
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, LiteralString, Optional, Self, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    LiteralString,
+    NamedTuple,
+    Optional,
+    Self,
+    Tuple,
+    Union,
+)
 
-import pandas as pd
+import numpy as np
 
 from macdii.analyte import Analyte
-from macdii.utils import dataframe_to_file
+from macdii.analyte_table import Analytes, AnalyteTable
+from macdii.utils import columns_to_dataframe, columns_to_file
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 DF_COLUMNS: Tuple[LiteralString, ...] = (
     "analyte",
@@ -24,6 +40,22 @@ DF_COLUMNS: Tuple[LiteralString, ...] = (
     "experimental_qualifier_intensity",
 )
 
+DF_DTYPES: Dict[str, str] = {
+    "analyte": "string",
+    "filename": "string",
+    "spectrum_id": "string",
+    "theoretical_precursor_mz": "float64",
+    "experimental_precursor_mz": "float64",
+    "experimental_precursor_charge": "Int64",
+    "theoretical_quantifier_mz": "float64",
+    "experimental_quantifier_mz": "float64",
+    "experimental_quantifier_intensity": "float64",
+    "theoretical_qualifier_mz": "float64",
+    "experimental_qualifier_mz": "float64",
+    "experimental_qualifier_intensity": "float64",
+}
+"""pandas dtype of each column in `DF_COLUMNS`, used for typed output formats."""
+
 
 @dataclass
 class Peak:
@@ -121,27 +153,482 @@ class AnalyteMatch:
             f"{self.analyte.qualifier_mz}\t{experimental_qualifier}"
         )
 
+    def to_row(self) -> List[Any]:
+        """Returns the match as table row, with values in order of `DF_COLUMNS`."""
+        return [
+            self.analyte.name,
+            self.filename,
+            self.spectrum_id,
+            self.analyte.precursor_mz,
+            self.experimental_precursor.mz,
+            self.experimental_precursor.charge,
+            self.analyte.quantifier_mz,
+            self.experimental_quantifier.mz,
+            self.experimental_quantifier.intensity,
+            self.analyte.qualifier_mz,
+            self.experimental_qualifier.mz if self.experimental_qualifier else None,
+            self.experimental_qualifier.intensity if self.experimental_qualifier else None,
+        ]
+
+    @classmethod
+    def to_file(cls, file_path: Path, matches: Union[List[Self], "MatchTable"]) -> None:
+        """Write a list of matches or a match table to a file."""
+
+        if isinstance(matches, MatchTable):
+            columns_to_file(matches.output_columns(), file_path, DF_DTYPES)
+            return
+
+        rows = [match.to_row() for match in matches]
+        columns_to_file(
+            {
+                column: [row[column_idx] for row in rows]
+                for column_idx, column in enumerate(DF_COLUMNS)
+            },
+            file_path,
+            DF_DTYPES,
+        )
+
+
+class SpectrumMatches(NamedTuple):
+    """All matches of a single spectrum, as arrays with one entry per matching analyte."""
+
+    spectrum_id: str
+    """ID of the spectrum."""
+
+    precursor_mz: float
+    """Experimental precursor m/z."""
+
+    precursor_charge: Optional[int]
+    """Experimental precursor charge."""
+
+    analyte_indices: np.ndarray
+    """Indices of the matching analytes."""
+
+    quantifier_mz: np.ndarray
+    """Experimental quantifier m/z."""
+
+    quantifier_intensity: np.ndarray
+    """Experimental quantifier intensity."""
+
+    qualifier_mz: np.ndarray
+    """Experimental qualifier m/z, NaN if there is no qualifier."""
+
+    qualifier_intensity: np.ndarray
+    """Experimental qualifier intensity, NaN if there is no qualifier."""
+
+
+MISSING_CHARGE: int = np.iinfo(np.int32).min
+"""Stored in the charge column of a `MatchTable` if the precursor charge is unknown."""
+
+MATCH_TABLE_DTYPES: Dict[str, type] = {
+    "analyte_index": np.int32,
+    "file_index": np.int32,
+    "spectrum_index": np.int32,
+    "precursor_mz": np.float64,
+    "precursor_charge": np.int32,
+    "quantifier_mz": np.float64,
+    "quantifier_intensity": np.float64,
+    "qualifier_mz": np.float64,
+    "qualifier_intensity": np.float64,
+}
+"""Columns of a `MatchTable` and their types."""
+
+SPECTRUM_ID_OVERHEAD: int = 8 + 49
+"""Bytes of a spectrum ID in a `MatchTable` in addition to its characters."""
+
+
+class MatchTable:
+    """
+    Columnar storage of matches. Instead of one `AnalyteMatch` (with `Precursor` and
+    `Peak` objects) per match, each match is a row in typed NumPy columns, referencing
+    the analyte, file and spectrum ID by index. Rows are appended into preallocated
+    chunks, so appending does not copy the existing rows.
+
+    The analytes are not pickled with the table, which keeps tables small when they are
+    send from worker processes, `extend` does not need them.
+    """
+
+    def __init__(self, analytes: Analytes, chunk_size: int = 16384):
+        """
+        Create a new, empty match table.
+
+        Parameters
+        ----------
+        analytes : Analytes
+            Analytes referenced by the analyte index column.
+        chunk_size : int
+            Number of rows allocated at once, by default 16384.
+        """
+        self.analytes = analytes
+        """Analytes referenced by the analyte index column."""
+
+        self.filenames: List[str] = []
+        """Filenames referenced by the file index column."""
+
+        self.spectrum_ids: List[str] = []
+        """Interned spectrum IDs referenced by the spectrum index column."""
+
+        self.chunk_size = chunk_size
+        """Number of rows allocated at once."""
+
+        self.__file_indices: Dict[str, int] = {}
+        self.__sealed_chunks: List[Dict[str, np.ndarray]] = []
+        self.__sealed_row_count = 0
+        self.__chunk: Optional[Dict[str, np.ndarray]] = None
+        self.__chunk_fill = 0
+
+    def __len__(self) -> int:
+        return self.__sealed_row_count + self.__chunk_fill
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {
+            "filenames": self.filenames,
+            "spectrum_ids": self.spectrum_ids,
+            "chunk_size": self.chunk_size,
+            "columns": self.columns(),
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__([], state["chunk_size"])
+        for filename in state["filenames"]:
+            self.add_file(filename)
+        self.spectrum_ids = state["spectrum_ids"]
+        self.__append_chunk(state["columns"])
+
     @classmethod
-    def to_file(cls, file_path: Path, matches: List[Self]) -> None:
-        """Write a list of matches to a file."""
-
-        df_data = [
-            [
-                match.analyte.name,
-                match.filename,
-                match.spectrum_id,
-                match.analyte.precursor_mz,
-                match.experimental_precursor.mz,
-                match.experimental_precursor.charge,
-                match.analyte.quantifier_mz,
-                match.experimental_quantifier.mz,
-                match.experimental_quantifier.intensity,
-                match.analyte.qualifier_mz,
-                match.experimental_qualifier.mz if match.experimental_qualifier else None,
-                match.experimental_qualifier.intensity if match.experimental_qualifier else None,
-            ]
-            for match in matches
+    def from_columns(
+        cls,
+        analytes: Analytes,
+        filenames: List[str],
+        spectrum_ids: List[str],
+        columns: Dict[str, np.ndarray],
+    ) -> "MatchTable":
+        """
+        Table of stored matches, e.g. written with `columns`.
+
+        Parameters
+        ----------
+        analytes : Analytes
+            Analytes referenced by the analyte index column.
+        filenames : List[str]
+            Filenames referenced by the file index column.
+        spectrum_ids : List[str]
+            Spectrum IDs referenced by the spectrum index column.
+        columns : Dict[str, np.ndarray]
+            One array per column of `MATCH_TABLE_DTYPES`.
+
+        Returns
+        -------
+        MatchTable
+            Matches.
+        """
+        table = cls(analytes)
+        for filename in filenames:
+            table.add_file(filename)
+        table.spectrum_ids = list(spectrum_ids)
+        table.__append_chunk(
+            {
+                column: np.asarray(columns[column], dtype=dtype)
+                for column, dtype in MATCH_TABLE_DTYPES.items()
+            }
+        )
+        return table
+
+    def add_file(self, filename: str) -> int:
+        """
+        Register a file.
+
+        Parameters
+        ----------
+        filename : str
+            Filename of the mzML file.
+
+        Returns
+        -------
+        int
+            File index for `append_spectrum`.
+        """
+        file_idx = self.__file_indices.get(filename)
+        if file_idx is None:
+            file_idx = len(self.filenames)
+            self.filenames.append(filename)
+            self.__file_indices[filename] = file_idx
+        return file_idx
+
+    def append_spectrum(self, file_idx: int, spectrum_matches: SpectrumMatches) -> None:
+        """
+        Append the matches of a spectrum.
+
+        Parameters
+        ----------
+        file_idx : int
+            File index as returned by `add_file`.
+        spectrum_matches : SpectrumMatches
+            Matches of the spectrum.
+        """
+        spectrum_idx = len(self.spectrum_ids)
+        self.spectrum_ids.append(spectrum_matches.spectrum_id)
+        charge = (
+            MISSING_CHARGE
+            if spectrum_matches.precursor_charge is None
+            else spectrum_matches.precursor_charge
+        )
+        self.__append_columns(
+            {
+                "analyte_index": spectrum_matches.analyte_indices,
+                "file_index": file_idx,
+                "spectrum_index": spectrum_idx,
+                "precursor_mz": spectrum_matches.precursor_mz,
+                "precursor_charge": charge,
+                "quantifier_mz": spectrum_matches.quantifier_mz,
+                "quantifier_intensity": spectrum_matches.quantifier_intensity,
+                "qualifier_mz": spectrum_matches.qualifier_mz,
+                "qualifier_intensity": spectrum_matches.qualifier_intensity,
+            },
+            len(spectrum_matches.analyte_indices),
+        )
+
+    def extend(self, other: "MatchTable") -> None:
+        """
+        Append all rows of another table with the same analytes.
+
+        Parameters
+        ----------
+        other : MatchTable
+            Table to append.
+        """
+        columns = other.columns()
+        file_index_map = np.array(
+            [self.add_file(filename) for filename in other.filenames], dtype=np.int32
+        )
+        columns["file_index"] = file_index_map[columns["file_index"]]
+        columns["spectrum_index"] += len(self.spectrum_ids)
+        self.spectrum_ids.extend(other.spectrum_ids)
+        self.__append_chunk(columns)
+
+    def clear(self) -> None:
+        """Remove all rows, files and spectrum IDs."""
+        self.__init__(self.analytes, self.chunk_size)
+
+    def nbytes(self) -> int:
+        """
+        Approximate memory used by the rows and spectrum IDs, without the analytes.
+
+        Returns
+        -------
+        int
+            Bytes, including the allocated rows of the current chunk.
+        """
+        chunks = list(self.__sealed_chunks)
+        if self.__chunk is not None:
+            chunks.append(self.__chunk)
+        return sum(
+            values.nbytes for chunk in chunks for values in chunk.values()
+        ) + sum(
+            # List entry and str object with ASCII content
+            SPECTRUM_ID_OVERHEAD + len(spectrum_id)
+            for spectrum_id in self.spectrum_ids
+        )
+
+    def __seal_chunk(self) -> None:
+        """Move the rows of the current chunk to the sealed chunks."""
+        if self.__chunk is not None and self.__chunk_fill > 0:
+            self.__sealed_chunks.append(
+                {
+                    column: values[: self.__chunk_fill]
+                    for column, values in self.__chunk.items()
+                }
+            )
+            self.__sealed_row_count += self.__chunk_fill
+        self.__chunk = None
+        self.__chunk_fill = 0
+
+    def __append_chunk(self, columns: Dict[str, np.ndarray]) -> None:
+        """Append complete columns as chunk, without copying them."""
+        row_count = len(columns["analyte_index"])
+        if row_count == 0:
+            return
+        self.__seal_chunk()
+        self.__sealed_chunks.append(columns)
+        self.__sealed_row_count += row_count
+
+    def __append_columns(self, columns: Dict[str, Any], row_count: int) -> None:
+        """Copy rows into the current chunk, values may be arrays or scalars."""
+        written = 0
+        while written < row_count:
+            if self.__chunk is None or self.__chunk_fill == self.chunk_size:
+                self.__seal_chunk()
+                self.__chunk = {
+                    column: np.empty(self.chunk_size, dtype=dtype)
+                    for column, dtype in MATCH_TABLE_DTYPES.items()
+                }
+            count = min(row_count - written, self.chunk_size - self.__chunk_fill)
+            for column, values in columns.items():
+                if isinstance(values, np.ndarray):
+                    values = values[written : written + count]
+                self.__chunk[column][self.__chunk_fill : self.__chunk_fill + count] = values
+            self.__chunk_fill += count
+            written += count
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+        All rows as one array per column, see `MATCH_TABLE_DTYPES`.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            Columns
+        """
+        chunks = list(self.__sealed_chunks)
+        if self.__chunk is not None:
+            chunks.append(
+                {
+                    column: values[: self.__chunk_fill]
+                    for column, values in self.__chunk.items()
+                }
+            )
+        return {
+            column: np.concatenate(
+                [chunk[column] for chunk in chunks]
+                + [np.empty(0, dtype=MATCH_TABLE_DTYPES[column])]
+            )
+            for column in MATCH_TABLE_DTYPES
+        }
+
+    def output_columns(self) -> Dict[str, np.ndarray]:
+        """
+        Matches as one array per column of `DF_COLUMNS`. Missing charges are masked,
+        missing qualifiers are NaN.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            Columns, in order of `DF_COLUMNS`
+        """
+        columns = self.columns()
+        analyte_indices = columns["analyte_index"]
+        charge = columns["precursor_charge"]
+        analytes = AnalyteTable.of(self.analytes)
+        return {
+            "analyte": analytes.names[analyte_indices],
+            "filename": np.array(self.filenames, dtype=object)[columns["file_index"]],
+            "spectrum_id": np.array(self.spectrum_ids, dtype=object)[
+                columns["spectrum_index"]
+            ],
+            "theoretical_precursor_mz": analytes.precursor_mz[analyte_indices],
+            "experimental_precursor_mz": columns["precursor_mz"],
+            "experimental_precursor_charge": np.ma.MaskedArray(
+                charge.astype(np.int64), charge == MISSING_CHARGE
+            ),
+            "theoretical_quantifier_mz": analytes.quantifier_mz[analyte_indices],
+            "experimental_quantifier_mz": columns["quantifier_mz"],
+            "experimental_quantifier_intensity": columns["quantifier_intensity"],
+            "theoretical_qualifier_mz": analytes.qualifier_mz[analyte_indices],
+            "experimental_qualifier_mz": columns["qualifier_mz"],
+            "experimental_qualifier_intensity": columns["qualifier_intensity"],
+        }
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """
+        Matches as DataFrame with `DF_COLUMNS`, see `output_columns`.
+
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame
+        """
+        return columns_to_dataframe(self.output_columns())
+
+    @classmethod
+    def from_dataframe(cls, df: "pd.DataFrame") -> "MatchTable":
+        """
+        Table of the matches in a DataFrame as created by `to_dataframe`,
+        e.g. read from a result file.
+
+        The analytes are recreated from the analyte columns, so the table only knows
+        the matched analytes, in order of their first match.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Matches with the columns `DF_COLUMNS`.
+
+        Returns
+        -------
+        MatchTable
+            Matches, in the same order.
+        """
+        import pandas as pd
+
+        analyte_columns = [
+            "analyte",
+            "theoretical_precursor_mz",
+            "theoretical_quantifier_mz",
+            "theoretical_qualifier_mz",
         ]
+        analyte_indices = (
+            df.groupby(analyte_columns, sort=False, dropna=False).ngroup().to_numpy()
+        )
+        analyte_rows = df[analyte_columns].drop_duplicates()
+        table = cls(
+            AnalyteTable(
+                analyte_rows["analyte"].to_numpy(dtype=object),
+                analyte_rows["theoretical_precursor_mz"].to_numpy(dtype=np.float64),
+                analyte_rows["theoretical_quantifier_mz"].to_numpy(dtype=np.float64),
+                analyte_rows["theoretical_qualifier_mz"].to_numpy(dtype=np.float64),
+                (0.0, 0.0, 0.0, 0.0),
+            )
+        )
+        file_indices, filenames = pd.factorize(df["filename"])
+        for filename in filenames:
+            table.add_file(filename)
+        spectrum_indices, spectrum_ids = pd.factorize(df["spectrum_id"])
+        table.spectrum_ids = list(spectrum_ids)
+
+        charge = df["experimental_precursor_charge"]
+        table.__append_chunk(
+            {
+                "analyte_index": analyte_indices.astype(np.int32),
+                "file_index": file_indices.astype(np.int32),
+                "spectrum_index": spectrum_indices.astype(np.int32),
+                "precursor_mz": df["experimental_precursor_mz"].to_numpy(np.float64),
+                "precursor_charge": charge.fillna(MISSING_CHARGE).to_numpy(np.int32),
+                "quantifier_mz": df["experimental_quantifier_mz"].to_numpy(np.float64),
+                "quantifier_intensity": df[
+                    "experimental_quantifier_intensity"
+                ].to_numpy(np.float64),
+                "qualifier_mz": df["experimental_qualifier_mz"].to_numpy(
+                    np.float64, na_value=np.nan
+                ),
+                "qualifier_intensity": df[
+                    "experimental_qualifier_intensity"
+                ].to_numpy(np.float64, na_value=np.nan),
+            }
+        )
+        return table
 
-        df = pd.DataFrame(df_data, columns=DF_COLUMNS)
-        dataframe_to_file(df, file_path)
+    def __iter__(self) -> Iterator[AnalyteMatch]:
+        """Matches as `AnalyteMatch` objects, created on the fly."""
+        columns = self.columns()
+        for row in range(len(self)):
+            qualifier: Optional[Peak] = None
+            if not np.isnan(columns["qualifier_mz"][row]):
+                qualifier = Peak(
+                    float(columns["qualifier_mz"][row]),
+                    float(columns["qualifier_intensity"][row]),  # type: ignore
+                )
+            charge = int(columns["precursor_charge"][row])
+            yield AnalyteMatch(
+                self.analytes[columns["analyte_index"][row]],
+                self.filenames[columns["file_index"][row]],
+                self.spectrum_ids[columns["spectrum_index"][row]],
+                Precursor(
+                    float(columns["precursor_mz"][row]),
+                    None if charge == MISSING_CHARGE else charge,
+                ),
+                Peak(
+                    float(columns["quantifier_mz"][row]),
+                    float(columns["quantifier_intensity"][row]),  # type: ignore
+                ),
+                qualifier,
+            )
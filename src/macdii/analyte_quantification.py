@@ -1,14 +1,26 @@
 """Simple quantification of analytes."""
-from collections import defaultdict
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, LiteralString, Self, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    List,
+    LiteralString,
+    Optional,
+    Self,
+    Tuple,
+    Union,
+)
 
-import pandas as pd
+import numpy as np
 
 from macdii.analyte import Analyte
-from macdii.analyte_match import AnalyteMatch, Peak
-from macdii.utils import dataframe_to_file
+from macdii.analyte_match import AnalyteMatch, MatchTable, Peak
+from macdii.analyte_table import Analytes, AnalyteTable
+from macdii.utils import columns_to_dataframe, columns_to_file
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 DF_COLUMNS: Tuple[LiteralString, ...] = (
     "analyte",
@@ -17,6 +29,14 @@ DF_COLUMNS: Tuple[LiteralString, ...] = (
     "count",
 )
 
+DF_DTYPES: Dict[str, str] = {
+    "analyte": "string",
+    "average_quantifier_mz": "float64",
+    "average_quantifier_intensity": "float64",
+    "count": "int64",
+}
+"""pandas dtype of each column in `DF_COLUMNS`, used for typed output formats."""
+
 @dataclass
 class AnalyteQuantification:
     """Simple quantification of an analyte. Calculates the average m/z and intensity of a set of matches."""
@@ -56,14 +76,16 @@ class AnalyteQuantification:
         return f"{self.analyte.name}\t{self.average_mz}\t{self.average_intensity}\t{self.count}"
 
     @classmethod
-    def from_matches(cls, matches: List[AnalyteMatch]) -> List["AnalyteQuantification"]:
+    def from_matches(
+        cls, matches: Union[List[AnalyteMatch], MatchTable]
+    ) -> List["AnalyteQuantification"]:
         """
         Create a new quantification of an analyte from a list of matches.
 
         Parameters
         ----------
-        matches : List[AnalyteMatch]
-            List of matches to be used for quantification
+        matches : Union[List[AnalyteMatch], MatchTable]
+            List or table of matches to be used for quantification
 
         Returns
         -------
@@ -71,26 +93,60 @@ class AnalyteQuantification:
             New quantification of the analyte
         """
 
-        quantifications: List[AnalyteQuantification] = []
-
-        grouped_matches: Dict[str, List[AnalyteMatch]] = defaultdict(list)
+        if isinstance(matches, MatchTable):
+            running_quantification = RunningQuantification(matches.analytes)
+            running_quantification.add_table(matches)
+            return running_quantification.quantifications()
 
+        running_quantification = RunningQuantification(
+            list(dict.fromkeys(match.analyte for match in matches))
+        )
         for match in matches:
-            grouped_matches[match.analyte.name].append(match)
-
-        for group in grouped_matches.values():
-            sum_quantifier_peak = Peak(0, 0)
-            for match in group:
-                sum_quantifier_peak += match.experimental_quantifier
-
-            quantifications.append(
-                AnalyteQuantification(
-                    group[0].analyte,
-                    sum_quantifier_peak,
-                    count = len(group)
-                )
-            )
-        return quantifications
+            running_quantification.add(match)
+        return running_quantification.quantifications()
+
+    @classmethod
+    def output_columns(cls, quantifications: List[Self]) -> Dict[str, List]:
+        """
+        Quantifications as one list per column of `DF_COLUMNS`.
+
+        Parameters
+        ----------
+        quantifications : List[AnalyteQuantification]
+            Quantifications
+
+        Returns
+        -------
+        Dict[str, List]
+            Columns, in order of `DF_COLUMNS`
+        """
+        return {
+            "analyte": [quant.analyte.name for quant in quantifications],
+            "average_quantifier_mz": [quant.average_mz for quant in quantifications],
+            "average_quantifier_intensity": [
+                quant.average_intensity for quant in quantifications
+            ],
+            "count": [quant.count for quant in quantifications],
+        }
+
+    @classmethod
+    def to_dataframe(cls, quantifications: List[Self]) -> "pd.DataFrame":
+        """
+        Quantifications as DataFrame with `DF_COLUMNS`.
+
+        Parameters
+        ----------
+        quantifications : List[AnalyteQuantification]
+            Quantifications
+
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame with the dtypes of `DF_DTYPES`
+        """
+        return columns_to_dataframe(cls.output_columns(quantifications)).astype(
+            DF_DTYPES
+        )
 
     @classmethod
     def to_file(
@@ -107,17 +163,292 @@ class AnalyteQuantification:
         quantifications : List[&quot;AnalyteQuantification&quot;]
             List of quantifications to be written to the file
         """
+        columns_to_file(cls.output_columns(quantifications), file_path, DF_DTYPES)
+
+
+class RunningQuantification:
+    """
+    Quantification which is updated match by match or table by table, keeping only the
+    running sum of the quantifier peaks and the number of matches per analyte.
+    Like `AnalyteQuantification.from_matches` analytes are grouped by name.
+    """
+
+    def __init__(self, analytes: Analytes) -> None:
+        """
+        Create a new, empty running quantification.
+
+        Parameters
+        ----------
+        analytes : Analytes
+            Analytes, as referenced by the analyte index of a `MatchTable`
+        """
+
+        names = AnalyteTable.of(analytes).names
+        self.__group_indices: Dict[str, int] = {}
+        self.__group_analytes: List[Analyte] = []
+        for analyte_idx, name in enumerate(names):
+            if name not in self.__group_indices:
+                self.__group_indices[name] = len(self.__group_analytes)
+                self.__group_analytes.append(analytes[analyte_idx])
+        self.__analyte_groups = np.array(
+            [self.__group_indices[name] for name in names], dtype=np.intp
+        )
+
+        group_count = len(self.__group_analytes)
+        self.__sum_mz = np.zeros(group_count, dtype=np.float64)
+        self.__sum_intensity = np.zeros(group_count, dtype=np.float64)
+        self.__counts = np.zeros(group_count, dtype=np.int64)
+        # Number of matches added before the first match of each group, for ordering
+        self.__first_match = np.full(group_count, np.iinfo(np.int64).max, dtype=np.int64)
+        self.__match_count = 0
+
+    def add(self, match: AnalyteMatch) -> None:
+        """
+        Add a match to the quantification of its analyte.
+
+        Parameters
+        ----------
+        match : AnalyteMatch
+            Match to be used for quantification
+        """
+        group_idx = self.__group_indices[match.analyte.name]
+        self.__sum_mz[group_idx] += match.experimental_quantifier.mz
+        self.__sum_intensity[group_idx] += match.experimental_quantifier.intensity
+        self.__counts[group_idx] += 1
+        if self.__counts[group_idx] == 1:
+            self.__first_match[group_idx] = self.__match_count
+        self.__match_count += 1
+
+    def add_table(self, table: MatchTable) -> None:
+        """
+        Add all matches of a table.
+
+        Parameters
+        ----------
+        table : MatchTable
+            Matches, referencing the same analytes
+        """
+        columns = table.columns()
+        groups = self.__analyte_groups[columns["analyte_index"]]
+        # `add.at` sums in row order, so the sums do not depend on how
+        # the matches are split into tables.
+        np.add.at(self.__sum_mz, groups, columns["quantifier_mz"])
+        np.add.at(self.__sum_intensity, groups, columns["quantifier_intensity"])
+        np.add.at(self.__counts, groups, 1)
+        unique_groups, first_rows = np.unique(groups, return_index=True)
+        self.__first_match[unique_groups] = np.minimum(
+            self.__first_match[unique_groups], first_rows + self.__match_count
+        )
+        self.__match_count += len(groups)
+
+    def quantifications(self) -> List[AnalyteQuantification]:
+        """
+        Current quantifications, in order of the first match of each analyte.
+
+        Returns
+        -------
+        List[AnalyteQuantification]
+            Quantifications
+        """
+        matched_groups = np.flatnonzero(self.__counts)
+        matched_groups = matched_groups[
+            np.argsort(self.__first_match[matched_groups], kind="stable")
+        ]
+        return [
+            AnalyteQuantification(
+                self.__group_analytes[group_idx],
+                Peak(
+                    float(self.__sum_mz[group_idx]),
+                    float(self.__sum_intensity[group_idx]),  # type: ignore
+                ),
+                count=int(self.__counts[group_idx]),
+            )
+            for group_idx in matched_groups
+        ]
+
+
+MATRIX_STATISTICS: Tuple[LiteralString, ...] = (
+    "mean_intensity",
+    "sum_intensity",
+    "median_intensity",
+    "count",
+)
+"""Statistics of the quantifier intensities in a `QuantificationMatrix`."""
+
+
+class QuantificationMatrix:
+    """
+    Quantification per file and analyte: mean, sum, median and number of the
+    quantifier intensities of the matches of each analyte in each file.
+    Like `AnalyteQuantification.from_matches` analytes are grouped by name.
+
+    Only the file, analyte and intensity of each match are kept, the statistics
+    are computed at once over all matches with NumPy.
+    """
+
+    def __init__(self, analytes: Analytes, filenames: Optional[List[str]] = None):
+        """
+        Create a new, empty quantification matrix.
+
+        Parameters
+        ----------
+        analytes : Analytes
+            Analytes, as referenced by the analyte index of a `MatchTable`
+        filenames : Optional[List[str]]
+            Files in column order, so files without any match are included.
+            Further files are added in order of their first match.
+        """
+        names = AnalyteTable.of(analytes).names
+        # Groups in order of the first analyte with the name
+        unique_names, first_indices, unique_codes = np.unique(
+            names, return_index=True, return_inverse=True
+        )
+        group_order = np.argsort(first_indices)
+        group_codes = np.empty(len(unique_names), dtype=np.intp)
+        group_codes[group_order] = np.arange(len(unique_names))
+        self.__group_names = unique_names[group_order]
+        self.__analyte_groups = group_codes[unique_codes.reshape(-1)]
+
+        self.filenames: List[str] = []
+        """Files in column order."""
+        self.__file_indices: Dict[str, int] = {}
+        for filename in filenames or []:
+            self.add_file(filename)
+
+        self.__file_chunks: List[np.ndarray] = []
+        self.__group_chunks: List[np.ndarray] = []
+        self.__intensity_chunks: List[np.ndarray] = []
+
+    def add_file(self, filename: str) -> int:
+        """
+        Add a file column, if the file is not known yet.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file
+
+        Returns
+        -------
+        int
+            Column index of the file
+        """
+        file_idx = self.__file_indices.get(filename)
+        if file_idx is None:
+            file_idx = len(self.filenames)
+            self.filenames.append(filename)
+            self.__file_indices[filename] = file_idx
+        return file_idx
+
+    def add_table(self, table: MatchTable) -> None:
+        """
+        Add all matches of a table.
+
+        Parameters
+        ----------
+        table : MatchTable
+            Matches, referencing the same analytes
+        """
+        columns = table.columns()
+        # The file indices of the table are local to the table
+        file_indices = np.array(
+            [self.add_file(filename) for filename in table.filenames], dtype=np.intp
+        )
+        self.__file_chunks.append(file_indices[columns["file_index"]])
+        self.__group_chunks.append(self.__analyte_groups[columns["analyte_index"]])
+        self.__intensity_chunks.append(columns["quantifier_intensity"])
+
+    def statistics(self) -> Dict[str, np.ndarray]:
+        """
+        Statistics as matrices with one row per analyte and one column per file.
+        Without matches, count and sum are 0, mean and median are NaN.
 
-        df_data = [
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            Matrix of each statistic in `MATRIX_STATISTICS`.
+        """
+        shape = (len(self.__group_names), len(self.filenames))
+        cells = np.concatenate(
             [
-                quant.analyte.name,
-                quant.average_mz,
-                quant.average_intensity,
-                quant.count
+                groups * shape[1] + files
+                for groups, files in zip(self.__group_chunks, self.__file_chunks)
             ]
-            for quant in quantifications
-        ]
+            + [np.empty(0, dtype=np.intp)]
+        )
+        intensities = np.concatenate(
+            self.__intensity_chunks + [np.empty(0, dtype=np.float64)]
+        )
+        cell_count = shape[0] * shape[1]
+
+        counts = np.bincount(cells, minlength=cell_count)
+        sums = np.bincount(cells, weights=intensities, minlength=cell_count)
+        means = np.full(cell_count, np.nan)
+        medians = np.full(cell_count, np.nan)
+        matched = np.flatnonzero(counts)
+        means[matched] = sums[matched] / counts[matched]
+
+        # Sort by cell and intensity, the median is in the middle of each cell's run
+        order = np.lexsort((intensities, cells))
+        sorted_intensities = intensities[order]
+        starts = np.cumsum(counts) - counts
+        lower = sorted_intensities[starts[matched] + (counts[matched] - 1) // 2]
+        upper = sorted_intensities[starts[matched] + counts[matched] // 2]
+        medians[matched] = (lower + upper) / 2
+
+        return {
+            "mean_intensity": means.reshape(shape),
+            "sum_intensity": sums.reshape(shape),
+            "median_intensity": medians.reshape(shape),
+            "count": counts.astype(np.int64).reshape(shape),
+        }
+
+    def output_columns(self) -> Dict[str, np.ndarray]:
+        """
+        Wide table with one row per analyte and a `<STATISTIC>:<FILENAME>` column
+        for each statistic and file.
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            Columns of the quantification matrix
+        """
+        statistics = self.statistics()
+        columns = {"analyte": np.asarray(self.__group_names, dtype=object)}
+        for statistic in MATRIX_STATISTICS:
+            for file_idx, filename in enumerate(self.filenames):
+                columns[f"{statistic}:{filename}"] = statistics[statistic][:, file_idx]
+        return columns
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """
+        Wide table as DataFrame, see `output_columns`.
+
+        Returns
+        -------
+        pd.DataFrame
+            Quantification matrix
+        """
+        return columns_to_dataframe(self.output_columns())
 
+    def to_file(self, file_path: Path) -> None:
+        """
+        Write the wide table, see `output_columns`.
 
-        df = pd.DataFrame(df_data, columns=DF_COLUMNS)
-        dataframe_to_file(df, file_path)
+        Parameters
+        ----------
+        file_path : Path
+            File path
+        """
+        columns = self.output_columns()
+        dtypes = {
+            column: (
+                "string"
+                if column == "analyte"
+                else "int64"
+                if column.startswith("count:")
+                else "float64"
+            )
+            for column in columns
+        }
+        columns_to_file(columns, file_path, dtypes)
@@ -0,0 +1,212 @@
+"""Analytes stored as arrays, for large analyte libraries."""
+
+# std imports
+from typing import Iterator, List, Optional, Self, TextIO, Tuple, Union
+
+# external imports
+import numpy as np
+
+from macdii.analyte import Analyte
+
+
+class AnalyteTable:
+    """
+    Analytes as struct of arrays: names, m/z values and the precomputed m/z ranges
+    of all analytes. Indexing the table returns an `Analyte`, created on access,
+    so it can be used wherever a list of analytes is expected.
+    """
+
+    def __init__(
+        self,
+        names: np.ndarray,
+        precursor_mz: np.ndarray,
+        quantifier_mz: np.ndarray,
+        qualifier_mz: np.ndarray,
+        tolerances: Tuple[float, float, float, float],
+    ):
+        """
+        Create a new analyte table, computing the m/z ranges like `Analyte`.
+
+        Parameters
+        ----------
+        names : np.ndarray
+            Names of the analytes.
+        precursor_mz : np.ndarray
+            Precursor m/z of the analytes.
+        quantifier_mz : np.ndarray
+            Quantifier m/z of the analytes.
+        qualifier_mz : np.ndarray
+            Qualifier m/z of the analytes.
+        tolerances : Tuple[float, float, float, float]
+            Lower and upper precursor tolerance and lower and upper fragment tolerance in ppm.
+        """
+        self.names = np.asarray(names, dtype=object)
+        """Names of the analytes."""
+
+        self.precursor_mz = np.asarray(precursor_mz, dtype=np.float64)
+        """Precursor m/z of the analytes."""
+
+        self.quantifier_mz = np.asarray(quantifier_mz, dtype=np.float64)
+        """Quantifier m/z of the analytes."""
+
+        self.qualifier_mz = np.asarray(qualifier_mz, dtype=np.float64)
+        """Qualifier m/z of the analytes."""
+
+        precursor_lower, precursor_upper, fragment_lower, fragment_upper = tolerances
+        self.precursor_mz_ranges = _mz_ranges(
+            self.precursor_mz, precursor_lower, precursor_upper
+        )
+        """Precursor m/z +/- tolerance, one row of lower and upper bound per analyte."""
+
+        self.quantifier_mz_ranges = _mz_ranges(
+            self.quantifier_mz, fragment_lower, fragment_upper
+        )
+        """Quantifier m/z +/- tolerance, one row of lower and upper bound per analyte."""
+
+        self.qualifier_mz_ranges = _mz_ranges(
+            self.qualifier_mz, fragment_lower, fragment_upper
+        )
+        """Qualifier m/z +/- tolerance, one row of lower and upper bound per analyte."""
+
+        self.__tolerances = tolerances
+        # Set if created from analyte objects, which are then returned by indexing
+        self.__analytes: Optional[List[Analyte]] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, analyte_idx: int) -> Analyte:
+        """Analyte at the given index."""
+        if self.__analytes is not None:
+            return self.__analytes[analyte_idx]
+        return Analyte(
+            self.names[analyte_idx],
+            float(self.precursor_mz[analyte_idx]),
+            float(self.quantifier_mz[analyte_idx]),
+            float(self.qualifier_mz[analyte_idx]),
+            *self.__tolerances,
+        )
+
+    def __iter__(self) -> Iterator[Analyte]:
+        for analyte_idx in range(len(self)):
+            yield self[analyte_idx]
+
+    @classmethod
+    def from_tsv(
+        cls,
+        csv_content: TextIO,
+        precursor_tolerance_lower: float,
+        precursor_tolerance_upper: float,
+        fragment_tolerance_lower: float,
+        fragment_tolerance_upper: float,
+    ) -> Self:
+        """
+        Read analytes from a TSV file in bulk, same format as `Analyte.from_tsv`.
+        The columns are parsed by pandas directly into arrays, empty lines are skipped.
+
+        Parameters
+        ----------
+        csv_content : TextIO
+            The CSV file or buffer
+        precursor_tolerance_lower : float
+            The lower precursor tolerance in ppm.
+        precursor_tolerance_upper : float
+            The upper precursor tolerance in ppm.
+        fragment_tolerance_lower : float
+            The lower fragment tolerance in ppm.
+        fragment_tolerance_upper : float
+            The upper fragment tolerance in ppm.
+        """
+        import pandas as pd
+
+        try:
+            columns = pd.read_csv(
+                csv_content,
+                sep="\t",
+                # The header is skipped, the columns are identified by position
+                header=None,
+                skiprows=1,
+                usecols=range(4),
+                dtype={0: object, 1: np.float64, 2: np.float64, 3: np.float64},
+                # Names like "NA" are kept, empty m/z values are errors
+                na_filter=False,
+                # Exactly like `float`
+                float_precision="round_trip",
+            )
+        except pd.errors.EmptyDataError:
+            # No analytes
+            columns = pd.DataFrame({0: [], 1: [], 2: [], 3: []})
+        return cls(
+            columns[0].to_numpy(dtype=object),
+            columns[1].to_numpy(dtype=np.float64),
+            columns[2].to_numpy(dtype=np.float64),
+            columns[3].to_numpy(dtype=np.float64),
+            (
+                precursor_tolerance_lower,
+                precursor_tolerance_upper,
+                fragment_tolerance_lower,
+                fragment_tolerance_upper,
+            ),
+        )
+
+    @classmethod
+    def from_analytes(cls, analytes: List[Analyte]) -> Self:
+        """
+        Create a table of existing analytes, which may have individual tolerances.
+        Indexing the table returns the given analyte objects.
+
+        Parameters
+        ----------
+        analytes : List[Analyte]
+            Analytes.
+        """
+        table = cls(
+            np.array([analyte.name for analyte in analytes], dtype=object),
+            np.array([analyte.precursor_mz for analyte in analytes], dtype=np.float64),
+            np.array([analyte.quantifier_mz for analyte in analytes], dtype=np.float64),
+            np.array([analyte.qualifier_mz for analyte in analytes], dtype=np.float64),
+            (0.0, 0.0, 0.0, 0.0),
+        )
+        table.precursor_mz_ranges = _ranges_of(analytes, "precursor_mz_range")
+        table.quantifier_mz_ranges = _ranges_of(analytes, "quantifier_mz_range")
+        table.qualifier_mz_ranges = _ranges_of(analytes, "qualifier_mz_range")
+        table.__analytes = list(analytes)
+        return table
+
+    @classmethod
+    def of(cls, analytes: Union[List[Analyte], "AnalyteTable"]) -> "AnalyteTable":
+        """
+        The given analyte table, or a table of the given analytes.
+
+        Parameters
+        ----------
+        analytes : Union[List[Analyte], AnalyteTable]
+            Analytes.
+
+        Returns
+        -------
+        AnalyteTable
+            Analyte table.
+        """
+        if isinstance(analytes, AnalyteTable):
+            return analytes
+        return cls.from_analytes(analytes)
+
+
+Analytes = Union[List[Analyte], AnalyteTable]
+"""Analytes as list of objects or as table."""
+
+
+def _mz_ranges(mz: np.ndarray, tolerance_lower_ppm: float, tolerance_upper_ppm: float):
+    """Vectorized `Analyte.calc_mz_range`, with the same floating point operations."""
+    ranges = np.empty((len(mz), 2), dtype=np.float64)
+    ranges[:, 0] = mz - mz / 1000000 * tolerance_lower_ppm
+    ranges[:, 1] = mz + mz / 1000000 * tolerance_upper_ppm
+    return ranges
+
+
+def _ranges_of(analytes: List[Analyte], attribute: str) -> np.ndarray:
+    """m/z ranges of the analytes as array with one row per analyte."""
+    return np.array(
+        [getattr(analyte, attribute) for analyte in analytes], dtype=np.float64
+    ).reshape(-1, 2)
@@ -2,7 +2,9 @@
 
 # std imports
 import argparse
+import sys
 from pathlib import Path
+from typing import List, Optional, Tuple
 
 
 class Cli:
@@ -17,73 +19,462 @@ class Cli:
                 "Mass Centric Direct Infusion Inspector "
                 "for searching targeted m/z in mzML files."
             ),
+            epilog=(
+                "Partial results of separate runs, e.g. one per mzML file, "
+                "are combined with `python -m macdii merge`, see `merge --help`. "
+                "`python -m macdii watch` quantifies mzML files as they are written "
+                "into a folder during acquisition, see `watch --help`."
+            ),
         )
 
+        add_output_type_argument(self.parser)
+
         self.parser.add_argument(
-            "--output-type",
-            type=str,
-            default="tsv",
-            choices=["tsv", "xlsx"],
-            help="Output file type [default=tsv].",
+            "--stream",
+            action="store_true",
+            help=(
+                "Write matches while searching and quantify on the fly, "
+                "instead of keeping all matches in memory."
+            ),
         )
 
         self.parser.add_argument(
-            "rt_start",
+            "--memory-limit",
             type=float,
-            help="Retention time start in seconds.",
+            default=None,
+            metavar="MIB",
+            help=(
+                "Keep at most this many MiB of matches in memory, further matches are "
+                "spilled to temporary files and written and quantified part by part. "
+                "Results are identical. --quantification-matrix keeps the intensity "
+                "of every match in memory in addition [default=no limit]."
+            ),
         )
 
         self.parser.add_argument(
-            "rt_stop",
-            type=float,
-            help="Retention time stop in seconds.",
+            "--spill-dir",
+            type=Path,
+            default=None,
+            help=(
+                "Folder for the temporary spill files of --memory-limit, "
+                "removed after the run [default=output folder]."
+            ),
         )
 
         self.parser.add_argument(
-            "precursor_tol_lower",
-            type=float,
-            help="Lower precursor tolerance in ppm for targeted m/z.",
+            "--jobs",
+            type=int,
+            default=1,
+            help=(
+                "Number of processes for searching multiple mzML files in parallel. "
+                "Results are identical to a single process run [default=1]."
+            ),
         )
 
         self.parser.add_argument(
-            "precursor_tol_upper",
-            type=float,
-            help="Upper precursor tolerance in ppm for targeted m/z.",
+            "--spectra-per-task",
+            type=int,
+            default=50000,
+            help=(
+                "With --jobs > 1, mzML files with more spectra are split into ranges of this "
+                "many spectra, which are searched in parallel. 0 disables splitting [default=50000]."
+            ),
         )
 
+        add_reader_threads_argument(self.parser)
+
         self.parser.add_argument(
-            "fragment_tol_lower",
-            type=float,
-            help="Lower fragment tolerance in ppm for targeted m/z.",
+            "--cache-dir",
+            type=Path,
+            default=None,
+            help=(
+                "Folder for caching the decoded spectra of each mzML file. Re-runs on the "
+                "same mzML files, e.g. with other tolerances or analytes, read the spectra "
+                "from the cache instead of parsing the mzML files. "
+                "Caches are rebuilt when a mzML file changes [default=no caching]."
+            ),
         )
 
         self.parser.add_argument(
-            "fragment_tol_upper",
-            type=float,
-            help="Upper fragment tolerance in ppm for targeted m/z.",
+            "--incremental",
+            action="store_true",
+            help=(
+                "Store the matches of each mzML file with a manifest in the output "
+                "folder. Re-runs with the same analytes, retention time window and "
+                "tolerances reuse them for files with unchanged content and only search "
+                "new or changed files. Results are identical to a full run."
+            ),
+        )
+
+        add_metrics_argument(self.parser)
+
+        add_quantification_matrix_argument(self.parser)
+
+        self.parser.add_argument(
+            "--sweep-rt",
+            type=range_pairs,
+            default=None,
+            metavar="START:STOP[,START:STOP...]",
+            help=(
+                "Sweep mode: comma separated retention time windows in seconds to evaluate. "
+                "All combinations with --sweep-precursor-tol and --sweep-fragment-tol "
+                "are evaluated in a single pass over the mzML files and a quantification "
+                "is written for each. Unswept parameters use the positional values."
+            ),
+        )
+
+        self.parser.add_argument(
+            "--sweep-precursor-tol",
+            type=range_pairs,
+            default=None,
+            metavar="LOWER[:UPPER][,LOWER[:UPPER]...]",
+            help=(
+                "Sweep mode: comma separated precursor tolerances in ppm to evaluate, "
+                "see --sweep-rt."
+            ),
         )
 
         self.parser.add_argument(
-            "analytes_file",
+            "--sweep-fragment-tol",
+            type=range_pairs,
+            default=None,
+            metavar="LOWER[:UPPER][,LOWER[:UPPER]...]",
+            help=(
+                "Sweep mode: comma separated fragment tolerances in ppm to evaluate, "
+                "see --sweep-rt."
+            ),
+        )
+
+        add_search_parameter_arguments(self.parser)
+
+        self.parser.add_argument(
+            "mzml_paths",
             type=Path,
+            nargs="+",
             help=(
-                "TSV files with analytes. Columns: name, precursor mz, quantifier_mz, qualifier_mz"
+                "Paths to mzML files to search for targeted m/z. Also accepts mzMLb files "
+                "(.mzMLb, requires h5py), FIFOs, gzip (.mzML.gz) or Zstandard (.mzML.zst, "
+                "requires zstandard) compressed files and `-` for the standard input, "
+                "which are read as stream."
+            ),
+        )
+
+    def parse(self, argv: Optional[List[str]] = None) -> argparse.Namespace:
+        """
+        Parse the command line arguments. If the first argument is `merge` or `watch`,
+        the remaining arguments are parsed by `MergeCli` or `WatchCli`.
+
+        Parameters
+        ----------
+        argv : Optional[List[str]]
+            Arguments, by default the arguments of the process.
+
+        Returns
+        -------
+        argparse.Namespace
+            Parsed arguments, `command` is `search`, `merge` or `watch`.
+        """
+        argv = sys.argv[1:] if argv is None else argv
+        if argv[:1] == ["merge"]:
+            return MergeCli().parse(argv[1:])
+        if argv[:1] == ["watch"]:
+            return WatchCli().parse(argv[1:])
+
+        args = self.parser.parse_args(argv)
+        args.command = "search"
+        # Imported after parsing, so `--help` does not wait for NumPy
+        from macdii.mzml_reader import STDIN_PATH, mzml_name
+
+        if args.jobs < 1:
+            self.parser.error("--jobs must be at least 1")
+        if args.mzml_paths.count(STDIN_PATH) > 1:
+            self.parser.error("the standard input `-` can only be read once")
+        if STDIN_PATH in args.mzml_paths and args.jobs > 1:
+            self.parser.error("--jobs does not support reading from the standard input")
+        if args.reader_threads < 0:
+            self.parser.error("--reader-threads must not be negative")
+        if args.memory_limit is not None and args.memory_limit <= 0:
+            self.parser.error("--memory-limit must be positive")
+        args.sweep = any(
+            values is not None
+            for values in (
+                args.sweep_rt,
+                args.sweep_precursor_tol,
+                args.sweep_fragment_tol,
+            )
+        )
+        if args.sweep and (
+            args.jobs > 1 or args.cache_dir is not None or args.reader_threads > 0
+        ):
+            self.parser.error(
+                "sweep mode does not support --jobs, --cache-dir and --reader-threads"
+            )
+        if args.sweep and args.quantification_matrix:
+            self.parser.error("sweep mode does not support --quantification-matrix")
+        if args.incremental:
+            if args.sweep:
+                self.parser.error("sweep mode does not support --incremental")
+            if STDIN_PATH in args.mzml_paths:
+                self.parser.error("--incremental does not support the standard input")
+            names = [mzml_name(path) for path in args.mzml_paths]
+            if len(set(names)) != len(names):
+                self.parser.error("--incremental requires distinct mzML file names")
+        return args
+
+
+class MergeCli:
+    """Command line interface for merging partial results of MaCDII runs."""
+
+    def __init__(self):
+        """Create a new command line interface for merging partial results."""
+
+        self.parser = argparse.ArgumentParser(
+            prog="MaCDII merge",
+            description=(
+                "Merge the matches of separate MaCDII runs, e.g. one per mzML file, "
+                "and quantify them, with the same results as a single run "
+                "over all mzML files in the given order."
             ),
         )
 
+        add_output_type_argument(self.parser)
+        add_quantification_matrix_argument(self.parser)
+        add_metrics_argument(self.parser)
+
         self.parser.add_argument(
             "output_folder",
             type=Path,
-            help=("Output folder to save the results."),
+            help="Output folder to save the results.",
         )
 
         self.parser.add_argument(
-            "mzml_paths",
+            "partials",
             type=Path,
             nargs="+",
-            help="Paths to mzML files to search for targeted m/z.",
+            help=(
+                "Output folders of the runs, or their quanitfier_matches files "
+                "(any output type)."
+            ),
+        )
+
+    def parse(self, argv: List[str]) -> argparse.Namespace:
+        """Parse the command line arguments of the merge subcommand."""
+        args = self.parser.parse_args(argv)
+        args.command = "merge"
+        return args
+
+
+class WatchCli:
+    """Command line interface for quantifying mzML files as they land in a folder."""
+
+    def __init__(self):
+        """Create a new command line interface for watching a folder."""
+
+        self.parser = argparse.ArgumentParser(
+            prog="MaCDII watch",
+            description=(
+                "Watch a folder and search each mzML file as soon as it is completely "
+                "written, e.g. while the instrument queue is running. The analytes and "
+                "lookup structures are loaded once, matches are appended to the match "
+                "file and the quantification is rewritten after each file. "
+                "Files which can not be searched are reported and skipped. "
+                "xlsx, parquet and feather match files are only readable after stopping. "
+                "Stops on Ctrl+C or SIGTERM after the current file."
+            ),
+        )
+
+        add_output_type_argument(self.parser)
+        add_quantification_matrix_argument(self.parser)
+        add_reader_threads_argument(self.parser)
+
+        self.parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds between checks of the folder for new files [default=2].",
+        )
+
+        self.parser.add_argument(
+            "--settle-time",
+            type=float,
+            default=5.0,
+            help=(
+                "Seconds a mzML file must be unchanged before it is searched, "
+                "in addition to ending with its closing tag [default=5]."
+            ),
+        )
+
+        self.parser.add_argument(
+            "--idle-timeout",
+            type=float,
+            default=None,
+            help=(
+                "Stop when no new file was completed for this many seconds, "
+                "e.g. at the end of the queue [default=run until stopped]."
+            ),
         )
 
-    def parse(self) -> argparse.Namespace:
-        """Parse the command line arguments."""
-        return self.parser.parse_args()
+        add_search_parameter_arguments(self.parser)
+
+        self.parser.add_argument(
+            "watch_folder",
+            type=Path,
+            help=(
+                "Folder to watch for mzML files, including mzMLb (.mzMLb), gzip "
+                "(.mzML.gz) or Zstandard (.mzML.zst) compressed files. "
+                "Existing files are searched first."
+            ),
+        )
+
+    def parse(self, argv: List[str]) -> argparse.Namespace:
+        """Parse the command line arguments of the watch subcommand."""
+        args = self.parser.parse_args(argv)
+        args.command = "watch"
+        if args.reader_threads < 0:
+            self.parser.error("--reader-threads must not be negative")
+        if args.poll_interval <= 0:
+            self.parser.error("--poll-interval must be positive")
+        if not args.watch_folder.is_dir():
+            self.parser.error(f"`{args.watch_folder}` is not a folder")
+        return args
+
+
+def add_search_parameter_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the positional retention time, tolerance, analyte and output arguments."""
+    parser.add_argument(
+        "rt_start",
+        type=float,
+        help="Retention time start in seconds.",
+    )
+
+    parser.add_argument(
+        "rt_stop",
+        type=float,
+        help="Retention time stop in seconds.",
+    )
+
+    parser.add_argument(
+        "precursor_tol_lower",
+        type=float,
+        help="Lower precursor tolerance in ppm for targeted m/z.",
+    )
+
+    parser.add_argument(
+        "precursor_tol_upper",
+        type=float,
+        help="Upper precursor tolerance in ppm for targeted m/z.",
+    )
+
+    parser.add_argument(
+        "fragment_tol_lower",
+        type=float,
+        help="Lower fragment tolerance in ppm for targeted m/z.",
+    )
+
+    parser.add_argument(
+        "fragment_tol_upper",
+        type=float,
+        help="Upper fragment tolerance in ppm for targeted m/z.",
+    )
+
+    parser.add_argument(
+        "analytes_file",
+        type=Path,
+        help=(
+            "TSV files with analytes. Columns: name, precursor mz, quantifier_mz, qualifier_mz"
+        ),
+    )
+
+    parser.add_argument(
+        "output_folder",
+        type=Path,
+        help=("Output folder to save the results."),
+    )
+
+
+def add_output_type_argument(parser: argparse.ArgumentParser) -> None:
+    """Add the `--output-type` option."""
+    parser.add_argument(
+        "--output-type",
+        type=str,
+        default="tsv",
+        choices=["tsv", "xlsx", "parquet", "feather"],
+        help=(
+            "Output file type, parquet and feather (Arrow IPC) "
+            "require pyarrow [default=tsv]."
+        ),
+    )
+
+
+def add_quantification_matrix_argument(parser: argparse.ArgumentParser) -> None:
+    """Add the `--quantification-matrix` option."""
+    parser.add_argument(
+        "--quantification-matrix",
+        action="store_true",
+        help=(
+            "Also write quantification_matrix.<type>, a wide table with the mean, sum, "
+            "median and number of quantifier intensities per analyte and mzML file."
+        ),
+    )
+
+
+def add_reader_threads_argument(parser: argparse.ArgumentParser) -> None:
+    """Add the `--reader-threads` option."""
+    parser.add_argument(
+        "--reader-threads",
+        type=int,
+        default=0,
+        help=(
+            "Number of background threads per mzML file which parse spectra and "
+            "decode peaks ahead of matching, overlapping decompression with matching. "
+            "With more than one, one thread parses and the others decode. Read ahead "
+            "spectra are limited, so memory stays bounded. Results are identical, "
+            "0 reads without background threads [default=0]."
+        ),
+    )
+
+
+def add_metrics_argument(parser: argparse.ArgumentParser) -> None:
+    """Add the `--metrics` option."""
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help=(
+            "Write wall and CPU time per stage and file as well as counters "
+            "of read, skipped and matched spectra to metrics.json in the output folder."
+        ),
+    )
+
+
+def range_pairs(value: str) -> List[Tuple[float, float]]:
+    """
+    Parse a comma separated list of `LOWER:UPPER` pairs,
+    a single number is used as lower and upper value.
+
+    Parameters
+    ----------
+    value : str
+        Command line value, e.g. `5,10,5:20`.
+
+    Returns
+    -------
+    List[Tuple[float, float]]
+        Lower and upper values.
+
+    Raises
+    ------
+    argparse.ArgumentTypeError
+        If an item is not one or two numbers separated by a colon.
+    """
+    pairs = []
+    for item in value.split(","):
+        parts = item.split(":")
+        try:
+            if len(parts) not in (1, 2):
+                raise ValueError()
+            pairs.append((float(parts[0]), float(parts[-1])))
+        except ValueError as error:
+            raise argparse.ArgumentTypeError(
+                f"expected NUMBER or NUMBER:NUMBER, got `{item}`"
+            ) from error
+    return pairs
@@ -0,0 +1,316 @@
+"""Matching engine for embedding MaCDII in other Python code, without CLI and files."""
+
+# std imports
+import itertools
+import math
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    TextIO,
+    Union,
+)
+
+# external imports
+import numpy as np
+
+from macdii.analyte_match import MatchTable, SpectrumMatches
+from macdii.analyte_quantification import AnalyteQuantification, RunningQuantification
+from macdii.analyte_table import Analytes, AnalyteTable
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.mzml_reader import mzml_name
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import match_fragments, search_mzml, search_spectra
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class ArraySpectrum(NamedTuple):
+    """MS2 spectrum given as NumPy arrays, e.g. straight from an acquisition software."""
+
+    spectrum_id: str
+    """ID of the spectrum."""
+
+    precursor_mz: float
+    """Experimental precursor m/z."""
+
+    mz_array: np.ndarray
+    """m/z of the peaks."""
+
+    intensity_array: np.ndarray
+    """Intensities of the peaks."""
+
+    precursor_charge: Optional[int] = None
+    """Experimental precursor charge, None if unknown."""
+
+
+Spectra = Union[Path, str, Iterable[ArraySpectrum], Iterable[Dict[str, Any]]]
+"""Path to a mzML file, spectra as arrays or spectra as parsed by pyteomics."""
+
+
+class MatchEngine:
+    """
+    Analytes with their precursor index and fragment matcher, built once and used
+    for any number of searches. Spectra are given as mzML paths, pyteomics spectrum
+    dicts or NumPy arrays (`ArraySpectrum`), so no process is started and no result
+    file is written and parsed again.
+
+    Example
+    -------
+    >>> engine = MatchEngine.from_tsv("analytes.tsv", 10, 10, 20, 20)
+    >>> matches = engine.match("sample.mzML")
+    >>> matches.to_dataframe()
+    >>> AnalyteQuantification.to_dataframe(engine.quantify(matches))
+    """
+
+    def __init__(
+        self,
+        analytes: Analytes,
+        rt_start: float = 0.0,
+        rt_stop: float = math.inf,
+    ):
+        """
+        Create a new engine.
+
+        Parameters
+        ----------
+        analytes : Analytes
+            Analytes with their tolerances, e.g. from `AnalyteTable.from_tsv`.
+        rt_start : float
+            Retention time start in seconds for mzML and pyteomics spectra, by default 0.0.
+        rt_stop : float
+            Retention time stop in seconds for mzML and pyteomics spectra,
+            by default infinite.
+        """
+        self.analytes = analytes
+        """Analytes, as referenced by the analyte index of the matches."""
+
+        self.rt_start = rt_start
+        """Retention time start in seconds."""
+
+        self.rt_stop = rt_stop
+        """Retention time stop in seconds."""
+
+        self.precursor_index = PrecursorIndex(analytes)
+        """Precursor index of the analytes."""
+
+        self.fragment_matcher = FragmentMatcher(analytes)
+        """Fragment matcher of the analytes."""
+
+    @classmethod
+    def from_tsv(
+        cls,
+        analytes_tsv: Union[Path, str, TextIO],
+        precursor_tolerance_lower: float,
+        precursor_tolerance_upper: float,
+        fragment_tolerance_lower: float,
+        fragment_tolerance_upper: float,
+        rt_start: float = 0.0,
+        rt_stop: float = math.inf,
+    ) -> "MatchEngine":
+        """
+        Create an engine for the analytes of a TSV file, see `AnalyteTable.from_tsv`.
+
+        Parameters
+        ----------
+        analytes_tsv : Union[Path, str, TextIO]
+            Path to the analyte TSV or open file.
+        precursor_tolerance_lower : float
+            The lower precursor tolerance in ppm.
+        precursor_tolerance_upper : float
+            The upper precursor tolerance in ppm.
+        fragment_tolerance_lower : float
+            The lower fragment tolerance in ppm.
+        fragment_tolerance_upper : float
+            The upper fragment tolerance in ppm.
+        rt_start : float
+            Retention time start in seconds, by default 0.0.
+        rt_stop : float
+            Retention time stop in seconds, by default infinite.
+
+        Returns
+        -------
+        MatchEngine
+            Engine.
+        """
+        tolerances = (
+            precursor_tolerance_lower,
+            precursor_tolerance_upper,
+            fragment_tolerance_lower,
+            fragment_tolerance_upper,
+        )
+        if isinstance(analytes_tsv, (Path, str)):
+            with open(analytes_tsv, "r", encoding="utf-8") as file:
+                analytes = AnalyteTable.from_tsv(file, *tolerances)
+        else:
+            analytes = AnalyteTable.from_tsv(analytes_tsv, *tolerances)
+        return cls(analytes, rt_start, rt_stop)
+
+    def match_arrays(self, spectrum: ArraySpectrum) -> Optional[SpectrumMatches]:
+        """
+        Match a single spectrum given as arrays. There is no retention time filter.
+
+        Parameters
+        ----------
+        spectrum : ArraySpectrum
+            Spectrum.
+
+        Returns
+        -------
+        Optional[SpectrumMatches]
+            Matches of the analytes, None if there are none.
+        """
+        candidate_indices = self.precursor_index.candidate_indices(
+            float(spectrum.precursor_mz)
+        )
+        if len(candidate_indices) == 0:
+            return None
+        return match_fragments(
+            self.fragment_matcher,
+            candidate_indices,
+            spectrum.spectrum_id,
+            float(spectrum.precursor_mz),
+            spectrum.precursor_charge,
+            np.asarray(spectrum.mz_array),
+            np.asarray(spectrum.intensity_array),
+        )
+
+    def iter_matches(
+        self, spectra: Spectra, reader_threads: int = 0
+    ) -> Iterator[SpectrumMatches]:
+        """
+        Match the given spectra one by one.
+
+        Parameters
+        ----------
+        spectra : Spectra
+            Path to a mzML file (read like the CLI does, see `search_mzml`), spectra as
+            `ArraySpectrum` or spectra parsed by pyteomics.
+        reader_threads : int
+            Number of background threads reading ahead in mzML files and pyteomics
+            spectra, see `search_spectra`, by default 0.
+
+        Yields
+        ------
+        SpectrumMatches
+            Matches of each spectrum with at least one match, in spectrum order.
+        """
+        if isinstance(spectra, (Path, str)):
+            yield from search_mzml(
+                Path(spectra),
+                self.precursor_index,
+                self.fragment_matcher,
+                self.rt_start,
+                self.rt_stop,
+                reader_threads=reader_threads,
+            )
+            return
+
+        spectra = iter(spectra)
+        first = next(spectra, None)
+        if first is None:
+            return
+        spectra = itertools.chain([first], spectra)
+        if isinstance(first, ArraySpectrum):
+            for spectrum in spectra:
+                spectrum_matches = self.match_arrays(spectrum)  # type: ignore
+                if spectrum_matches is not None:
+                    yield spectrum_matches
+            return
+
+        yield from search_spectra(
+            spectra,  # type: ignore
+            self.precursor_index,
+            self.fragment_matcher,
+            self.rt_start,
+            self.rt_stop,
+            reader_threads=reader_threads,
+        )
+
+    def match(
+        self,
+        spectra: Spectra,
+        filename: Optional[str] = None,
+        reader_threads: int = 0,
+    ) -> MatchTable:
+        """
+        Match the given spectra and collect the matches in a table,
+        e.g. for `MatchTable.to_dataframe` or `quantify`.
+
+        Parameters
+        ----------
+        spectra : Spectra
+            Spectra, see `iter_matches`.
+        filename : Optional[str]
+            Filename reported for the matches, by default the name of the mzML file,
+            otherwise an empty string.
+        reader_threads : int
+            Number of background threads reading ahead, see `iter_matches`, by default 0.
+
+        Returns
+        -------
+        MatchTable
+            Matches, referencing the analytes of the engine.
+        """
+        if filename is None:
+            filename = (
+                mzml_name(Path(spectra)) if isinstance(spectra, (Path, str)) else ""
+            )
+        table = MatchTable(self.analytes)
+        file_idx = table.add_file(filename)
+        for spectrum_matches in self.iter_matches(spectra, reader_threads):
+            table.append_spectrum(file_idx, spectrum_matches)
+        return table
+
+    def match_dataframe(
+        self, spectra: Spectra, filename: Optional[str] = None
+    ) -> "pd.DataFrame":
+        """
+        Match the given spectra, see `match`.
+
+        Returns
+        -------
+        pd.DataFrame
+            Matches with the columns of the match file.
+        """
+        return self.match(spectra, filename).to_dataframe()
+
+    def quantify(
+        self, matches: Union[MatchTable, Iterable[MatchTable]]
+    ) -> List[AnalyteQuantification]:
+        """
+        Quantify the analytes, like the quantification file of the CLI.
+
+        Parameters
+        ----------
+        matches : Union[MatchTable, Iterable[MatchTable]]
+            Matches of this engine, a single table or e.g. one table per batch.
+
+        Returns
+        -------
+        List[AnalyteQuantification]
+            Quantification of each analyte with matches.
+        """
+        quantification = self.running_quantification()
+        for table in [matches] if isinstance(matches, MatchTable) else matches:
+            quantification.add_table(table)
+        return quantification.quantifications()
+
+    def running_quantification(self) -> RunningQuantification:
+        """
+        Empty quantification of the analytes, for adding batches of matches
+        with `RunningQuantification.add_table` as they arrive.
+
+        Returns
+        -------
+        RunningQuantification
+            Quantification.
+        """
+        return RunningQuantification(self.analytes)
@@ -0,0 +1,129 @@
+"""Vectorized matching of quantifier and qualifier ions against a spectrum."""
+
+# std imports
+from typing import Optional, Sequence, Tuple
+
+# external imports
+import numpy as np
+
+from macdii.analyte_table import Analytes, AnalyteTable
+
+
+class FragmentMatcher:
+    """
+    Matches the quantifier and qualifier m/z ranges of many analytes against the m/z
+    array of a spectrum at once, using binary searches on the (sorted) m/z array
+    instead of testing every peak against every analyte.
+
+    The selected peaks are the same as when iterating over all peaks and testing
+    `Analyte.quantifier_contains`, and otherwise `Analyte.qualifier_contains`,
+    for each peak: the last matching peak of the m/z array wins and a peak matching the
+    quantifier is never used as qualifier.
+    """
+
+    def __init__(self, analytes: Analytes):
+        """
+        Create a new fragment matcher.
+
+        Parameters
+        ----------
+        analytes : Analytes
+            Analytes to match, e.g. as returned by `AnalyteTable.from_tsv`
+            or `Analyte.from_tsv`.
+        """
+        self.analytes = analytes
+        """Analytes in their original order."""
+
+        table = AnalyteTable.of(analytes)
+        self.__quantifier_bounds = table.quantifier_mz_ranges
+        self.__qualifier_bounds = table.qualifier_mz_ranges
+
+    def match(
+        self, mz_array: np.ndarray, analyte_indices: Optional[Sequence[int]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the quantifier and qualifier peaks of the given analytes.
+
+        Parameters
+        ----------
+        mz_array : np.ndarray
+            m/z array of the spectrum.
+        analyte_indices : Optional[Sequence[int]]
+            Indices of the analytes to match, e.g. from `PrecursorIndex.candidate_indices`.
+            All analytes if omitted.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            Peak indices of the quantifier and qualifier for each analyte,
+            -1 if there is no matching peak.
+        """
+        if analyte_indices is None:
+            quantifier_bounds = self.__quantifier_bounds
+            qualifier_bounds = self.__qualifier_bounds
+        else:
+            analyte_indices = np.asarray(analyte_indices, dtype=np.intp)
+            quantifier_bounds = self.__quantifier_bounds[analyte_indices]
+            qualifier_bounds = self.__qualifier_bounds[analyte_indices]
+
+        mz_array = np.asarray(mz_array)
+        # Peaks are usually sorted by m/z, if not work on a sorted view
+        # and map the positions back to the original peak indices.
+        order: Optional[np.ndarray] = None
+        if mz_array.size > 1 and np.any(mz_array[1:] < mz_array[:-1]):
+            order = np.argsort(mz_array, kind="stable")
+            mz_array = mz_array[order]
+
+        quantifier_start = np.searchsorted(mz_array, quantifier_bounds[:, 0], "left")
+        quantifier_stop = np.searchsorted(mz_array, quantifier_bounds[:, 1], "right")
+        qualifier_start = np.searchsorted(mz_array, qualifier_bounds[:, 0], "left")
+        qualifier_stop = np.searchsorted(mz_array, qualifier_bounds[:, 1], "right")
+
+        quantifier_peaks = _last_in_ranges(order, quantifier_start, quantifier_stop)
+        # Peaks within the quantifier range are never qualifiers, so the qualifier
+        # range is split into the parts below and above the quantifier range.
+        qualifier_peaks = np.maximum(
+            _last_in_ranges(
+                order, qualifier_start, np.minimum(qualifier_stop, quantifier_start)
+            ),
+            _last_in_ranges(
+                order, np.maximum(qualifier_start, quantifier_stop), qualifier_stop
+            ),
+        )
+        return quantifier_peaks, qualifier_peaks
+
+
+def _last_in_ranges(
+    order: Optional[np.ndarray], starts: np.ndarray, stops: np.ndarray
+) -> np.ndarray:
+    """
+    Highest original peak index within each range of sorted peak positions.
+
+    Parameters
+    ----------
+    order : Optional[np.ndarray]
+        Original peak indices of the sorted peaks, None if the peaks were already sorted.
+    starts : np.ndarray
+        First sorted position of each range.
+    stops : np.ndarray
+        Sorted position after the end of each range.
+
+    Returns
+    -------
+    np.ndarray
+        Peak index for each range, -1 for empty ranges.
+    """
+    is_empty = stops <= starts
+    if order is None:
+        return np.where(is_empty, -1, stops - 1)
+
+    # `reduceat` reduces from each index to the next one, so start and stop
+    # are interleaved. The sentinel makes a stop at the array end a valid index.
+    extended_order = np.append(order, -1)
+    bounds = np.empty(starts.size * 2, dtype=np.intp)
+    bounds[0::2] = starts
+    bounds[1::2] = stops
+    if bounds.size == 0:
+        return np.empty(0, dtype=np.intp)
+    maxima = np.maximum.reduceat(extended_order, bounds)[0::2]
+    return np.where(is_empty, -1, maxima)
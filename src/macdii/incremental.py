@@ -0,0 +1,309 @@
+"""Incremental runs: per file matches stored in the output folder and reused while unchanged."""
+
+# std imports
+import hashlib
+import itertools
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+# external imports
+import numpy as np
+
+from macdii.analyte_match import MatchTable
+from macdii.analyte_table import Analytes
+from macdii.mzml_reader import is_plain_file, mzml_name
+
+MANIFEST_VERSION: int = 1
+"""Version of the manifest and partial layout, other versions are discarded."""
+
+MANIFEST_FILE: str = "manifest.json"
+"""Name of the manifest in the output folder."""
+
+PARTIALS_FOLDER: str = "partials"
+"""Folder of the stored per file matches in the output folder."""
+
+
+def file_checksum(file_path: Path) -> str:
+    """
+    SHA-256 of the file content.
+
+    Parameters
+    ----------
+    file_path : Path
+        File path.
+
+    Returns
+    -------
+    str
+        Hex digest.
+    """
+    with file_path.open("rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def run_parameters(
+    analytes_file: Path,
+    rt_start: float,
+    rt_stop: float,
+    precursor_tol_lower: float,
+    precursor_tol_upper: float,
+    fragment_tol_lower: float,
+    fragment_tol_upper: float,
+) -> Dict[str, Any]:
+    """
+    Parameters which change the matches of a file. Stored partials are only
+    reused if all of them are the same.
+
+    Parameters
+    ----------
+    analytes_file : Path
+        Analyte TSV, identified by its checksum.
+    rt_start : float
+        Retention time start in seconds.
+    rt_stop : float
+        Retention time stop in seconds.
+    precursor_tol_lower : float
+        Lower precursor tolerance in ppm.
+    precursor_tol_upper : float
+        Upper precursor tolerance in ppm.
+    fragment_tol_lower : float
+        Lower fragment tolerance in ppm.
+    fragment_tol_upper : float
+        Upper fragment tolerance in ppm.
+
+    Returns
+    -------
+    Dict[str, Any]
+        JSON serializable parameters.
+    """
+    return {
+        "analytes_sha256": file_checksum(analytes_file),
+        "rt_start": rt_start,
+        "rt_stop": rt_stop,
+        "precursor_tol_lower": precursor_tol_lower,
+        "precursor_tol_upper": precursor_tol_upper,
+        "fragment_tol_lower": fragment_tol_lower,
+        "fragment_tol_upper": fragment_tol_upper,
+    }
+
+
+class Manifest:
+    """
+    Stored matches of each mzML file in an output folder, keyed by the checksum of
+    the file content. The manifest also records the run parameters, partials of
+    other parameters are discarded. Size and modification time of each path are
+    recorded as well, so unchanged files are not hashed again.
+    """
+
+    def __init__(self, output_folder: Path, parameters: Dict[str, Any]):
+        """
+        Open the manifest of the output folder, see `run_parameters`.
+
+        Parameters
+        ----------
+        output_folder : Path
+            Output folder.
+        parameters : Dict[str, Any]
+            Parameters of the current run.
+        """
+        self.output_folder = output_folder
+        self.parameters = parameters
+        self.partials_folder = output_folder.joinpath(PARTIALS_FOLDER)
+        # Resolved path of each mzML file => size, modification time and checksum
+        self.__files: Dict[str, Dict[str, Any]] = {}
+        # Checksums of the files with stored partials of these parameters
+        self.__partials: Set[str] = set()
+
+        manifest_path = output_folder.joinpath(MANIFEST_FILE)
+        if manifest_path.is_file():
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+            if (
+                manifest.get("version") == MANIFEST_VERSION
+                and manifest.get("parameters") == parameters
+            ):
+                self.__files = manifest["files"]
+                self.__partials = set(manifest["partials"])
+
+    def checksum(self, mzml_path: Path) -> str:
+        """
+        Checksum of the mzML file, taken from the manifest if its size
+        and modification time did not change.
+
+        Parameters
+        ----------
+        mzml_path : Path
+            Path to the mzML file.
+
+        Returns
+        -------
+        str
+            SHA-256 hex digest.
+        """
+        stat = mzml_path.stat()
+        key = str(mzml_path.resolve())
+        entry = self.__files.get(key)
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return entry["sha256"]
+        checksum = file_checksum(mzml_path)
+        self.__files[key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": checksum,
+        }
+        return checksum
+
+    def __partial_path(self, checksum: str) -> Path:
+        return self.partials_folder.joinpath(f"{checksum}.npz")
+
+    def contains(self, mzml_path: Path) -> bool:
+        """
+        Whether matches of the mzML file are stored.
+
+        Parameters
+        ----------
+        mzml_path : Path
+            Path to the mzML file.
+
+        Returns
+        -------
+        bool
+            True if the file was searched with the same parameters
+            and is a regular file.
+        """
+        return is_plain_file(mzml_path) and self.checksum(mzml_path) in self.__partials
+
+    def load(self, mzml_path: Path, analytes: Analytes) -> Optional[MatchTable]:
+        """
+        Stored matches of the mzML file.
+
+        Parameters
+        ----------
+        mzml_path : Path
+            Path to the mzML file.
+        analytes : Analytes
+            Analytes of the run.
+
+        Returns
+        -------
+        Optional[MatchTable]
+            Matches, None if the file was not searched with the same parameters
+            or is not a regular file.
+        """
+        if not self.contains(mzml_path):
+            return None
+        partial_path = self.__partial_path(self.checksum(mzml_path))
+        with np.load(partial_path, allow_pickle=False) as partial:
+            return MatchTable.from_columns(
+                analytes,
+                # A copied or renamed file has the same content
+                [mzml_name(mzml_path)],
+                partial["spectrum_ids"].tolist(),
+                {
+                    column: partial[column]
+                    for column in partial.files
+                    if column != "spectrum_ids"
+                },
+            )
+
+    def store(self, mzml_path: Path, table: MatchTable) -> None:
+        """
+        Store the matches of the mzML file.
+
+        Parameters
+        ----------
+        mzml_path : Path
+            Path to the mzML file, regular files only.
+        table : MatchTable
+            All matches of the file.
+        """
+        self.partials_folder.mkdir(parents=True, exist_ok=True)
+        checksum = self.checksum(mzml_path)
+        partial_path = self.__partial_path(checksum)
+        tmp_path = partial_path.with_name(f".{partial_path.name}")
+        with tmp_path.open("wb") as partial_file:
+            np.savez(
+                partial_file,
+                spectrum_ids=np.array(table.spectrum_ids, dtype=str),
+                **table.columns(),
+            )
+        os.replace(tmp_path, partial_path)
+        self.__partials.add(checksum)
+
+    def save(self) -> None:
+        """Write the manifest and delete partials no file refers to anymore."""
+        checksums = {entry["sha256"] for entry in self.__files.values()}
+        self.__partials &= checksums
+        self.output_folder.joinpath(MANIFEST_FILE).write_text(
+            json.dumps(
+                {
+                    "version": MANIFEST_VERSION,
+                    "parameters": self.parameters,
+                    "files": self.__files,
+                    "partials": sorted(self.__partials),
+                },
+                indent=2,
+            ),
+            encoding="utf-8",
+        )
+        for partial_path in self.partials_folder.glob("*.npz"):
+            if partial_path.stem not in self.__partials:
+                partial_path.unlink()
+
+
+def search_incremental(
+    mzml_paths: List[Path],
+    analytes: Analytes,
+    manifest: Manifest,
+    search: Callable[[List[Path]], Iterable[MatchTable]],
+) -> Iterator[MatchTable]:
+    """
+    Matches of the mzML files, read from stored partials where possible. The other
+    files are searched together and their matches are stored. Tables are yielded
+    in order of the files, like a search over all files.
+
+    Parameters
+    ----------
+    mzml_paths : List[Path]
+        Paths to the mzML files, with distinct names.
+    analytes : Analytes
+        Analytes of the run.
+    manifest : Manifest
+        Manifest of the output folder, saved when all files are done.
+    search : Callable[[List[Path]], Iterable[MatchTable]]
+        Searches the given files, yielding tables of one file each,
+        e.g. `search_mzmls` or `search_mzmls_parallel`.
+
+    Yields
+    ------
+    MatchTable
+        Consecutive parts of the matches.
+    """
+    # Partials are loaded one by one while yielding, so memory stays bounded
+    is_stored = {mzml_path: manifest.contains(mzml_path) for mzml_path in mzml_paths}
+    pending_paths = [mzml_path for mzml_path in mzml_paths if not is_stored[mzml_path]]
+    # Tables of consecutive files, files without matches may have no table
+    searched = itertools.groupby(
+        search(pending_paths) if len(pending_paths) > 0 else [],
+        key=lambda table: table.filenames[0],
+    )
+    group = next(searched, None)
+    for mzml_path in mzml_paths:
+        if is_stored[mzml_path]:
+            yield manifest.load(mzml_path, analytes)  # type: ignore
+            continue
+
+        file_table = MatchTable(analytes)
+        if group is not None and group[0] == mzml_name(mzml_path):
+            for table in group[1]:
+                file_table.extend(table)
+                yield table
+            group = next(searched, None)
+        if is_plain_file(mzml_path):
+            manifest.store(mzml_path, file_table)
+    manifest.save()
@@ -0,0 +1,71 @@
+"""Merging of partial results, e.g. of per file runs in a scatter/gather workflow."""
+
+# std imports
+from pathlib import Path
+from typing import List
+
+from macdii.analyte_match import DF_DTYPES as MATCH_DF_DTYPES
+from macdii.analyte_match import MatchTable
+from macdii.utils import dataframe_from_file
+
+MATCHES_FILE_STEM: str = "quanitfier_matches"
+"""Name of the match file of a run, without suffix."""
+
+
+def find_matches_file(partial_path: Path) -> Path:
+    """
+    Match file of a partial result.
+
+    Parameters
+    ----------
+    partial_path : Path
+        Output folder of a run, or its match file.
+
+    Returns
+    -------
+    Path
+        Match file.
+
+    Raises
+    ------
+    ValueError
+        If the folder does not contain exactly one match file.
+    """
+    if not partial_path.is_dir():
+        return partial_path
+    matches_paths = sorted(partial_path.glob(f"{MATCHES_FILE_STEM}.*"))
+    if len(matches_paths) != 1:
+        raise ValueError(
+            f"Expected one {MATCHES_FILE_STEM} file in `{partial_path}`, "
+            f"found {len(matches_paths)}"
+        )
+    return matches_paths[0]
+
+
+def read_partial_matches(partial_paths: List[Path]) -> MatchTable:
+    """
+    Read and concatenate the matches of partial results, in the given order.
+    Quantifying them yields the same result as a single run over the mzML files
+    of all partial results in the same order.
+
+    Parameters
+    ----------
+    partial_paths : List[Path]
+        Output folders of the runs, or their match files, see `find_matches_file`.
+
+    Returns
+    -------
+    MatchTable
+        All matches, see `MatchTable.from_dataframe`.
+    """
+    import pandas as pd
+
+    return MatchTable.from_dataframe(
+        pd.concat(
+            [
+                dataframe_from_file(find_matches_file(partial_path), MATCH_DF_DTYPES)
+                for partial_path in partial_paths
+            ],
+            ignore_index=True,
+        )
+    )
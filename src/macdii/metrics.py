@@ -0,0 +1,193 @@
+"""Timing and counters of a run, written as JSON report."""
+
+# std imports
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import (
+    Any,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+Clock = Tuple[float, float]
+"""Wall clock and process CPU time in seconds."""
+
+
+def clock() -> Clock:
+    """Current wall clock and process CPU time in seconds."""
+    return time.perf_counter(), time.process_time()
+
+
+class Metrics:
+    """
+    Wall and CPU time per stage and counters, overall and per mzML file.
+
+    Instrumented functions take an optional `Metrics` object and only measure anything
+    if it is given, so disabled metrics cost no more than a few `is not None` checks.
+    """
+
+    def __init__(self):
+        """Create empty metrics."""
+        self.stages: Dict[str, List[float]] = {}
+        """Accumulated wall and CPU time in seconds of each stage."""
+
+        self.counters: Dict[str, int] = {}
+        """Counters by name."""
+
+        self.files: Dict[str, Metrics] = {}
+        """Metrics of each mzML file by file name."""
+
+    def file(self, filename: str) -> "Metrics":
+        """
+        Metrics of a single mzML file, created on first access.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the mzML file.
+
+        Returns
+        -------
+        Metrics
+            Metrics of the file.
+        """
+        if filename not in self.files:
+            self.files[filename] = Metrics()
+        return self.files[filename]
+
+    def add_time(self, stage: str, start: Clock) -> Clock:
+        """
+        Add the time since `start` to a stage.
+
+        Parameters
+        ----------
+        stage : str
+            Stage name.
+        start : Clock
+            Start as returned by `clock`.
+
+        Returns
+        -------
+        Clock
+            Current time, to be used as start of the next stage.
+        """
+        now = clock()
+        times = self.stages.setdefault(stage, [0.0, 0.0])
+        times[0] += now[0] - start[0]
+        times[1] += now[1] - start[1]
+        return now
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        """Time the enclosed code as (part of) the given stage."""
+        start = clock()
+        try:
+            yield
+        finally:
+            self.add_time(stage, start)
+
+    def timed(self, stage: str, iterable: Iterable[T]) -> Iterator[T]:
+        """
+        Iterate the iterable and add the time spent producing each item to the stage,
+        e.g. the parsing time of spectra read by pyteomics.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(stage, start)
+                return
+            self.add_time(stage, start)
+            yield item
+
+    def count(self, counter: str, value: int = 1) -> None:
+        """Increase a counter."""
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def merge(self, other: "Metrics") -> None:
+        """
+        Add the times and counters of other metrics, e.g. collected by a worker process.
+
+        Parameters
+        ----------
+        other : Metrics
+            Metrics to add.
+        """
+        for stage, (wall, cpu) in other.stages.items():
+            times = self.stages.setdefault(stage, [0.0, 0.0])
+            times[0] += wall
+            times[1] += cpu
+        for counter, value in other.counters.items():
+            self.count(counter, value)
+        for filename, file_metrics in other.files.items():
+            self.file(filename).merge(file_metrics)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Metrics as JSON serializable dictionary. The overall stages and counters
+        include the ones of all files.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary with `stages`, `counters` and `files`.
+        """
+        overall = Metrics()
+        overall.merge(self)
+        for file_metrics in self.files.values():
+            overall.merge(file_metrics)
+        return {
+            "stages": _stages_to_dict(overall.stages),
+            "counters": dict(sorted(overall.counters.items())),
+            "files": {
+                filename: {
+                    "stages": _stages_to_dict(file_metrics.stages),
+                    "counters": dict(sorted(file_metrics.counters.items())),
+                }
+                for filename, file_metrics in self.files.items()
+            },
+        }
+
+    def to_file(self, file_path: Path) -> None:
+        """Write the metrics as JSON file, see `to_dict`."""
+        with file_path.open("w", encoding="utf-8") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+
+def _stages_to_dict(stages: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        stage: {"wall_s": wall, "cpu_s": cpu} for stage, (wall, cpu) in stages.items()
+    }
+
+
+def stage(metrics: Optional[Metrics], name: str) -> ContextManager:
+    """
+    Time the enclosed code as stage of the given metrics, does nothing if metrics are None.
+
+    Parameters
+    ----------
+    metrics : Optional[Metrics]
+        Metrics, None if disabled.
+    name : str
+        Stage name.
+
+    Returns
+    -------
+    ContextManager
+        Context manager timing the stage.
+    """
+    if metrics is None:
+        return nullcontext()
+    return metrics.stage(name)
@@ -0,0 +1,517 @@
+"""Reading spectra from mzML files."""
+
+# std imports
+import gzip
+import io
+import os
+import re
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, Iterator, List, Tuple, Union
+
+# external imports
+import numpy as np
+
+from macdii.utils import time_to_seconds
+
+if TYPE_CHECKING:
+    from pyteomics.mzml import PreIndexedMzML
+    from pyteomics.mzmlb import MzMLb
+
+INDEX_LIST_OFFSET_SEARCH_SIZE: int = 1024
+"""Number of bytes at the end of a mzML file which are searched for the index offset."""
+
+STDIN_PATH: Path = Path("-")
+"""Path which reads the mzML from the standard input."""
+
+COMPRESSION_SUFFIXES: Tuple[str, ...] = (".gz", ".zst")
+"""Suffixes of compressed mzML files, which are decompressed while reading."""
+
+MZMLB_SUFFIX: str = ".mzMLb"
+"""Suffix of mzMLb files, mzML with peak arrays stored in HDF5 datasets."""
+
+STREAM_HEAD_SIZE: int = 1 << 20
+"""Number of bytes at the beginning of a stream which are kept for seeking back."""
+
+SPECTRUM_HEAD_SIZE: int = 4096
+"""Number of bytes at the beginning of a spectrum which are searched for its scan
+start time, which precedes the binary data arrays."""
+
+MZMLB_XML_BLOCK_SIZE: int = 1 << 20
+"""Number of bytes read at once from the mzML dataset of a mzMLb file."""
+
+SCAN_START_TIME_PATTERN = re.compile(rb'<cvParam[^>]*"MS:1000016"[^>]*>')
+"""cvParam element of the scan start time."""
+
+CV_PARAM_ATTRIBUTE_PATTERN = re.compile(rb'(value|unitName)="([^"]*)"')
+"""Value and unit name attributes of a cvParam element."""
+
+
+def scan_start_time(spectrum: Dict[str, Any]) -> float:
+    """
+    Scan start time of a spectrum in seconds.
+
+    Parameters
+    ----------
+    spectrum : Dict[str, Any]
+        Spectrum as parsed by pyteomics.
+
+    Returns
+    -------
+    float
+        Scan start time in seconds.
+    """
+    return time_to_seconds(
+        spectrum["scanList"]["scan"][0]["scan start time"],
+        spectrum["scanList"]["scan"][0]["scan start time"].unit_info,
+    )
+
+
+def is_plain_file(mzml_path: Path) -> bool:
+    """
+    Check if the path is a regular, uncompressed file, which can be read
+    by random access. Standard input, FIFOs and compressed files can only
+    be read sequentially, see `open_mzml`.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML file.
+
+    Returns
+    -------
+    bool
+        True if the file is a regular, uncompressed file.
+    """
+    return (
+        mzml_path != STDIN_PATH
+        and mzml_path.suffix not in COMPRESSION_SUFFIXES
+        and mzml_path.is_file()
+    )
+
+
+def is_mzmlb(mzml_path: Path) -> bool:
+    """
+    Check if the file is a mzMLb file, by its suffix (case insensitive).
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML or mzMLb file.
+
+    Returns
+    -------
+    bool
+        True if the file is a mzMLb file.
+    """
+    return mzml_path.suffix.lower() == MZMLB_SUFFIX.lower()
+
+
+def mzml_name(mzml_path: Path) -> str:
+    """
+    Name of a mzML file in the results, without compression suffix,
+    so `a.mzML.gz` is reported like `a.mzML`. `stdin` for the standard input.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML file.
+
+    Returns
+    -------
+    str
+        Filename.
+    """
+    if mzml_path == STDIN_PATH:
+        return "stdin"
+    if mzml_path.suffix in COMPRESSION_SUFFIXES:
+        return mzml_path.stem
+    return mzml_path.name
+
+
+@contextmanager
+def open_mzml(mzml_path: Path) -> Iterator[BinaryIO]:
+    """
+    Open a mzML file for sequential reading with pyteomics.
+
+    Besides regular files this supports `-` for the standard input, FIFOs and
+    gzip (`.gz`) or Zstandard (`.zst`, requires `zstandard`) compressed files, which are
+    decompressed while reading, so e.g. converter output can be piped into MaCDII
+    without writing the mzML to disk. As pyteomics seeks back to the beginning after
+    reading the mzML version, the first `STREAM_HEAD_SIZE` bytes of such streams
+    are kept in memory.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML file, or `STDIN_PATH`.
+
+    Yields
+    ------
+    BinaryIO
+        Readable binary file.
+    """
+    if is_plain_file(mzml_path):
+        with mzml_path.open("rb") as mzml_file:
+            yield mzml_file
+        return
+
+    if mzml_path == STDIN_PATH:
+        raw = sys.stdin.buffer
+    else:
+        raw = mzml_path.open("rb")
+    try:
+        match mzml_path.suffix:
+            case ".gz":
+                stream = gzip.GzipFile(fileobj=raw, mode="rb")
+            case ".zst":
+                stream = (
+                    _import_zstandard()
+                    .ZstdDecompressor()
+                    .stream_reader(raw, read_across_frames=True)
+                )
+            case _:
+                stream = raw
+        yield io.BufferedReader(_HeadBufferedStream(stream, mzml_name(mzml_path)))
+    finally:
+        if raw is not sys.stdin.buffer:
+            raw.close()
+
+
+class _HeadBufferedStream(io.RawIOBase):
+    """
+    Sequential stream which keeps its first `STREAM_HEAD_SIZE` bytes, so it can seek
+    back into them. Seeking forward reads and discards the bytes in between.
+    """
+
+    def __init__(self, stream: BinaryIO, name: str):
+        self.__stream = stream
+        self.__head = bytearray()
+        # Position of the reader and of the underlying stream
+        self.__position = 0
+        self.__stream_position = 0
+        self.name = name
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.__position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self.__position
+        elif whence != os.SEEK_SET:
+            raise io.UnsupportedOperation("streams can not seek relative to the end")
+        if len(self.__head) < offset < self.__stream_position:
+            raise io.UnsupportedOperation(
+                f"streams can only seek back into the first {STREAM_HEAD_SIZE} bytes"
+            )
+        while self.__stream_position < offset:
+            self.__position = self.__stream_position
+            if not self.read(min(offset - self.__stream_position, 1 << 16)):
+                break
+        self.__position = offset
+        return offset
+
+    def readinto(self, buffer) -> int:
+        if self.__position < len(self.__head):
+            data = self.__head[self.__position : self.__position + len(buffer)]
+        elif self.__position == self.__stream_position:
+            data = self.__stream.read(len(buffer))
+            self.__stream_position += len(data)
+            if (
+                len(self.__head) + len(data) <= STREAM_HEAD_SIZE
+                and len(self.__head) == self.__position
+            ):
+                self.__head += data
+        else:
+            raise io.UnsupportedOperation(
+                f"streams can only seek back into the first {STREAM_HEAD_SIZE} bytes"
+            )
+        buffer[: len(data)] = data
+        self.__position += len(data)
+        return len(data)
+
+
+@contextmanager
+def read_spectra(mzml_path: Path) -> Iterator[Iterator[Dict[str, Any]]]:
+    """
+    Read all spectra of a mzML or mzMLb file sequentially, without decoding
+    the binary arrays (see `search_spectra`).
+
+    mzML files are opened with `open_mzml` and parsed by pyteomics. mzMLb files
+    (requires `h5py`) are read with pyteomics as well, but their peak arrays are
+    read from the HDF5 datasets in chunks of many spectra, instead of decoding
+    base64 text of each spectrum.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML or mzMLb file, or `STDIN_PATH`.
+
+    Yields
+    ------
+    Iterator[Dict[str, Any]]
+        Spectra in file order, as parsed by pyteomics.
+    """
+    if is_mzmlb(mzml_path):
+        with open_indexed_mzml(mzml_path) as reader:
+            yield iter(reader)
+        return
+
+    # Imported on first use, pyteomics and lxml take long to import
+    from pyteomics.mzml import read as read_mzml
+
+    with open_mzml(mzml_path) as mzml_file:
+        yield read_mzml(mzml_file, decode_binary=False)
+
+
+def _import_zstandard():
+    """Import the optional zstandard dependency.
+
+    Raises
+    ------
+    ImportError
+        If zstandard is not installed
+    """
+    try:
+        import zstandard
+    except ImportError as error:
+        raise ImportError(
+            "Reading .zst compressed mzML files requires `zstandard`, "
+            "install it with `pip install macdii[zstd]`"
+        ) from error
+    return zstandard
+
+
+def has_offset_index(mzml_path: Path) -> bool:
+    """
+    Check if the mzML file is an indexed mzML file. Always False for files which
+    can not be read by random access, see `is_plain_file`.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML file.
+
+    Returns
+    -------
+    bool
+        True if the file ends with an index offset.
+    """
+    if not is_plain_file(mzml_path):
+        return False
+    if is_mzmlb(mzml_path):
+        # The offset index is a HDF5 dataset of every mzMLb file
+        return True
+    with mzml_path.open("rb") as mzml_file:
+        mzml_file.seek(0, os.SEEK_END)
+        mzml_file.seek(max(0, mzml_file.tell() - INDEX_LIST_OFFSET_SEARCH_SIZE))
+        return b"<indexListOffset>" in mzml_file.read()
+
+
+def open_indexed_mzml(mzml_path: Path) -> Union["PreIndexedMzML", "MzMLb"]:
+    """
+    Open a mzML or mzMLb file for random access to its spectra.
+
+    Uses the offset index at the end of indexed mzML files. For mzML files without
+    index, pyteomics falls back to building the index by scanning the file.
+    mzMLb files are selected by their suffix (see `is_mzmlb`) and require `h5py`.
+    Binary arrays are not decoded, see `search_spectra`.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML or mzMLb file.
+
+    Returns
+    -------
+    Union[PreIndexedMzML, MzMLb]
+        Reader, has to be closed by the caller.
+    """
+    if is_mzmlb(mzml_path):
+        return _import_mzmlb()(str(mzml_path), decode_binary=False)
+
+    # Imported on first use, pyteomics and lxml take long to import
+    from pyteomics.mzml import PreIndexedMzML
+
+    return PreIndexedMzML(str(mzml_path), decode_binary=False)
+
+
+def _import_mzmlb():
+    """Import the mzMLb reader, which requires the optional h5py.
+
+    Raises
+    ------
+    ImportError
+        If h5py is not installed
+    """
+    try:
+        from macdii.mzmlb_reader import ChunkedMzMLb
+    except ImportError as error:
+        raise ImportError(
+            "Reading mzMLb files requires `h5py`, "
+            "install it with `pip install macdii[mzmlb]`"
+        ) from error
+    return ChunkedMzMLb
+
+
+def spectrum_ids(reader: "PreIndexedMzML") -> List[str]:
+    """
+    IDs of all spectra in file order.
+
+    Parameters
+    ----------
+    reader : PreIndexedMzML
+        Reader as returned by `open_indexed_mzml`.
+
+    Returns
+    -------
+    List[str]
+        Spectrum IDs.
+    """
+    return list(reader.index["spectrum"].keys())
+
+
+def read_spectra_range(
+    reader: "PreIndexedMzML", ids: List[str], start: int, stop: int
+) -> Iterator[Dict[str, Any]]:
+    """
+    Read a range of spectra by seeking directly to their byte offsets.
+
+    Parameters
+    ----------
+    reader : PreIndexedMzML
+        Reader as returned by `open_indexed_mzml`.
+    ids : List[str]
+        Spectrum IDs as returned by `spectrum_ids`.
+    start : int
+        Position of the first spectrum.
+    stop : int
+        Position after the last spectrum.
+
+    Yields
+    ------
+    Dict[str, Any]
+        Spectra in file order.
+    """
+    for spectrum_id in ids[start:stop]:
+        yield reader.get_by_id(spectrum_id)
+
+
+def scan_start_times(
+    mzml_path: Path, reader: Union["PreIndexedMzML", "MzMLb"], ids: List[str]
+) -> np.ndarray:
+    """
+    Scan start time of each spectrum in seconds. Only the beginning of each spectrum
+    is read at its byte offset and searched for the scan start time, spectra without
+    a recognizable scan start time are parsed by pyteomics.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML or mzMLb file.
+    reader : Union[PreIndexedMzML, MzMLb]
+        Reader of the file as returned by `open_indexed_mzml`.
+    ids : List[str]
+        Spectrum IDs as returned by `spectrum_ids`.
+
+    Returns
+    -------
+    np.ndarray
+        Scan start times in seconds, in the order of `ids`.
+    """
+    times = np.empty(len(ids), dtype=np.float64)
+    heads = _spectrum_heads(mzml_path, reader.index["spectrum"], ids)
+    for spectrum_idx, (spectrum_id, head) in enumerate(zip(ids, heads)):
+        # Short spectra are followed by the next one
+        spectrum_end = head.find(b"</spectrum>")
+        if spectrum_end >= 0:
+            head = head[:spectrum_end]
+        match = SCAN_START_TIME_PATTERN.search(head)
+        attributes = (
+            dict(CV_PARAM_ATTRIBUTE_PATTERN.findall(match.group()))
+            if match is not None
+            else {}
+        )
+        if b"value" in attributes and b"unitName" in attributes:
+            times[spectrum_idx] = time_to_seconds(
+                float(attributes[b"value"]), attributes[b"unitName"].decode()
+            )
+        else:
+            times[spectrum_idx] = scan_start_time(reader.get_by_id(spectrum_id))
+    return times
+
+
+def _spectrum_heads(
+    mzml_path: Path, offsets: Dict[str, int], ids: List[str]
+) -> Iterator[bytes]:
+    """
+    First `SPECTRUM_HEAD_SIZE` bytes of each spectrum, read at their byte offsets.
+    The mzML of mzMLb files is a HDF5 dataset, which is read in blocks of
+    `MZMLB_XML_BLOCK_SIZE` bytes.
+    """
+    if not is_mzmlb(mzml_path):
+        with mzml_path.open("rb") as mzml_file:
+            for spectrum_id in ids:
+                mzml_file.seek(offsets[spectrum_id])
+                yield mzml_file.read(SPECTRUM_HEAD_SIZE)
+        return
+
+    import h5py
+
+    with h5py.File(mzml_path, "r") as mzmlb_file:
+        xml = mzmlb_file["mzML"]
+        block = b""
+        block_start = 0
+        for spectrum_id in ids:
+            offset = offsets[spectrum_id]
+            head_stop = min(offset + SPECTRUM_HEAD_SIZE, len(xml))
+            if not block_start <= offset <= head_stop <= block_start + len(block):
+                block = xml[offset : offset + MZMLB_XML_BLOCK_SIZE].tobytes()
+                block_start = offset
+            yield block[offset - block_start : head_stop - block_start]
+
+
+def rt_window_range(
+    mzml_path: Path,
+    reader: Union["PreIndexedMzML", "MzMLb"],
+    ids: List[str],
+    rt_start: float,
+    rt_stop: float,
+) -> Tuple[int, int]:
+    """
+    Range of spectrum positions from the first to the last spectrum within the
+    retention time window, based on the scan start times of all spectra, see
+    `scan_start_times`. The scan start times do not need to be ordered, spectra
+    within the range may be outside the window and have to be skipped when searching.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML or mzMLb file.
+    reader : Union[PreIndexedMzML, MzMLb]
+        Reader as returned by `open_indexed_mzml`.
+    ids : List[str]
+        Spectrum IDs as returned by `spectrum_ids`.
+    rt_start : float
+        Retention time start in seconds.
+    rt_stop : float
+        Retention time stop in seconds.
+
+    Returns
+    -------
+    Tuple[int, int]
+        Position of the first spectrum within the window and position after the last
+        spectrum within the window, (0, 0) if no spectrum is within the window.
+    """
+    times = scan_start_times(mzml_path, reader, ids)
+    in_window = np.flatnonzero((rt_start <= times) & (times <= rt_stop))
+    if len(in_window) == 0:
+        return 0, 0
+    return int(in_window[0]), int(in_window[-1]) + 1
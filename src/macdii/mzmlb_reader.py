@@ -0,0 +1,52 @@
+"""Reading spectra from mzMLb files, mzML with the peak arrays stored in HDF5 datasets.
+
+Requires `h5py`, use `macdii.mzml_reader.open_indexed_mzml`, which imports this
+module only for mzMLb files.
+"""
+
+# std imports
+from typing import Any, Dict
+
+# external imports
+import numpy as np
+from pyteomics.mzmlb import ExternalArrayRegistry, MzMLb
+
+ARRAY_CHUNK_SIZE: int = 1 << 20
+"""Number of array entries read at once from a HDF5 dataset, i.e. the peaks
+of thousands of spectra."""
+
+
+class ChunkedArrayRegistry(ExternalArrayRegistry):
+    """
+    Reads the peak arrays of consecutive spectra in chunks of `ARRAY_CHUNK_SIZE`
+    entries, like pyteomics, but looks up each HDF5 dataset and its type only once
+    instead of for each array of each spectrum.
+    """
+
+    def __init__(self, registry, chunk_size: int = ARRAY_CHUNK_SIZE):
+        super().__init__(registry, chunk_size)
+        self.__datasets: Dict[str, Any] = {}
+        self.__dtypes: Dict[str, np.dtype] = {}
+
+    def __dataset(self, array_name: str):
+        dataset = self.__datasets.get(array_name)
+        if dataset is None:
+            dataset = self.registry[array_name]
+            self.__datasets[array_name] = dataset
+            self.__dtypes[array_name] = dataset.dtype
+        return dataset
+
+    def _get_raw(self, array_name: str, start: int, end: int) -> np.ndarray:
+        return self.__dataset(array_name)[start:end]
+
+    def dtype_of(self, array_name: str) -> np.dtype:
+        self.__dataset(array_name)
+        return self.__dtypes[array_name]
+
+
+class ChunkedMzMLb(MzMLb):
+    """pyteomics' mzMLb reader using `ChunkedArrayRegistry`."""
+
+    def _make_mzml_parser(self, kwargs):
+        self._array_registry = ChunkedArrayRegistry(self.handle)
+        super()._make_mzml_parser(kwargs)
@@ -0,0 +1,258 @@
+"""Parallel search of analytes in mzML files."""
+
+# std imports
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from macdii.analyte_match import MatchTable
+from macdii.analyte_table import Analytes
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.metrics import Metrics, stage
+from macdii.mzml_reader import (
+    is_plain_file,
+    mzml_name,
+    open_indexed_mzml,
+    read_spectra_range,
+    rt_window_range,
+    spectrum_ids,
+)
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzml, search_spectra
+
+SearchTask = Tuple[Path, Optional[int], Optional[int], bool]
+"""
+mzML file, the range of spectrum positions to search and whether the range is the
+last one of the file. The range is `None` if the file is searched as a whole.
+"""
+
+TASKS_AHEAD_PER_JOB: int = 2
+"""Number of tasks submitted per worker process before their results are consumed."""
+
+# Per process state of the workers, set once by `_init_worker`
+_worker_state: Dict[str, object] = {}
+
+
+def _init_worker(
+    analytes: Analytes,
+    rt_start: float,
+    rt_stop: float,
+    cache_dir: Optional[Path],
+    collect_metrics: bool,
+    reader_threads: int,
+) -> None:
+    """Build the lookup structures once per worker process."""
+    _worker_state["precursor_index"] = PrecursorIndex(analytes)
+    _worker_state["fragment_matcher"] = FragmentMatcher(analytes)
+    _worker_state["rt_start"] = rt_start
+    _worker_state["rt_stop"] = rt_stop
+    _worker_state["cache_dir"] = cache_dir
+    _worker_state["collect_metrics"] = collect_metrics
+    _worker_state["reader_threads"] = reader_threads
+    _worker_state["reader"] = None
+    # Pool workers end without running `atexit` hooks, but with multiprocessing's finalizers
+    Finalize(None, _close_worker_reader, exitpriority=0)
+
+
+def _worker_reader(mzml_path: Path) -> Tuple[object, List[str]]:
+    """
+    Indexed reader and spectrum IDs of the given file. The last reader is kept open,
+    as consecutive tasks of a worker often belong to the same file, until the worker
+    searched the last range of the file, switches to another file or ends.
+    """
+    cached = _worker_state["reader"]
+    if cached is not None and cached[0] == mzml_path:  # type: ignore
+        return cached[1], cached[2]  # type: ignore
+    _close_worker_reader()
+    reader = open_indexed_mzml(mzml_path)
+    ids = spectrum_ids(reader)
+    _worker_state["reader"] = (mzml_path, reader, ids)
+    return reader, ids
+
+
+def _close_worker_reader() -> None:
+    """Close the reader kept open by `_worker_reader`, if any."""
+    cached = _worker_state.get("reader")
+    if cached is not None:
+        _worker_state["reader"] = None
+        cached[1].close()  # type: ignore
+
+
+def _search_task(task: SearchTask) -> Tuple[MatchTable, Optional[Metrics]]:
+    """
+    Search a whole mzML file or a range of its spectra within a worker process.
+    Returns the matches and, if enabled, the metrics of the task.
+    """
+    mzml_path, start, stop, is_last_range = task
+    precursor_index: PrecursorIndex = _worker_state["precursor_index"]  # type: ignore
+    fragment_matcher: FragmentMatcher = _worker_state["fragment_matcher"]  # type: ignore
+    rt_start: float = _worker_state["rt_start"]  # type: ignore
+    rt_stop: float = _worker_state["rt_stop"]  # type: ignore
+    cache_dir: Optional[Path] = _worker_state["cache_dir"]  # type: ignore
+    reader_threads: int = _worker_state["reader_threads"]  # type: ignore
+    metrics = Metrics() if _worker_state["collect_metrics"] else None
+    file_metrics = None if metrics is None else metrics.file(mzml_name(mzml_path))
+
+    if start is None or stop is None:
+        spectrum_matches = search_mzml(
+            mzml_path,
+            precursor_index,
+            fragment_matcher,
+            rt_start,
+            rt_stop,
+            cache_dir,
+            file_metrics,
+            reader_threads,
+        )
+    else:
+        reader, ids = _worker_reader(mzml_path)
+        spectrum_matches = search_spectra(
+            read_spectra_range(reader, ids, start, stop),
+            precursor_index,
+            fragment_matcher,
+            rt_start,
+            rt_stop,
+            file_metrics,
+            reader_threads,
+        )
+
+    table = MatchTable(precursor_index.analytes)
+    file_idx = table.add_file(mzml_name(mzml_path))
+    for matches in spectrum_matches:
+        table.append_spectrum(file_idx, matches)
+    if is_last_range:
+        _close_worker_reader()
+    return table, metrics
+
+
+def plan_tasks(
+    mzml_paths: List[Path], spectra_per_task: int, rt_start: float, rt_stop: float
+) -> List[SearchTask]:
+    """
+    Split the mzML files into tasks of at most `spectra_per_task` spectra.
+    Only the spectra within the retention time window are split,
+    files which can not be read by random access are never split.
+
+    Parameters
+    ----------
+    mzml_paths : List[Path]
+        Paths to the mzML files.
+    spectra_per_task : int
+        Maximum number of spectra per task, files are not split if < 1.
+    rt_start : float
+        Retention time start in seconds.
+    rt_stop : float
+        Retention time stop in seconds.
+
+    Returns
+    -------
+    List[SearchTask]
+        Tasks in file and spectrum order.
+    """
+    tasks: List[SearchTask] = []
+    for mzml_path in mzml_paths:
+        # Streams and compressed files can only be read sequentially
+        if spectra_per_task < 1 or not is_plain_file(mzml_path):
+            tasks.append((mzml_path, None, None, True))
+            continue
+        with open_indexed_mzml(mzml_path) as reader:
+            window_start, window_stop = rt_window_range(
+                mzml_path, reader, spectrum_ids(reader), rt_start, rt_stop
+            )
+        if window_stop - window_start <= spectra_per_task:
+            tasks.append((mzml_path, None, None, True))
+            continue
+        tasks.extend(
+            (
+                mzml_path,
+                start,
+                min(start + spectra_per_task, window_stop),
+                start + spectra_per_task >= window_stop,
+            )
+            for start in range(window_start, window_stop, spectra_per_task)
+        )
+    return tasks
+
+
+def search_mzmls_parallel(
+    mzml_paths: List[Path],
+    analytes: Analytes,
+    rt_start: float,
+    rt_stop: float,
+    jobs: int,
+    spectra_per_task: int = 0,
+    cache_dir: Optional[Path] = None,
+    metrics: Optional[Metrics] = None,
+    reader_threads: int = 0,
+) -> Iterator[MatchTable]:
+    """
+    Search the analytes in multiple mzML files using a pool of processes.
+    Large files can be split into ranges of spectra, which are searched in parallel.
+    With a cache folder files are never split, as each file is read from (or written to)
+    its spectrum cache by a single process.
+
+    Parameters
+    ----------
+    mzml_paths : List[Path]
+        Paths to the mzML files.
+    analytes : Analytes
+        Analytes to search.
+    rt_start : float
+        Retention time start in seconds.
+    rt_stop : float
+        Retention time stop in seconds.
+    jobs : int
+        Number of worker processes.
+    spectra_per_task : int
+        Files with more spectra are split into ranges of this many spectra,
+        by default 0 (files are not split).
+    cache_dir : Optional[Path]
+        Folder of the spectrum caches, by default None (no caching).
+    metrics : Optional[Metrics]
+        Collects stage times and counters of each file if given.
+        The times are summed over all worker processes.
+    reader_threads : int
+        Number of background threads reading ahead in each worker process,
+        see `search_spectra`, by default 0.
+
+    Yields
+    ------
+    MatchTable
+        Matches of each task, in the same order as searching the files one after another.
+    """
+    if cache_dir is not None:
+        spectra_per_task = 0
+    with stage(metrics, "plan_tasks"):
+        tasks = plan_tasks(mzml_paths, spectra_per_task, rt_start, rt_stop)
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(
+            analytes,
+            rt_start,
+            rt_stop,
+            cache_dir,
+            metrics is not None,
+            reader_threads,
+        ),
+    ) as executor:
+        # Results are yielded in submission order. Only a few tasks per worker are
+        # submitted ahead, so results finished before an earlier, slow task do not
+        # pile up in memory.
+        pending_tasks = iter(tasks)
+        futures: Deque[Future] = deque(
+            executor.submit(_search_task, task)
+            for task in islice(pending_tasks, TASKS_AHEAD_PER_JOB * jobs)
+        )
+        while len(futures) > 0:
+            table, task_metrics = futures.popleft().result()
+            for task in islice(pending_tasks, 1):
+                futures.append(executor.submit(_search_task, task))
+            if metrics is not None and task_metrics is not None:
+                metrics.merge(task_metrics)
+            # Analytes are not pickled with the table
+            table.analytes = analytes
+            yield table
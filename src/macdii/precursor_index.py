@@ -0,0 +1,91 @@
+"""Lookup of analytes by precursor m/z."""
+
+# std imports
+from bisect import bisect_left, bisect_right
+from typing import List
+
+# external imports
+import numpy as np
+
+from macdii.analyte import Analyte
+from macdii.analyte_table import Analytes, AnalyteTable
+
+
+class PrecursorIndex:
+    """
+    Interval index over the precursor m/z ranges of a list of analytes.
+
+    The ranges are sorted by their lower bound. Together with the running maximum
+    of the upper bounds this allows to narrow down the analytes, which may contain a
+    precursor m/z, with two binary searches, even if the ppm windows overlap.
+    """
+
+    def __init__(self, analytes: Analytes):
+        """
+        Create a new precursor index.
+
+        Parameters
+        ----------
+        analytes : Analytes
+            Analytes to index, e.g. as returned by `AnalyteTable.from_tsv`
+            or `Analyte.from_tsv`.
+        """
+        self.analytes = analytes
+        """Indexed analytes in their original order."""
+
+        ranges = AnalyteTable.of(analytes).precursor_mz_ranges
+        order = np.argsort(ranges[:, 0], kind="stable")
+        # Lists, as `bisect` on lists is faster than on arrays
+        self.__order: List[int] = order.tolist()
+        self.__lower_bounds: List[float] = ranges[order, 0].tolist()
+        self.__upper_bounds: List[float] = ranges[order, 1].tolist()
+        # Monotonic, so everything before the first value >= m/z can be skipped
+        self.__max_upper_bounds: List[float] = np.maximum.accumulate(
+            ranges[order, 1]
+        ).tolist()
+
+    def __len__(self) -> int:
+        return len(self.analytes)
+
+    def candidate_indices(self, mz: float) -> List[int]:
+        """
+        Indices of the analytes whose precursor m/z range contains the given m/z.
+
+        Parameters
+        ----------
+        mz : float
+            Precursor m/z of the spectrum.
+
+        Returns
+        -------
+        List[int]
+            Indices into `analytes`, in ascending order.
+        """
+        start = bisect_left(self.__max_upper_bounds, mz)
+        stop = bisect_right(self.__lower_bounds, mz)
+        return sorted(
+            self.__order[position]
+            for position in range(start, stop)
+            if mz <= self.__upper_bounds[position]
+        )
+
+    def candidates(self, mz: float) -> List[Analyte]:
+        """
+        Analytes whose precursor m/z range contains the given m/z.
+
+        The analytes are returned in the same order as they were passed to the index,
+        so results are identical to testing every analyte with `Analyte.precursor_contains`.
+
+        Parameters
+        ----------
+        mz : float
+            Precursor m/z of the spectrum.
+
+        Returns
+        -------
+        List[Analyte]
+            Matching analytes.
+        """
+        return [
+            self.analytes[analyte_idx] for analyte_idx in self.candidate_indices(mz)
+        ]
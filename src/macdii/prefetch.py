@@ -0,0 +1,110 @@
+"""Reading ahead in background threads, overlapping parsing and decoding with matching."""
+
+# std imports
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+DEFAULT_QUEUE_SIZE: int = 64
+"""Default number of items read ahead."""
+
+# Markers of the queue entries
+_ITEM = 0
+_DONE = 1
+_ERROR = 2
+
+# Seconds between checks whether the consumer stopped, while the queue is full
+_PUT_TIMEOUT = 0.1
+
+
+def prefetch(
+    iterable: Iterable[T],
+    transform: Optional[Callable[[T], U]] = None,
+    threads: int = 1,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> Iterator[U]:
+    """
+    Iterate in a background thread and apply an optional transformation, while the
+    caller processes the previous items. Parsing mzML with pyteomics and decoding
+    with zlib partly release the GIL, so this overlaps reading and matching.
+
+    The items are passed through a bounded queue: the background thread blocks when
+    `queue_size` items are waiting, so memory stays bounded if the caller is slower.
+    Items are yielded in order. Exceptions of the background thread are raised
+    in the caller. When the caller stops early, e.g. by closing the generator,
+    the background thread stops after its current item and is joined,
+    so the underlying file can be closed afterwards.
+
+    Parameters
+    ----------
+    iterable : Iterable[T]
+        Items, iterated in the background thread only.
+    transform : Optional[Callable[[T], U]]
+        Applied to each item in the background, by default None (items are yielded as they are).
+    threads : int
+        Number of background threads. With more than one, one thread iterates
+        and the others apply the transformation, by default 1.
+    queue_size : int
+        Maximum number of items read ahead, by default `DEFAULT_QUEUE_SIZE`.
+
+    Yields
+    ------
+    U
+        Transformed items in order.
+    """
+    items: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    executor = (
+        ThreadPoolExecutor(threads - 1, thread_name_prefix="macdii-transform")
+        if threads > 1 and transform is not None
+        else None
+    )
+
+    def put(kind: int, value) -> bool:
+        """Put into the queue, waiting for free space. False if the consumer stopped."""
+        while not stop.is_set():
+            try:
+                items.put((kind, value), timeout=_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                if executor is not None:
+                    value = executor.submit(transform, item)  # type: ignore
+                elif transform is not None:
+                    value = transform(item)
+                else:
+                    value = item
+                if not put(_ITEM, value):
+                    return
+            put(_DONE, None)
+        except BaseException as error:
+            # Raised in the caller, which would wait forever otherwise
+            put(_ERROR, error)
+            if not isinstance(error, Exception):
+                # KeyboardInterrupt and SystemExit also end the thread
+                raise
+
+    thread = threading.Thread(target=produce, name="macdii-reader", daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == _DONE:
+                return
+            if kind == _ERROR:
+                raise value
+            yield value.result() if executor is not None else value
+    finally:
+        stop.set()
+        thread.join()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
@@ -0,0 +1,493 @@
+"""Search of analytes in the spectra of mzML files."""
+
+# std imports
+from contextlib import closing
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+# external imports
+import numpy as np
+
+from macdii.analyte_match import MISSING_CHARGE, MatchTable, SpectrumMatches
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.metrics import Metrics, clock, stage
+from macdii.mzml_reader import (
+    STDIN_PATH,
+    has_offset_index,
+    mzml_name,
+    open_indexed_mzml,
+    read_spectra,
+    read_spectra_range,
+    rt_window_range,
+    scan_start_time,
+    spectrum_ids,
+)
+from macdii.precursor_index import PrecursorIndex
+from macdii.prefetch import prefetch
+from macdii.spectrum_cache import SpectrumCache
+
+
+def search_spectra(
+    spectra: Iterable[Dict[str, Any]],
+    precursor_index: PrecursorIndex,
+    fragment_matcher: FragmentMatcher,
+    rt_start: float,
+    rt_stop: float,
+    metrics: Optional[Metrics] = None,
+    reader_threads: int = 0,
+) -> Iterator[SpectrumMatches]:
+    """
+    Search the analytes in the given spectra.
+
+    The spectra may be read without decoding the binary arrays (`decode_binary=False`),
+    in which case the peak arrays are only decoded for spectra
+    with at least one precursor candidate.
+    Spectra outside of the retention time window are skipped, so the spectra
+    do not need to be ordered by scan start time.
+
+    Parameters
+    ----------
+    spectra : Iterable[Dict[str, Any]]
+        Spectra as parsed by pyteomics.
+    precursor_index : PrecursorIndex
+        Precursor index of the analytes.
+    fragment_matcher : FragmentMatcher
+        Fragment matcher of the same analytes.
+    rt_start : float
+        Retention time start in seconds.
+    rt_stop : float
+        Retention time stop in seconds.
+    metrics : Optional[Metrics]
+        Metrics of the mzML file, collecting stage times and counters if given.
+    reader_threads : int
+        Number of background threads parsing the spectra and decoding the peaks
+        of spectra with precursor candidates ahead of matching, see `prefetch`.
+        0 reads in the calling thread, by default 0. With background threads,
+        the parse stage is the time spent waiting for the next spectrum.
+
+    Yields
+    ------
+    SpectrumMatches
+        Matches of each spectrum with at least one match, in spectrum order.
+        The matches of a spectrum are in analyte order.
+    """
+    if reader_threads <= 0:
+        yield from _search_spectra(
+            spectra, precursor_index, fragment_matcher, rt_start, rt_stop, metrics
+        )
+        return
+
+    # Closed explicitly, so the reader thread is joined before the file is closed
+    with closing(
+        prefetch(
+            spectra,
+            partial(
+                _decode_candidate_peaks,
+                precursor_index=precursor_index,
+                rt_start=rt_start,
+                rt_stop=rt_stop,
+            ),
+            threads=reader_threads,
+        )
+    ) as prefetched_spectra:
+        yield from _search_spectra(
+            prefetched_spectra,
+            precursor_index,
+            fragment_matcher,
+            rt_start,
+            rt_stop,
+            metrics,
+        )
+
+
+def _search_spectra(
+    spectra: Iterable[Dict[str, Any]],
+    precursor_index: PrecursorIndex,
+    fragment_matcher: FragmentMatcher,
+    rt_start: float,
+    rt_stop: float,
+    metrics: Optional[Metrics],
+) -> Iterator[SpectrumMatches]:
+    """See `search_spectra`."""
+    if metrics is not None:
+        spectra = metrics.timed("parse", spectra)
+    for spectrum in spectra:
+        if metrics is not None:
+            metrics.count("spectra_read")
+
+        # Get scan start time and check if it is within the specified range
+        if not rt_start <= scan_start_time(spectrum) <= rt_stop:
+            if metrics is not None:
+                metrics.count("spectra_skipped_rt")
+            continue
+
+        if spectrum["ms level"] != 2:
+            if metrics is not None:
+                metrics.count("spectra_skipped_ms_level")
+            continue
+
+        selected_ion = _selected_ion(spectrum)
+        if selected_ion is None:
+            if metrics is not None:
+                metrics.count("spectra_skipped_no_precursor")
+            continue
+        precursor_mz = float(selected_ion["selected ion m/z"])
+
+        # Check if any analyte matches on of the measured ions
+        if metrics is not None:
+            start = clock()
+        candidate_indices = precursor_index.candidate_indices(precursor_mz)
+        if metrics is not None:
+            start = metrics.add_time("precursor_filter", start)
+            metrics.count("candidate_analytes_tested", len(candidate_indices))
+        if len(candidate_indices) == 0:
+            continue
+
+        mz_array = decode_array(spectrum["m/z array"])
+        intensity_array = decode_array(spectrum["intensity array"])
+        if metrics is not None:
+            start = metrics.add_time("decode", start)
+
+        precursor_charge = selected_ion.get("charge state")
+        spectrum_matches = match_fragments(
+            fragment_matcher,
+            candidate_indices,
+            spectrum["id"],
+            precursor_mz,
+            None if precursor_charge is None else int(precursor_charge),
+            mz_array,
+            intensity_array,
+        )
+        if metrics is not None:
+            metrics.add_time("fragment_match", start)
+        if spectrum_matches is not None:
+            if metrics is not None:
+                metrics.count("matches_emitted", len(spectrum_matches.analyte_indices))
+            yield spectrum_matches
+
+
+def _selected_ion(spectrum: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """First selected ion of the first precursor, None if the spectrum has no precursor."""
+    if len(spectrum["precursorList"]) == 0:
+        return None
+    precursor = spectrum["precursorList"]["precursor"][0]
+    return precursor["selectedIonList"]["selectedIon"][0]
+
+
+def _decode_candidate_peaks(
+    spectrum: Dict[str, Any],
+    precursor_index: PrecursorIndex,
+    rt_start: float,
+    rt_stop: float,
+) -> Dict[str, Any]:
+    """
+    Decode the peak arrays of a spectrum in place, if `search_spectra` will match them:
+    MS2 spectra within the retention time window with at least one precursor candidate.
+    """
+    if spectrum["ms level"] != 2:
+        return spectrum
+    if not rt_start <= scan_start_time(spectrum) <= rt_stop:
+        return spectrum
+    selected_ion = _selected_ion(spectrum)
+    if selected_ion is None:
+        return spectrum
+    if precursor_index.candidate_indices(float(selected_ion["selected ion m/z"])):
+        spectrum["m/z array"] = decode_array(spectrum["m/z array"])
+        spectrum["intensity array"] = decode_array(spectrum["intensity array"])
+    return spectrum
+
+
+def search_cache(
+    cache: SpectrumCache,
+    precursor_index: PrecursorIndex,
+    fragment_matcher: FragmentMatcher,
+    rt_start: float,
+    rt_stop: float,
+    metrics: Optional[Metrics] = None,
+) -> Iterator[SpectrumMatches]:
+    """
+    Search the analytes in the cached spectra of a mzML file.
+    Yields the same matches as `search_spectra` on the spectra of the mzML file.
+
+    Parameters
+    ----------
+    cache : SpectrumCache
+        Cached spectra.
+    precursor_index : PrecursorIndex
+        Precursor index of the analytes.
+    fragment_matcher : FragmentMatcher
+        Fragment matcher of the same analytes.
+    rt_start : float
+        Retention time start in seconds.
+    rt_stop : float
+        Retention time stop in seconds.
+    metrics : Optional[Metrics]
+        Metrics of the mzML file, collecting stage times and counters if given.
+
+    Yields
+    ------
+    SpectrumMatches
+        Matches of each spectrum with at least one match, in spectrum order.
+        The matches of a spectrum are in analyte order.
+    """
+    # Like `search_spectra`, skip every spectrum outside of the window
+    in_window = (cache.scan_start_times >= rt_start) & (
+        cache.scan_start_times <= rt_stop
+    )
+    is_ms2 = cache.ms_levels == 2
+    has_precursor = ~np.isnan(cache.precursor_mzs)
+    selected = np.flatnonzero(in_window & is_ms2 & has_precursor)
+    if metrics is not None:
+        metrics.count("spectra_read", len(cache))
+        metrics.count("spectra_skipped_rt", int((~in_window).sum()))
+        metrics.count("spectra_skipped_ms_level", int((in_window & ~is_ms2).sum()))
+        metrics.count(
+            "spectra_skipped_no_precursor",
+            int((in_window & is_ms2 & ~has_precursor).sum()),
+        )
+
+    for spectrum_idx in selected:
+        precursor_mz = float(cache.precursor_mzs[spectrum_idx])
+        if metrics is not None:
+            start = clock()
+        candidate_indices = precursor_index.candidate_indices(precursor_mz)
+        if metrics is not None:
+            start = metrics.add_time("precursor_filter", start)
+            metrics.count("candidate_analytes_tested", len(candidate_indices))
+        if len(candidate_indices) == 0:
+            continue
+
+        precursor_charge = int(cache.precursor_charges[spectrum_idx])
+        mz_array, intensity_array = cache.peaks(spectrum_idx)
+        spectrum_matches = match_fragments(
+            fragment_matcher,
+            candidate_indices,
+            cache.spectrum_ids[spectrum_idx],
+            precursor_mz,
+            None if precursor_charge == MISSING_CHARGE else precursor_charge,
+            mz_array,
+            intensity_array,
+        )
+        if metrics is not None:
+            metrics.add_time("fragment_match", start)
+        if spectrum_matches is not None:
+            if metrics is not None:
+                metrics.count("matches_emitted", len(spectrum_matches.analyte_indices))
+            yield spectrum_matches
+
+
+def match_fragments(
+    fragment_matcher: FragmentMatcher,
+    candidate_indices: List[int],
+    spectrum_id: str,
+    precursor_mz: float,
+    precursor_charge: Optional[int],
+    mz_array: np.ndarray,
+    intensity_array: np.ndarray,
+) -> Optional[SpectrumMatches]:
+    """
+    Match the fragments of the precursor candidates of a spectrum.
+
+    Parameters
+    ----------
+    fragment_matcher : FragmentMatcher
+        Fragment matcher of the analytes.
+    candidate_indices : List[int]
+        Indices of the analytes with matching precursor.
+    spectrum_id : str
+        ID of the spectrum.
+    precursor_mz : float
+        Experimental precursor m/z.
+    precursor_charge : Optional[int]
+        Experimental precursor charge, None if unknown.
+    mz_array : np.ndarray
+        Decoded m/z array.
+    intensity_array : np.ndarray
+        Decoded intensity array.
+
+    Returns
+    -------
+    Optional[SpectrumMatches]
+        Matches of the candidates with matching quantifier, None if there are none.
+    """
+    quantifier_peak_indices, qualifier_peak_indices = fragment_matcher.match(
+        mz_array, candidate_indices
+    )
+
+    is_match = quantifier_peak_indices >= 0
+    if not is_match.any():
+        return None
+    quantifier_peak_indices = quantifier_peak_indices[is_match]
+    qualifier_peak_indices = qualifier_peak_indices[is_match]
+    has_qualifier = qualifier_peak_indices >= 0
+
+    return SpectrumMatches(
+        spectrum_id,
+        precursor_mz,
+        precursor_charge,
+        np.asarray(candidate_indices, dtype=np.int32)[is_match],
+        mz_array[quantifier_peak_indices],
+        intensity_array[quantifier_peak_indices],
+        np.where(has_qualifier, mz_array[qualifier_peak_indices], np.nan),
+        np.where(has_qualifier, intensity_array[qualifier_peak_indices], np.nan),
+    )
+
+
+def decode_array(array: Union[np.ndarray, Any]) -> np.ndarray:
+    """Decode a binary array record, unless already decoded."""
+    if isinstance(array, np.ndarray):
+        return array
+    return array.decode()
+
+
+def search_mzml(
+    mzml_path: Path,
+    precursor_index: PrecursorIndex,
+    fragment_matcher: FragmentMatcher,
+    rt_start: float,
+    rt_stop: float,
+    cache_dir: Optional[Path] = None,
+    metrics: Optional[Metrics] = None,
+    reader_threads: int = 0,
+) -> Iterator[SpectrumMatches]:
+    """
+    Search the analytes in all spectra of a mzML file within the retention time window.
+
+    For indexed mzML and mzMLb files the window is found from the scan start times of
+    all spectra (see `rt_window_range`), which are read without parsing the spectra,
+    so spectra before and after the window are never parsed.
+    Other files, including the standard input, FIFOs and compressed files
+    (see `open_mzml`), are read completely.
+    With a cache folder the spectra are read from the cache of the file instead,
+    which is built by the first search.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML file.
+    precursor_index : PrecursorIndex
+        Precursor index of the analytes.
+    fragment_matcher : FragmentMatcher
+        Fragment matcher of the same analytes.
+    rt_start : float
+        Retention time start in seconds.
+    rt_stop : float
+        Retention time stop in seconds.
+    cache_dir : Optional[Path]
+        Folder of the spectrum caches, by default None (no caching).
+        Standard input and FIFOs are never cached.
+    metrics : Optional[Metrics]
+        Metrics of the mzML file, collecting stage times and counters if given.
+    reader_threads : int
+        Number of background threads reading ahead, see `search_spectra`.
+        Not used when reading from the cache, by default 0.
+
+    Yields
+    ------
+    SpectrumMatches
+        Matches of each spectrum with at least one match, in spectrum order.
+    """
+    if cache_dir is not None and mzml_path != STDIN_PATH and mzml_path.is_file():
+        with stage(metrics, "open_cache"):
+            cache = SpectrumCache.open(mzml_path, cache_dir)
+        yield from search_cache(
+            cache, precursor_index, fragment_matcher, rt_start, rt_stop, metrics
+        )
+        return
+
+    # Number of spectra read from the beginning, all if None
+    stop = None
+    if has_offset_index(mzml_path):
+        with open_indexed_mzml(mzml_path) as reader:
+            with stage(metrics, "seek_rt_window"):
+                ids = spectrum_ids(reader)
+                start, stop = rt_window_range(mzml_path, reader, ids, rt_start, rt_stop)
+            # Sequential reading is faster than seeking to each spectrum,
+            # so only seek if there is something to skip at the beginning.
+            if start > 0:
+                yield from search_spectra(
+                    read_spectra_range(reader, ids, start, stop),
+                    precursor_index,
+                    fragment_matcher,
+                    rt_start,
+                    rt_stop,
+                    metrics,
+                    reader_threads,
+                )
+                return
+
+    with read_spectra(mzml_path) as spectra:
+        yield from search_spectra(
+            islice(spectra, stop),
+            precursor_index,
+            fragment_matcher,
+            rt_start,
+            rt_stop,
+            metrics,
+            reader_threads,
+        )
+
+
+def search_mzmls(
+    mzml_paths: List[Path],
+    precursor_index: PrecursorIndex,
+    fragment_matcher: FragmentMatcher,
+    rt_start: float,
+    rt_stop: float,
+    max_table_rows: int = 65536,
+    cache_dir: Optional[Path] = None,
+    metrics: Optional[Metrics] = None,
+    reader_threads: int = 0,
+) -> Iterator[MatchTable]:
+    """
+    Search the analytes in multiple mzML files one after another.
+
+    Parameters
+    ----------
+    mzml_paths : List[Path]
+        Paths to the mzML files.
+    precursor_index : PrecursorIndex
+        Precursor index of the analytes.
+    fragment_matcher : FragmentMatcher
+        Fragment matcher of the same analytes.
+    rt_start : float
+        Retention time start in seconds.
+    rt_stop : float
+        Retention time stop in seconds.
+    max_table_rows : int
+        A table is yielded as soon as it has this many rows, by default 65536.
+    cache_dir : Optional[Path]
+        Folder of the spectrum caches, by default None (no caching).
+    metrics : Optional[Metrics]
+        Collects stage times and counters of each file if given.
+    reader_threads : int
+        Number of background threads reading ahead in each file,
+        see `search_spectra`, by default 0.
+
+    Yields
+    ------
+    MatchTable
+        Consecutive parts of the matches, at least one per file with matches.
+    """
+    for mzml_path in mzml_paths:
+        table = MatchTable(precursor_index.analytes)
+        file_idx = table.add_file(mzml_name(mzml_path))
+        for spectrum_matches in search_mzml(
+            mzml_path,
+            precursor_index,
+            fragment_matcher,
+            rt_start,
+            rt_stop,
+            cache_dir,
+            None if metrics is None else metrics.file(mzml_name(mzml_path)),
+            reader_threads,
+        ):
+            table.append_spectrum(file_idx, spectrum_matches)
+            if len(table) >= max_table_rows:
+                yield table
+                table = MatchTable(precursor_index.analytes)
+                file_idx = table.add_file(mzml_name(mzml_path))
+        if len(table) > 0:
+            yield table
@@ -0,0 +1,254 @@
+"""On-disk cache of decoded spectra for fast re-runs on the same mzML files."""
+
+# std imports
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, List, Tuple
+
+# external imports
+import numpy as np
+
+from macdii.analyte_match import MISSING_CHARGE
+from macdii.mzml_reader import read_spectra, scan_start_time
+
+CACHE_VERSION: int = 1
+"""Version of the cache layout, caches of other versions are rebuilt."""
+
+CACHE_SUFFIX: str = ".macdii-cache"
+"""Suffix of the cache folder of a mzML file."""
+
+KEY_SAMPLE_SIZE: int = 1 << 16
+"""Number of bytes at the beginning and end of a mzML file hashed for the cache key."""
+
+META_FILE: str = "meta.json"
+SPECTRUM_IDS_FILE: str = "spectrum_ids.txt"
+MZ_FILE: str = "mz.bin"
+INTENSITY_FILE: str = "intensity.bin"
+
+
+def cache_key(mzml_path: Path) -> str:
+    """
+    Key identifying the content of a mzML file, derived from its size,
+    modification time and a hash of the first and last bytes.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML file.
+
+    Returns
+    -------
+    str
+        Hex digest.
+    """
+    stat = mzml_path.stat()
+    digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}:".encode())
+    with mzml_path.open("rb") as mzml_file:
+        digest.update(mzml_file.read(KEY_SAMPLE_SIZE))
+        mzml_file.seek(max(0, stat.st_size - KEY_SAMPLE_SIZE))
+        digest.update(mzml_file.read(KEY_SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+class SpectrumCache:
+    """
+    Decoded spectra of a mzML file, stored as flat arrays in a cache folder.
+
+    Scan start time, MS level and precursor are stored for every spectrum,
+    peaks only for MS2 spectra with a precursor. The peaks of all spectra are
+    concatenated into two memory-mapped float64 files, so reading a spectrum
+    from the cache neither parses XML nor decodes or copies the peak arrays.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Open an existing cache folder, see `SpectrumCache.open` for creating one.
+
+        Parameters
+        ----------
+        path : Path
+            Cache folder.
+        """
+        self.path = path
+        """Cache folder."""
+
+        spectrum_ids = path.joinpath(SPECTRUM_IDS_FILE).read_text(encoding="utf-8")
+        self.spectrum_ids: List[str] = spectrum_ids.split("\n") if spectrum_ids else []
+        """Spectrum IDs in file order."""
+
+        self.scan_start_times: np.ndarray = np.load(
+            path.joinpath("scan_start_times.npy")
+        )
+        """Scan start time of each spectrum in seconds."""
+
+        self.ms_levels: np.ndarray = np.load(path.joinpath("ms_levels.npy"))
+        """MS level of each spectrum."""
+
+        self.precursor_mzs: np.ndarray = np.load(path.joinpath("precursor_mzs.npy"))
+        """Selected ion m/z of each spectrum, NaN for spectra without precursor."""
+
+        self.precursor_charges: np.ndarray = np.load(
+            path.joinpath("precursor_charges.npy")
+        )
+        """Selected ion charge of each spectrum, `MISSING_CHARGE` if unknown."""
+
+        self.peak_offsets: np.ndarray = np.load(path.joinpath("peak_offsets.npy"))
+        """Peaks of spectrum `i` are at `peak_offsets[i]:peak_offsets[i + 1]`."""
+
+        self.mz: np.ndarray = _memmap(path.joinpath(MZ_FILE))
+        """m/z of all cached peaks."""
+
+        self.intensity: np.ndarray = _memmap(path.joinpath(INTENSITY_FILE))
+        """Intensity of all cached peaks."""
+
+    def __len__(self) -> int:
+        return len(self.spectrum_ids)
+
+    def peaks(self, spectrum_idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        m/z and intensity array of a spectrum, as views into the memory-mapped files.
+
+        Parameters
+        ----------
+        spectrum_idx : int
+            Position of the spectrum.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            m/z and intensity array, empty if the peaks are not cached.
+        """
+        start = self.peak_offsets[spectrum_idx]
+        stop = self.peak_offsets[spectrum_idx + 1]
+        return self.mz[start:stop], self.intensity[start:stop]
+
+    @classmethod
+    def open(cls, mzml_path: Path, cache_dir: Path) -> "SpectrumCache":
+        """
+        Open the cache of a mzML file, building it first if it does not exist
+        or the mzML file has changed.
+
+        Parameters
+        ----------
+        mzml_path : Path
+            Path to the mzML file.
+        cache_dir : Path
+            Folder containing the caches of all mzML files.
+
+        Returns
+        -------
+        SpectrumCache
+            Cache of the mzML file.
+        """
+        key = cache_key(mzml_path)
+        path = cache_dir.joinpath(f"{mzml_path.name}.{key[:16]}{CACHE_SUFFIX}")
+        if _is_valid(path, key):
+            return cls(path)
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Built in a temporary folder, so an interrupted or concurrent build
+        # never leaves a partial cache behind.
+        build_path = Path(tempfile.mkdtemp(prefix=f".{mzml_path.name}.", dir=cache_dir))
+        try:
+            # `mkdtemp` creates the folder only accessible for the current user
+            build_path.chmod(0o755)
+            _build(mzml_path, build_path, key)
+            if path.exists():
+                shutil.rmtree(path)
+            os.rename(build_path, path)
+        except OSError:
+            # Another process finished the same cache first
+            shutil.rmtree(build_path, ignore_errors=True)
+            if not _is_valid(path, key):
+                raise
+        except BaseException:
+            shutil.rmtree(build_path, ignore_errors=True)
+            raise
+        return cls(path)
+
+
+def _is_valid(path: Path, key: str) -> bool:
+    """Check if the cache folder is complete and belongs to the given cache key."""
+    try:
+        meta = json.loads(path.joinpath(META_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    return meta.get("version") == CACHE_VERSION and meta.get("key") == key
+
+
+def _memmap(path: Path) -> np.ndarray:
+    """Memory-map a float64 file, `np.memmap` does not support empty files."""
+    if path.stat().st_size == 0:
+        return np.empty(0, dtype=np.float64)
+    return np.memmap(path, dtype=np.float64, mode="r")
+
+
+def _build(mzml_path: Path, path: Path, key: str) -> None:
+    """Read all spectra of the mzML file and write the cache files into `path`."""
+    ids: List[str] = []
+    scan_start_times: List[float] = []
+    ms_levels: List[int] = []
+    precursor_mzs: List[float] = []
+    precursor_charges: List[int] = []
+    peak_offsets: List[int] = [0]
+
+    with (
+        read_spectra(mzml_path) as spectra,
+        path.joinpath(MZ_FILE).open("wb") as mz_file,
+        path.joinpath(INTENSITY_FILE).open("wb") as intensity_file,
+    ):
+        for spectrum in spectra:
+            ids.append(spectrum["id"])
+            scan_start_times.append(scan_start_time(spectrum))
+            ms_levels.append(int(spectrum["ms level"]))
+
+            precursor_mz = np.nan
+            precursor_charge = MISSING_CHARGE
+            peak_count = 0
+            if ms_levels[-1] == 2 and len(spectrum["precursorList"]) > 0:
+                selected_ion = spectrum["precursorList"]["precursor"][0][
+                    "selectedIonList"
+                ]["selectedIon"][0]
+                precursor_mz = float(selected_ion["selected ion m/z"])
+                if selected_ion.get("charge state") is not None:
+                    precursor_charge = int(selected_ion["charge state"])
+                peak_count = _write_array(mz_file, spectrum["m/z array"])
+                _write_array(intensity_file, spectrum["intensity array"])
+
+            precursor_mzs.append(precursor_mz)
+            precursor_charges.append(precursor_charge)
+            peak_offsets.append(peak_offsets[-1] + peak_count)
+
+    path.joinpath(SPECTRUM_IDS_FILE).write_text("\n".join(ids), encoding="utf-8")
+    for name, values, dtype in (
+        ("scan_start_times", scan_start_times, np.float64),
+        ("ms_levels", ms_levels, np.int8),
+        ("precursor_mzs", precursor_mzs, np.float64),
+        ("precursor_charges", precursor_charges, np.int32),
+        ("peak_offsets", peak_offsets, np.int64),
+    ):
+        np.save(path.joinpath(f"{name}.npy"), np.array(values, dtype=dtype))
+    # Written last, as it marks the cache as complete
+    path.joinpath(META_FILE).write_text(
+        json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "key": key,
+                "mzml": str(mzml_path.resolve()),
+                "spectra": len(ids),
+            }
+        ),
+        encoding="utf-8",
+    )
+
+
+def _write_array(file: BinaryIO, array) -> int:
+    """Decode a binary array record and append it to the file as float64."""
+    if not isinstance(array, np.ndarray):
+        array = array.decode()
+    np.asarray(array, dtype=np.float64).tofile(file)
+    return len(array)
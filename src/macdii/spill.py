@@ -0,0 +1,132 @@
+"""Match storage with a memory limit, spilling further matches to disk."""
+
+# std imports
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Self
+
+# external imports
+import numpy as np
+
+from macdii.analyte_match import MatchTable
+from macdii.analyte_table import Analytes
+
+
+class SpillingMatchTable:
+    """
+    Matches of a run, kept in memory up to a limit. When the limit is exceeded,
+    the matches in memory are written to a spill file in a temporary folder and
+    memory is released. `tables` reads the spill files back one at a time,
+    so writing and quantifying all matches never holds more than about the limit.
+    The temporary folder is removed on `close`.
+    """
+
+    def __init__(self, analytes: Analytes, memory_limit: int, spill_folder: Path):
+        """
+        Create a new, empty table.
+
+        Parameters
+        ----------
+        analytes : Analytes
+            Analytes referenced by the matches.
+        memory_limit : int
+            Bytes of matches kept in memory, see `MatchTable.nbytes`.
+        spill_folder : Path
+            Folder in which the temporary folder for the spill files is created.
+        """
+        self.analytes = analytes
+        self.memory_limit = memory_limit
+        self.spill_folder = spill_folder
+        self.__table = MatchTable(analytes)
+        self.__table_nbytes = 0
+        self.__spill_paths: List[Path] = []
+        self.__spill_row_count = 0
+        self.__tmp_folder: Optional[Path] = None
+
+    def __len__(self) -> int:
+        return self.__spill_row_count + len(self.__table)
+
+    @property
+    def spill_count(self) -> int:
+        """Number of spill files written so far."""
+        return len(self.__spill_paths)
+
+    def extend(self, table: MatchTable) -> None:
+        """
+        Append all rows of a table with the same analytes,
+        spilling to disk if the memory limit is exceeded.
+
+        Parameters
+        ----------
+        table : MatchTable
+            Table to append.
+        """
+        self.__table.extend(table)
+        self.__table_nbytes += table.nbytes()
+        if self.__table_nbytes > self.memory_limit:
+            self.__spill()
+
+    def __spill(self) -> None:
+        """Write the matches in memory to a new spill file."""
+        if self.__tmp_folder is None:
+            self.spill_folder.mkdir(parents=True, exist_ok=True)
+            self.__tmp_folder = Path(
+                tempfile.mkdtemp(prefix=".macdii_spill_", dir=self.spill_folder)
+            )
+        spill_path = self.__tmp_folder.joinpath(f"{len(self.__spill_paths)}.npz")
+        with spill_path.open("wb") as spill_file:
+            np.savez(
+                spill_file,
+                filenames=np.array(self.__table.filenames, dtype=str),
+                spectrum_ids=np.array(self.__table.spectrum_ids, dtype=str),
+                **self.__table.columns(),
+            )
+        self.__spill_paths.append(spill_path)
+        self.__spill_row_count += len(self.__table)
+        self.__table = MatchTable(self.analytes)
+        self.__table_nbytes = 0
+
+    def tables(self) -> Iterator[MatchTable]:
+        """
+        All matches as consecutive tables, in the order they were added.
+        Spilled tables are read one at a time.
+
+        Yields
+        ------
+        MatchTable
+            Consecutive parts of the matches.
+        """
+        if len(self.__spill_paths) > 0 and len(self.__table) > 0:
+            # Only one part is in memory at a time
+            self.__spill()
+        for spill_path in self.__spill_paths:
+            with np.load(spill_path, allow_pickle=False) as spill:
+                yield MatchTable.from_columns(
+                    self.analytes,
+                    spill["filenames"].tolist(),
+                    spill["spectrum_ids"].tolist(),
+                    {
+                        column: spill[column]
+                        for column in spill.files
+                        if column not in ("filenames", "spectrum_ids")
+                    },
+                )
+        if len(self.__table) > 0:
+            yield self.__table
+
+    def close(self) -> None:
+        """Remove the spill files and release the matches in memory."""
+        if self.__tmp_folder is not None:
+            shutil.rmtree(self.__tmp_folder, ignore_errors=True)
+            self.__tmp_folder = None
+        self.__spill_paths = []
+        self.__spill_row_count = 0
+        self.__table = MatchTable(self.analytes)
+        self.__table_nbytes = 0
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,264 @@
+"""Evaluation of many tolerance and retention time settings in a single pass over the spectra."""
+
+# std imports
+import io
+import itertools
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from macdii.analyte_match import MatchTable
+from macdii.analyte_quantification import AnalyteQuantification, RunningQuantification
+from macdii.analyte_table import Analytes, AnalyteTable
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.mzml_reader import (
+    has_offset_index,
+    mzml_name,
+    open_indexed_mzml,
+    read_spectra,
+    read_spectra_range,
+    rt_window_range,
+    scan_start_time,
+    spectrum_ids,
+)
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import decode_array, match_fragments
+from macdii.utils import columns_to_file
+
+DF_COLUMNS: Tuple[str, ...] = (
+    "configuration",
+    "rt_start",
+    "rt_stop",
+    "precursor_tol_lower",
+    "precursor_tol_upper",
+    "fragment_tol_lower",
+    "fragment_tol_upper",
+)
+
+
+class SweepConfiguration(NamedTuple):
+    """Retention time window and tolerances of a single sweep configuration."""
+
+    rt_start: float
+    """Retention time start in seconds."""
+
+    rt_stop: float
+    """Retention time stop in seconds."""
+
+    precursor_tol_lower: float
+    """Lower precursor tolerance in ppm."""
+
+    precursor_tol_upper: float
+    """Upper precursor tolerance in ppm."""
+
+    fragment_tol_lower: float
+    """Lower fragment tolerance in ppm."""
+
+    fragment_tol_upper: float
+    """Upper fragment tolerance in ppm."""
+
+    @property
+    def name(self) -> str:
+        """Name of the configuration, used in the output file names."""
+        return (
+            f"rt{self.rt_start:g}-{self.rt_stop:g}"
+            f"_prec{self.precursor_tol_lower:g}-{self.precursor_tol_upper:g}"
+            f"_frag{self.fragment_tol_lower:g}-{self.fragment_tol_upper:g}"
+        )
+
+    @classmethod
+    def grid(
+        cls,
+        rt_windows: Sequence[Tuple[float, float]],
+        precursor_tolerances: Sequence[Tuple[float, float]],
+        fragment_tolerances: Sequence[Tuple[float, float]],
+    ) -> List["SweepConfiguration"]:
+        """
+        All combinations of the given retention time windows and tolerances.
+
+        Parameters
+        ----------
+        rt_windows : Sequence[Tuple[float, float]]
+            Retention time start and stop in seconds.
+        precursor_tolerances : Sequence[Tuple[float, float]]
+            Lower and upper precursor tolerance in ppm.
+        fragment_tolerances : Sequence[Tuple[float, float]]
+            Lower and upper fragment tolerance in ppm.
+
+        Returns
+        -------
+        List[SweepConfiguration]
+            Configurations, duplicates removed.
+        """
+        configurations = [
+            cls(*rt_window, *precursor_tolerance, *fragment_tolerance)
+            for rt_window, precursor_tolerance, fragment_tolerance in itertools.product(
+                rt_windows, precursor_tolerances, fragment_tolerances
+            )
+        ]
+        return list(dict.fromkeys(configurations))
+
+    @classmethod
+    def to_file(
+        cls, file_path: Path, configurations: List["SweepConfiguration"]
+    ) -> None:
+        """Write the configurations with their names to a file."""
+        columns = {
+            "configuration": [configuration.name for configuration in configurations]
+        }
+        for field in cls._fields:
+            columns[field] = [
+                getattr(configuration, field) for configuration in configurations
+            ]
+        columns_to_file(columns, file_path)
+
+
+class _ConfigurationSearch:
+    """Lookup structures and running quantification of a single configuration."""
+
+    def __init__(self, configuration: SweepConfiguration, analytes: Analytes):
+        self.configuration = configuration
+        self.precursor_index = PrecursorIndex(analytes)
+        self.fragment_matcher = FragmentMatcher(analytes)
+        self.table = MatchTable(analytes)
+        self.quantification = RunningQuantification(analytes)
+
+    def flush(self) -> None:
+        """Add the collected matches to the quantification."""
+        self.quantification.add_table(self.table)
+        self.table.clear()
+
+
+def _sweep_spectra(
+    spectra: Iterable[Dict[str, Any]],
+    searches: List[_ConfigurationSearch],
+    filename: str,
+    max_table_rows: int = 65536,
+) -> None:
+    """
+    Search the analytes of all configurations in the given spectra, reading each
+    spectrum (and decoding its peaks) only once.
+
+    Like `search_spectra`, each configuration skips the spectra outside of its
+    retention time window, which may be in any order of scan start time.
+    """
+    for spectrum in spectra:
+        spectrum_rt = scan_start_time(spectrum)
+        active = [
+            search
+            for search in searches
+            if search.configuration.rt_start
+            <= spectrum_rt
+            <= search.configuration.rt_stop
+        ]
+        if len(active) == 0 or spectrum["ms level"] != 2:
+            continue
+
+        if len(spectrum["precursorList"]) == 0:
+            continue
+
+        selected_ion = spectrum["precursorList"]["precursor"][0]["selectedIonList"][
+            "selectedIon"
+        ][0]
+        precursor_mz = float(selected_ion["selected ion m/z"])
+        precursor_charge = selected_ion.get("charge state")
+        if precursor_charge is not None:
+            precursor_charge = int(precursor_charge)
+
+        # Decoded on demand and shared by all configurations
+        peaks: Optional[Tuple[Any, Any]] = None
+        for search in active:
+            candidate_indices = search.precursor_index.candidate_indices(precursor_mz)
+            if len(candidate_indices) == 0:
+                continue
+            if peaks is None:
+                peaks = (
+                    decode_array(spectrum["m/z array"]),
+                    decode_array(spectrum["intensity array"]),
+                )
+            spectrum_matches = match_fragments(
+                search.fragment_matcher,
+                candidate_indices,
+                spectrum["id"],
+                precursor_mz,
+                precursor_charge,
+                *peaks,
+            )
+            if spectrum_matches is not None:
+                # The table is cleared after each flush, so the file is registered again
+                search.table.append_spectrum(
+                    search.table.add_file(filename), spectrum_matches
+                )
+                if len(search.table) >= max_table_rows:
+                    search.flush()
+
+
+def sweep_mzmls(
+    mzml_paths: List[Path],
+    analytes_tsv: str,
+    configurations: List[SweepConfiguration],
+) -> List[List[AnalyteQuantification]]:
+    """
+    Quantify the analytes with each configuration, parsing each mzML file only once.
+
+    The quantification of each configuration is the same as running MaCDII
+    with the retention time window and tolerances of the configuration.
+
+    Parameters
+    ----------
+    mzml_paths : List[Path]
+        Paths to the mzML files.
+    analytes_tsv : str
+        Content of the analyte TSV, see `AnalyteTable.from_tsv`.
+    configurations : List[SweepConfiguration]
+        Configurations to evaluate.
+
+    Returns
+    -------
+    List[List[AnalyteQuantification]]
+        Quantifications of each configuration.
+    """
+    searches = [
+        _ConfigurationSearch(
+            configuration,
+            AnalyteTable.from_tsv(
+                io.StringIO(analytes_tsv),
+                configuration.precursor_tol_lower,
+                configuration.precursor_tol_upper,
+                configuration.fragment_tol_lower,
+                configuration.fragment_tol_upper,
+            ),
+        )
+        for configuration in configurations
+    ]
+    # Union of all retention time windows
+    rt_start = min(configuration.rt_start for configuration in configurations)
+    rt_stop = max(configuration.rt_stop for configuration in configurations)
+
+    for mzml_path in mzml_paths:
+        # Number of spectra read from the beginning, all if None
+        stop = None
+        if has_offset_index(mzml_path):
+            with open_indexed_mzml(mzml_path) as reader:
+                ids = spectrum_ids(reader)
+                start, stop = rt_window_range(mzml_path, reader, ids, rt_start, rt_stop)
+                # Same as `search_mzml`, only seek if there is something to skip
+                if start > 0:
+                    _sweep_spectra(
+                        read_spectra_range(reader, ids, start, stop),
+                        searches,
+                        mzml_name(mzml_path),
+                    )
+                    continue
+
+        with read_spectra(mzml_path) as spectra:
+            _sweep_spectra(
+                itertools.islice(spectra, stop),
+                searches,
+                mzml_name(mzml_path),
+            )
+
+    quantifications = []
+    for search in searches:
+        search.flush()
+        quantifications.append(search.quantification.quantifications())
+    return quantifications
@@ -2,10 +2,18 @@
 
 # std imports
 import csv
+import math
+import os
+from abc import ABC, abstractmethod
 from pathlib import Path
+from types import TracebackType
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Type
 
 # external imports
-import pandas as pd
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def time_to_seconds(time: float, unit_type: str) -> float:
@@ -39,27 +47,464 @@ def time_to_seconds(time: float, unit_type: str) -> float:
             raise ValueError(f"Unknown time unit `{unit_type}`")
 
 
-def dataframe_to_file(dataframe: pd.DataFrame, file_path: Path) -> None:
-    """Write a DataFrame to a file.
+PARQUET_ROW_GROUP_SIZE: int = 1_000_000
+"""Maximum number of rows per row group when writing Parquet (and Arrow IPC batches)."""
+
+TSV_BLOCK_SIZE: int = 65536
+"""Number of rows converted into Python values at once when writing TSV columns."""
+
+XLSX_MAX_ROWS: int = 1_048_576
+"""Maximum number of rows of an Excel sheet, including the header."""
+
+XLSX_MAX_COLUMNS: int = 16_384
+"""Maximum number of columns of an Excel sheet."""
+
+ARROW_TYPES: Dict[str, str] = {
+    "string": "string",
+    "float64": "float64",
+    "int64": "int64",
+    "Int64": "int64",
+}
+"""Arrow types of the pandas dtypes used for the output tables."""
+
+
+def columns_to_file(
+    columns: Dict[str, Sequence[Any]],
+    file_path: Path,
+    dtypes: Optional[Dict[str, str]] = None,
+) -> None:
+    """Write a table given as one sequence per column to a file.
+
+    The file is written without building a DataFrame, formatted like pandas' files
+    (`DataFrame.to_csv` with non-numeric values quoted, `DataFrame.to_excel`).
+
+    Parameters
+    ----------
+    columns : Dict[str, Sequence[Any]]
+        Values of each column in column order, see `TableWriter.write_columns`
+    file_path : Path
+        File path
+    dtypes : Optional[Dict[str, str]]
+        pandas dtype of each column, used for the typed Parquet and Arrow IPC columns
+
+    Raises
+    ------
+    ValueError
+        If the file type is unknown
+    """
+    match file_path.suffix:
+        case ".tsv" | ".xlsx" | ".parquet" | ".feather":
+            row_count = len(next(iter(columns.values()), []))
+            with open_table_writer(file_path, list(columns), dtypes) as writer:
+                for start in range(0, max(row_count, 1), PARQUET_ROW_GROUP_SIZE):
+                    writer.write_columns(
+                        {
+                            column: values[start : start + PARQUET_ROW_GROUP_SIZE]
+                            for column, values in columns.items()
+                        }
+                    )
+        case _:
+            raise ValueError(f"Unknown file type `{file_path.suffix}`")
+
+
+def columns_to_dataframe(columns: Dict[str, Sequence[Any]]) -> "pd.DataFrame":
+    """Create a DataFrame of a table given as one sequence per column.
+
+    Parameters
+    ----------
+    columns : Dict[str, Sequence[Any]]
+        Values of each column in column order, see `TableWriter.write_columns`
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame, masked integer arrays become nullable integer columns
+    """
+    import pandas as pd
+
+    return pd.DataFrame(
+        {
+            column: (
+                pd.arrays.IntegerArray(
+                    values.data.astype(np.int64), np.ma.getmaskarray(values)
+                )
+                if isinstance(values, np.ma.MaskedArray)
+                else values
+            )
+            for column, values in columns.items()
+        },
+        columns=list(columns),
+    )
+
+
+def dataframe_from_file(file_path: Path, dtypes: Dict[str, str]) -> "pd.DataFrame":
+    """Read a DataFrame written by `columns_to_file`.
 
     Parameters
     ----------
-    dataframe : pd.DataFrame
-        DataFrame
-    file : Path
+    file_path : Path
         File path
+    dtypes : Dict[str, str]
+        pandas dtype of each column. Only empty numeric cells are missing values,
+        so strings like "NA" are kept.
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame with the given dtypes
 
     Raises
     ------
     ValueError
         If the file type is unknown
     """
+    import pandas as pd
+
+    na_values = {column: [""] for column, dtype in dtypes.items() if dtype != "string"}
     match file_path.suffix:
         case ".tsv":
-            dataframe.to_csv(
-                file_path, sep="\t", quoting=csv.QUOTE_NONNUMERIC, index=False
+            dataframe = pd.read_csv(
+                file_path,
+                sep="\t",
+                dtype=dtypes,
+                keep_default_na=False,
+                na_values=na_values,
+                # Floats are written with `repr`, parse them exactly
+                float_precision="round_trip",
+            )
+        case ".xlsx":
+            # Tables longer than a sheet continue on the following sheets
+            dataframe = pd.concat(
+                pd.read_excel(
+                    file_path,
+                    sheet_name=None,
+                    keep_default_na=False,
+                    na_values=na_values,
+                ).values(),
+                ignore_index=True,
+            )
+        case ".parquet":
+            _import_pyarrow()
+            dataframe = pd.read_parquet(file_path)
+        case ".feather":
+            _import_pyarrow()
+            dataframe = pd.read_feather(file_path)
+        case _:
+            raise ValueError(f"Unknown file type `{file_path.suffix}`")
+    return dataframe.astype(dtypes)
+
+
+class TableWriter(ABC):
+    """Writes a table in parts, so it never needs to be held in memory."""
+
+    def __init__(self, file_path: Path, columns: Sequence[str]):
+        """
+        Create a new table writer.
+
+        Parameters
+        ----------
+        file_path : Path
+            File path
+        columns : Sequence[str]
+            Column names
+        """
+        self.file_path = file_path
+        self.columns = columns
+
+    @abstractmethod
+    def write_columns(self, columns: Dict[str, Sequence[Any]]) -> None:
+        """
+        Write all rows of a table given as one sequence per column, in the order
+        of the writer's columns. Missing values are None, NaN in float arrays or
+        masked in NumPy masked arrays.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Flush and close the file."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+class TsvTableWriter(TableWriter):
+    """Writes TSV files formatted like `DataFrame.to_csv` with non-numeric values quoted."""
+
+    def __init__(self, file_path: Path, columns: Sequence[str]):
+        super().__init__(file_path, columns)
+        self.__file = file_path.open("w", encoding="utf-8", newline="")
+        self.__writer = csv.writer(
+            self.__file,
+            delimiter="\t",
+            quoting=csv.QUOTE_NONNUMERIC,
+            lineterminator=os.linesep,
+        )
+        self.__writer.writerow(columns)
+
+    def write_columns(self, columns: Dict[str, Sequence[Any]]) -> None:
+        row_count = len(columns[self.columns[0]])
+        # Python values of a block only, instead of all rows at once
+        for start in range(0, row_count, TSV_BLOCK_SIZE):
+            self.__writer.writerows(
+                zip(
+                    *(
+                        _native_values(columns[column][start : start + TSV_BLOCK_SIZE])
+                        for column in self.columns
+                    )
+                )
+            )
+
+    def close(self) -> None:
+        self.__file.close()
+
+
+class ArrowTableWriter(TableWriter):
+    """
+    Writes Parquet or Arrow IPC (Feather) files with typed columns. Each written
+    part becomes a row group (record batch). Requires `pyarrow`.
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        columns: Sequence[str],
+        dtypes: Optional[Dict[str, str]] = None,
+    ):
+        super().__init__(file_path, columns)
+        pa, pq = _import_pyarrow()
+        self.__pa = pa
+        self.__dtypes = {
+            column: (dtypes or {}).get(column, "string") for column in columns
+        }
+        self.__schema = pa.schema(
+            [
+                (column, pa.type_for_alias(ARROW_TYPES[dtype]))
+                for column, dtype in self.__dtypes.items()
+            ]
+        )
+        if file_path.suffix == ".parquet":
+            self.__writer = pq.ParquetWriter(file_path, self.__schema)
+        else:
+            self.__writer = pa.ipc.new_file(str(file_path), self.__schema)
+
+    def write_columns(self, columns: Dict[str, Sequence[Any]]) -> None:
+        self.__writer.write_table(
+            self.__pa.table(
+                [
+                    _arrow_array(self.__pa, columns[field.name], field.type)
+                    for field in self.__schema
+                ],
+                schema=self.__schema,
             )
+        )
+
+    def close(self) -> None:
+        self.__writer.close()
+
+
+class XlsxTableWriter(TableWriter):
+    """
+    Writes Excel files with openpyxl's write-only mode, which streams the rows
+    into the file instead of building the workbook in memory. Rows beyond the row
+    limit of a sheet continue on a new sheet (`Sheet2`, `Sheet3`, ...) with the
+    same header.
+    """
+
+    def __init__(
+        self,
+        file_path: Path,
+        columns: Sequence[str],
+        max_sheet_rows: int = XLSX_MAX_ROWS,
+    ):
+        """
+        Create a new Excel writer.
+
+        Parameters
+        ----------
+        file_path : Path
+            File path
+        columns : Sequence[str]
+            Column names
+        max_sheet_rows : int
+            Maximum number of rows per sheet including the header, by default `XLSX_MAX_ROWS`
+
+        Raises
+        ------
+        ValueError
+            If there are more columns than fit into a sheet
+        """
+        super().__init__(file_path, columns)
+        if len(columns) > XLSX_MAX_COLUMNS:
+            raise ValueError(
+                f"Excel sheets have at most {XLSX_MAX_COLUMNS} columns, "
+                f"the table has {len(columns)}"
+            )
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        self.__cell = WriteOnlyCell
+        self.__header_font = Font(bold=True)
+        self.max_sheet_rows = max_sheet_rows
+        self.__workbook = Workbook(write_only=True)
+        self.__new_sheet()
+
+    @property
+    def sheet_count(self) -> int:
+        """Number of sheets written so far."""
+        return len(self.__workbook.worksheets)
+
+    def __new_sheet(self) -> None:
+        """Continue on a new sheet, starting with the header."""
+        # Named like the single sheet of `DataFrame.to_excel`
+        self.__sheet = self.__workbook.create_sheet(f"Sheet{self.sheet_count + 1}")
+        header = []
+        for column in self.columns:
+            cell = self.__cell(self.__sheet, value=column)
+            cell.font = self.__header_font
+            header.append(cell)
+        self.__sheet.append(header)
+        self.__sheet_rows = 1
+
+    def __append(self, row: Sequence[Any]) -> None:
+        if self.__sheet_rows >= self.max_sheet_rows:
+            self.__new_sheet()
+        self.__sheet.append(row)
+        self.__sheet_rows += 1
+
+    def write_columns(self, columns: Dict[str, Sequence[Any]]) -> None:
+        row_count = len(columns[self.columns[0]])
+        for start in range(0, row_count, TSV_BLOCK_SIZE):
+            for row in zip(
+                *(
+                    _without_nan(
+                        _native_values(columns[column][start : start + TSV_BLOCK_SIZE])
+                    )
+                    for column in self.columns
+                )
+            ):
+                self.__append(row)
+
+    def close(self) -> None:
+        self.__workbook.save(self.file_path)
+
+
+def _without_nan(values: List[Any]) -> List[Any]:
+    """Replace NaN by None, which Excel files store as empty cells."""
+    return [
+        None if isinstance(value, float) and math.isnan(value) else value
+        for value in values
+    ]
+
+
+def _native_values(values: Sequence[Any]) -> List[Any]:
+    """Values of a column as plain Python values, missing values as None."""
+    if isinstance(values, np.ma.MaskedArray):
+        # Masked entries become None
+        return values.tolist()
+    if isinstance(values, np.ndarray):
+        native_values = values.tolist()
+        if values.dtype.kind == "f":
+            for missing_idx in np.flatnonzero(np.isnan(values)):
+                native_values[missing_idx] = None
+        return native_values
+    return [to_native(value) for value in values]
+
+
+def _arrow_array(pa, values: Sequence[Any], arrow_type):
+    """Arrow array of a column, missing values (including NaN) as nulls."""
+    if isinstance(values, np.ma.MaskedArray):
+        return pa.array(values.data, type=arrow_type, mask=np.ma.getmaskarray(values))
+    if pa.types.is_string(arrow_type):
+        # Like `astype("string")` of pandas
+        values = [value if value is None else str(value) for value in values]
+    return pa.array(values, type=arrow_type, from_pandas=True)
+
+
+def _import_pyarrow():
+    """Import the optional pyarrow dependency.
+
+    Raises
+    ------
+    ImportError
+        If pyarrow is not installed
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError(
+            "Parquet and Arrow IPC output require `pyarrow`, "
+            "install it with `pip install macdii[arrow]`"
+        ) from error
+    return pa, pq
+
+
+def to_native(value: Any) -> Any:
+    """Convert NumPy scalars and float/int subclasses (e.g. pyteomics' unitfloat)
+    into plain Python values, so they are formatted like pandas does.
+
+    Parameters
+    ----------
+    value : Any
+        Value
+
+    Returns
+    -------
+    Any
+        Plain Python value
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float):
+        return float(value)
+    if isinstance(value, int):
+        return int(value)
+    return value
+
+
+def open_table_writer(
+    file_path: Path,
+    columns: Sequence[str],
+    dtypes: Optional[Dict[str, str]] = None,
+) -> TableWriter:
+    """Open a writer for writing a table in parts.
+
+    Parameters
+    ----------
+    file_path : Path
+        File path
+    columns : Sequence[str]
+        Column names
+    dtypes : Optional[Dict[str, str]]
+        pandas dtype of each column, used for the typed Parquet and Arrow IPC columns
+
+    Returns
+    -------
+    TableWriter
+        Table writer
+
+    Raises
+    ------
+    ValueError
+        If the file type is unknown
+    """
+    match file_path.suffix:
+        case ".tsv":
+            return TsvTableWriter(file_path, columns)
         case ".xlsx":
-            dataframe.to_excel(file_path, index=False)
+            return XlsxTableWriter(file_path, columns)
+        case ".parquet" | ".feather":
+            return ArrowTableWriter(file_path, columns, dtypes)
         case _:
             raise ValueError(f"Unknown file type `{file_path.suffix}`")
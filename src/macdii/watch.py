@@ -0,0 +1,346 @@
+"""Watching a folder for mzML files written during acquisition, quantifying each file as it lands."""
+
+# std imports
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple, Type
+
+# external imports
+from lxml.etree import LxmlError
+from pyteomics.auxiliary import PyteomicsError
+
+from macdii.analyte_match import DF_COLUMNS as MATCH_DF_COLUMNS
+from macdii.analyte_match import DF_DTYPES as MATCH_DF_DTYPES
+from macdii.analyte_match import MatchTable
+from macdii.analyte_quantification import (
+    AnalyteQuantification,
+    QuantificationMatrix,
+    RunningQuantification,
+)
+from macdii.analyte_table import Analytes
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.merge import MATCHES_FILE_STEM
+from macdii.mzml_reader import (
+    COMPRESSION_SUFFIXES,
+    MZMLB_SUFFIX,
+    is_mzmlb,
+    is_plain_file,
+    mzml_name,
+)
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzmls
+from macdii.utils import open_table_writer
+
+MZML_PATTERNS: Tuple[str, ...] = ("*.mzML", f"*{MZMLB_SUFFIX}") + tuple(
+    f"*.mzML{suffix}" for suffix in COMPRESSION_SUFFIXES
+)
+"""Glob patterns of the watched files."""
+
+SKIPPED_FILE_ERRORS: Tuple[Type[Exception], ...] = (
+    OSError,
+    EOFError,
+    ValueError,
+    ImportError,
+    LxmlError,
+    PyteomicsError,
+)
+"""Errors of reading a truncated, corrupt or unsupported file (e.g. `.zst` without
+`zstandard`), which is skipped while watching. Other errors stop watching."""
+
+MZML_END_SEARCH_SIZE: int = 1024
+"""Number of bytes at the end of a mzML file which are searched for its closing tag."""
+
+
+def is_complete_mzml(mzml_path: Path) -> bool:
+    """
+    Whether a mzML file is completely written, i.e. ends with the closing tag of
+    the (indexed) mzML element. Compressed and mzMLb files can not be checked without
+    decompressing or parsing them and are assumed to be complete.
+
+    Parameters
+    ----------
+    mzml_path : Path
+        Path to the mzML file.
+
+    Returns
+    -------
+    bool
+        True if the file is complete.
+    """
+    if (
+        mzml_path.suffix in COMPRESSION_SUFFIXES
+        or is_mzmlb(mzml_path)
+        or not is_plain_file(mzml_path)
+    ):
+        return True
+    with mzml_path.open("rb") as mzml_file:
+        mzml_file.seek(0, os.SEEK_END)
+        mzml_file.seek(max(0, mzml_file.tell() - MZML_END_SEARCH_SIZE))
+        tail = mzml_file.read().rstrip()
+    return tail.endswith((b"</indexedmzML>", b"</mzML>"))
+
+
+class FolderWatcher:
+    """
+    Finds mzML files in a folder once they are completely written: the file has to
+    end with its closing tag (see `is_complete_mzml`), its size and modification
+    time must not have changed since the previous poll and it must not have been
+    modified for the settle time. Each file is reported only once.
+    """
+
+    def __init__(self, folder: Path, settle_time: float = 5.0):
+        """
+        Create a new folder watcher.
+
+        Parameters
+        ----------
+        folder : Path
+            Watched folder, files in sub folders are ignored.
+        settle_time : float
+            Seconds a file must not have been modified, by default 5.0.
+        """
+        self.folder = folder
+        self.settle_time = settle_time
+        # Size and modification time of each pending file at the previous poll
+        self.__pending: Dict[Path, Tuple[int, int]] = {}
+        self.__reported: Set[Path] = set()
+
+    def poll(self) -> List[Path]:
+        """
+        Files completed since the previous poll.
+
+        Returns
+        -------
+        List[Path]
+            Completed files in order of their modification time.
+        """
+        candidates = {
+            mzml_path
+            for pattern in MZML_PATTERNS
+            for mzml_path in self.folder.glob(pattern)
+            # Hidden files are usually temporary files of copy tools
+            if not mzml_path.name.startswith(".") and mzml_path not in self.__reported
+        }
+        pending: Dict[Path, Tuple[int, int]] = {}
+        completed: List[Tuple[int, str, Path]] = []
+        now = time.time_ns()
+        for mzml_path in candidates:
+            try:
+                stat = mzml_path.stat()
+            except FileNotFoundError:
+                continue
+            state = (stat.st_size, stat.st_mtime_ns)
+            if (
+                self.__pending.get(mzml_path) == state
+                and now - stat.st_mtime_ns >= self.settle_time * 1e9
+                and is_complete_mzml(mzml_path)
+            ):
+                completed.append((stat.st_mtime_ns, mzml_path.name, mzml_path))
+            else:
+                pending[mzml_path] = state
+        self.__pending = pending
+        completed.sort()
+        self.__reported.update(mzml_path for _, _, mzml_path in completed)
+        return [mzml_path for _, _, mzml_path in completed]
+
+
+class LiveQuantification:
+    """
+    Searches mzML files one by one with lookup structures built once, appends their
+    matches to the match file and rewrites the quantification after each file.
+    The matches of a file are kept in memory until it is searched completely,
+    so a file failing midway does not change the outputs.
+    The quantification files are replaced atomically, so readers never see
+    a partially written file. Parquet and Arrow IPC match files are only
+    readable after `close`.
+    """
+
+    def __init__(
+        self,
+        analytes: Analytes,
+        output_folder: Path,
+        output_type: str,
+        rt_start: float,
+        rt_stop: float,
+        quantification_matrix: bool = False,
+        reader_threads: int = 0,
+    ):
+        """
+        Create a new live quantification, open the match file
+        and write the empty quantification.
+
+        Parameters
+        ----------
+        analytes : Analytes
+            Analytes to search.
+        output_folder : Path
+            Output folder.
+        output_type : str
+            Output file type, `tsv`, `xlsx`, `parquet` or `feather`.
+        rt_start : float
+            Retention time start in seconds.
+        rt_stop : float
+            Retention time stop in seconds.
+        quantification_matrix : bool
+            Also write the quantification per analyte and file, by default False.
+        reader_threads : int
+            Number of background threads reading ahead, see `search_spectra`, by default 0.
+        """
+        self.output_folder = output_folder
+        self.output_type = output_type
+        self.rt_start = rt_start
+        self.rt_stop = rt_stop
+        self.reader_threads = reader_threads
+        self.precursor_index = PrecursorIndex(analytes)
+        self.fragment_matcher = FragmentMatcher(analytes)
+        self.quantification = RunningQuantification(analytes)
+        self.quantification_matrix = (
+            QuantificationMatrix(analytes) if quantification_matrix else None
+        )
+        self.filenames: List[str] = []
+        """Names of the searched files, in search order."""
+
+        self.__matches_writer = open_table_writer(
+            output_folder.joinpath(f"{MATCHES_FILE_STEM}.{output_type}"),
+            MATCH_DF_COLUMNS,
+            MATCH_DF_DTYPES,
+        )
+        self.write_quantification()
+
+    def add_file(self, mzml_path: Path) -> int:
+        """
+        Search a mzML file and update the outputs. If the search fails,
+        the outputs are left unchanged.
+
+        Parameters
+        ----------
+        mzml_path : Path
+            Path to the mzML file.
+
+        Returns
+        -------
+        int
+            Number of matches in the file.
+        """
+        filename = mzml_name(mzml_path)
+        # The outputs are only updated once the whole file was searched,
+        # a file failing midway leaves no trace
+        matches = MatchTable(self.precursor_index.analytes)
+        for table in search_mzmls(
+            [mzml_path],
+            self.precursor_index,
+            self.fragment_matcher,
+            self.rt_start,
+            self.rt_stop,
+            reader_threads=self.reader_threads,
+        ):
+            matches.extend(table)
+        if self.quantification_matrix is not None:
+            # Files without matches get a column as well
+            self.quantification_matrix.add_file(filename)
+            self.quantification_matrix.add_table(matches)
+        self.__matches_writer.write_columns(matches.output_columns())
+        self.quantification.add_table(matches)
+        self.filenames.append(filename)
+        self.write_quantification()
+        return len(matches)
+
+    def write_quantification(self) -> None:
+        """Replace the quantification files with the current quantification."""
+        quantifications = self.quantification.quantifications()
+        replace_file(
+            self.output_folder.joinpath(f"quantification.{self.output_type}"),
+            lambda file_path: AnalyteQuantification.to_file(file_path, quantifications),
+        )
+        if self.quantification_matrix is not None:
+            replace_file(
+                self.output_folder.joinpath(
+                    f"quantification_matrix.{self.output_type}"
+                ),
+                self.quantification_matrix.to_file,
+            )
+
+    def close(self) -> None:
+        """Close the match file."""
+        self.__matches_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def replace_file(file_path: Path, write: Callable[[Path], None]) -> None:
+    """
+    Write a file next to the given path and move it into place,
+    so the file is replaced atomically.
+
+    Parameters
+    ----------
+    file_path : Path
+        File path.
+    write : Callable[[Path], None]
+        Writes the file to the given path, which has the same suffix.
+    """
+    tmp_path = file_path.with_name(f".{file_path.stem}.tmp{file_path.suffix}")
+    write(tmp_path)
+    os.replace(tmp_path, file_path)
+
+
+def watch_folder(
+    watcher: FolderWatcher,
+    live_quantification: LiveQuantification,
+    poll_interval: float = 2.0,
+    idle_timeout: Optional[float] = None,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    Search each completed file of the watched folder as it lands,
+    until stopped or idle for the given time. Files which can not be read,
+    e.g. truncated or corrupt files (see `SKIPPED_FILE_ERRORS`), are reported
+    on stderr and skipped, they are not retried.
+
+    Parameters
+    ----------
+    watcher : FolderWatcher
+        Watched folder.
+    live_quantification : LiveQuantification
+        Searches the files and updates the outputs.
+    poll_interval : float
+        Seconds between polls of the folder, by default 2.0.
+    idle_timeout : Optional[float]
+        Stop when no file completed for this many seconds, by default None (never).
+    stop : Optional[threading.Event]
+        Stops watching when set, e.g. by a signal handler, by default None.
+    """
+    stop = stop or threading.Event()
+    last_file = time.monotonic()
+    while not stop.is_set():
+        for mzml_path in watcher.poll():
+            start = time.monotonic()
+            try:
+                match_count = live_quantification.add_file(mzml_path)
+            except SKIPPED_FILE_ERRORS as error:
+                # Keep watching, the queue goes on
+                print(
+                    f"{mzml_path.name}: skipped, {type(error).__name__}: {error}",
+                    file=sys.stderr,
+                    flush=True,
+                )
+            else:
+                print(
+                    f"{mzml_path.name}: {match_count} matches "
+                    f"in {time.monotonic() - start:.1f} s",
+                    file=sys.stderr,
+                    flush=True,
+                )
+            last_file = time.monotonic()
+            if stop.is_set():
+                return
+        if idle_timeout is not None and time.monotonic() - last_file >= idle_timeout:
+            return
+        stop.wait(poll_interval)
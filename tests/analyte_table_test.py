@@ -0,0 +1,112 @@
+"""Function tests of the analyte table"""
+
+import io
+from unittest import TestCase
+
+import numpy as np
+
+from macdii.analyte import Analyte
+from macdii.analyte_table import AnalyteTable
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.precursor_index import PrecursorIndex
+
+TOLERANCES = (10.0, 5.0, 100.0, 50.0)
+
+TSV = (
+    "name\tprecursor_mz\tquantifier_mz\tqualifier_mz\n"
+    "PC 34:1\t760.5851\t184.0733\t86.0964\n"
+    "NA\t703.5749\t184.0733\t86.0964\n"
+    "PE 36:2\t744.5538\t603.5352\t196.0380\n"
+    "PC 34:1\t760.5851\t184.0733\t104.1070\n"
+)
+
+
+class AnalyteTableTests(TestCase):
+    """Function tests of AnalyteTable"""
+
+    def setUp(self):
+        self.analytes = Analyte.from_tsv(io.StringIO(TSV), *TOLERANCES)
+        self.table = AnalyteTable.from_tsv(io.StringIO(TSV), *TOLERANCES)
+
+    def test_from_tsv(self):
+        """Bulk loading yields the same values and ranges as `Analyte.from_tsv`"""
+        self.assertEqual(len(self.table), len(self.analytes))
+        self.assertEqual(
+            self.table.names.tolist(), [analyte.name for analyte in self.analytes]
+        )
+        for attribute in ("precursor_mz", "quantifier_mz", "qualifier_mz"):
+            self.assertEqual(
+                getattr(self.table, attribute).tolist(),
+                [getattr(analyte, attribute) for analyte in self.analytes],
+            )
+            self.assertEqual(
+                getattr(self.table, f"{attribute}_ranges").tolist(),
+                [
+                    list(getattr(analyte, f"{attribute}_range"))
+                    for analyte in self.analytes
+                ],
+            )
+
+    def test_views(self):
+        """Indexing and iterating yields equal `Analyte` objects"""
+        for view, analyte in zip(self.table, self.analytes):
+            self.assertIsInstance(view, Analyte)
+            self.assertEqual(vars(view), vars(analyte))
+        # Tables of existing analytes return the objects themselves
+        self.assertIs(AnalyteTable.of(self.analytes)[2], self.analytes[2])
+        self.assertIs(AnalyteTable.of(self.table), self.table)
+
+    def test_header_only(self):
+        """A file without analytes yields an empty table"""
+        table = AnalyteTable.from_tsv(io.StringIO(TSV.splitlines()[0]), *TOLERANCES)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.precursor_mz_ranges.shape, (0, 2))
+        self.assertEqual(PrecursorIndex(table).candidate_indices(760.5851), [])
+
+    def test_empty_lines(self):
+        """Both loaders skip empty lines, e.g. at the end of spreadsheet exports"""
+        lines = TSV.splitlines()
+        tsv = "\n".join(lines[:2] + [""] + lines[2:] + ["", ""])
+        analytes = Analyte.from_tsv(io.StringIO(tsv), *TOLERANCES)
+        table = AnalyteTable.from_tsv(io.StringIO(tsv), *TOLERANCES)
+        self.assertEqual(
+            [vars(analyte) for analyte in analytes],
+            [vars(analyte) for analyte in self.analytes],
+        )
+        self.assertEqual(
+            [vars(analyte) for analyte in table],
+            [vars(analyte) for analyte in self.analytes],
+        )
+
+    def test_incomplete_row(self):
+        """Rows without all m/z values are rejected"""
+        with self.assertRaises(ValueError):
+            AnalyteTable.from_tsv(io.StringIO(TSV + "PC 36:1\t788.6164\n"), *TOLERANCES)
+
+    def test_float_parsing(self):
+        """m/z values are parsed exactly like `float`"""
+        rng = np.random.default_rng(0)
+        values = [repr(value) for value in rng.uniform(50.0, 1500.0, 3000)]
+        values += ["1e3", "760.58510000000001", "0.1", "184.0733000000000004"]
+        tsv = TSV.splitlines()[0] + "".join(
+            f"\nanalyte{idx}\t{value}\t{value}\t{value}"
+            for idx, value in enumerate(values)
+        )
+        table = AnalyteTable.from_tsv(io.StringIO(tsv), *TOLERANCES)
+        self.assertEqual(
+            table.precursor_mz.tolist(), [float(value) for value in values]
+        )
+
+    def test_lookup_structures(self):
+        """Lookup structures built from the table find the same analytes"""
+        for mz in (760.5851, 703.5749, 744.5538, 500.0):
+            self.assertEqual(
+                PrecursorIndex(self.table).candidate_indices(mz),
+                PrecursorIndex(self.analytes).candidate_indices(mz),
+            )
+        mz_array = np.array([86.0964, 184.0733, 603.5352])
+        for table_result, list_result in zip(
+            FragmentMatcher(self.table).match(mz_array),
+            FragmentMatcher(self.analytes).match(mz_array),
+        ):
+            np.testing.assert_array_equal(table_result, list_result)
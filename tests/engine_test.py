@@ -0,0 +1,122 @@
+"""Function tests of the matching engine"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+from pyteomics.mzml import read as read_mzml
+
+from benchmarks.synthetic import write_analytes, write_mzml
+from macdii.analyte_match import MatchTable
+from macdii.analyte_quantification import AnalyteQuantification
+from macdii.engine import ArraySpectrum, MatchEngine
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzmls
+
+
+class MatchEngineTests(TestCase):
+    """Function tests of matching spectra from paths, pyteomics and arrays"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = TemporaryDirectory()
+        cls.tmp_path = Path(cls.tmp_dir.name)
+        synthetic_analytes = write_analytes(cls.tmp_path.joinpath("analytes.tsv"), 50)
+        cls.mzml_path = cls.tmp_path.joinpath("sample.mzML")
+        write_mzml(cls.mzml_path, synthetic_analytes, spectra=300, peaks=50)
+        cls.engine = MatchEngine.from_tsv(
+            cls.tmp_path.joinpath("analytes.tsv"), 10.0, 10.0, 100.0, 100.0
+        )
+
+        expected = MatchTable(cls.engine.analytes)
+        for table in search_mzmls(
+            [cls.mzml_path],
+            PrecursorIndex(cls.engine.analytes),
+            FragmentMatcher(cls.engine.analytes),
+            0.0,
+            np.inf,
+        ):
+            expected.extend(table)
+        cls.expected = expected.to_dataframe()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_match_path(self):
+        """Matches of a path are the matches of the CLI search"""
+        self.assertGreater(len(self.expected), 0)
+        pd.testing.assert_frame_equal(
+            self.engine.match_dataframe(self.mzml_path), self.expected
+        )
+
+    def test_match_pyteomics_spectra(self):
+        """Spectra parsed by pyteomics, with decoded or encoded arrays"""
+        for decode_binary in (True, False):
+            with read_mzml(str(self.mzml_path), decode_binary=decode_binary) as reader:
+                matches = self.engine.match_dataframe(reader, "sample.mzML")
+            pd.testing.assert_frame_equal(matches, self.expected)
+
+    def test_match_arrays(self):
+        """Spectra given as arrays, one by one or as iterable"""
+        with read_mzml(str(self.mzml_path)) as reader:
+            spectra = []
+            for spectrum in reader:
+                if spectrum["ms level"] != 2:
+                    continue
+                selected_ion = spectrum["precursorList"]["precursor"][0][
+                    "selectedIonList"
+                ]["selectedIon"][0]
+                charge = selected_ion.get("charge state")
+                spectra.append(
+                    ArraySpectrum(
+                        spectrum["id"],
+                        selected_ion["selected ion m/z"],
+                        spectrum["m/z array"],
+                        spectrum["intensity array"],
+                        int(charge) if charge is not None else None,
+                    )
+                )
+
+        pd.testing.assert_frame_equal(
+            self.engine.match_dataframe(spectra, "sample.mzML"), self.expected
+        )
+
+        spectrum_matches = [self.engine.match_arrays(spectrum) for spectrum in spectra]
+        self.assertEqual(
+            sum(
+                len(matches.analyte_indices) for matches in spectrum_matches if matches
+            ),
+            len(self.expected),
+        )
+        self.assertEqual(len(self.engine.match([])), 0)
+
+    def test_quantify(self):
+        """Quantification of a table and of batches"""
+        matches = self.engine.match(self.mzml_path)
+        expected = AnalyteQuantification.to_dataframe(
+            AnalyteQuantification.from_matches(list(matches))
+        )
+        pd.testing.assert_frame_equal(
+            AnalyteQuantification.to_dataframe(self.engine.quantify(matches)),
+            expected,
+        )
+
+        batches = []
+        batch = MatchTable(self.engine.analytes)
+        file_idx = batch.add_file("sample.mzML")
+        for spectrum_matches in self.engine.iter_matches(self.mzml_path):
+            batch.append_spectrum(file_idx, spectrum_matches)
+            if len(batch) > 20:
+                batches.append(batch)
+                batch = MatchTable(self.engine.analytes)
+                file_idx = batch.add_file("sample.mzML")
+        batches.append(batch)
+        self.assertGreater(len(batches), 1)
+        pd.testing.assert_frame_equal(
+            AnalyteQuantification.to_dataframe(self.engine.quantify(batches)),
+            expected,
+        )
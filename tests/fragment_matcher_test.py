@@ -0,0 +1,81 @@
+"""Function tests of the fragment matcher"""
+
+from unittest import TestCase
+
+import numpy as np
+
+from macdii.analyte import Analyte
+from macdii.fragment_matcher import FragmentMatcher
+
+
+def match_per_peak(analyte: Analyte, mz_array: np.ndarray):
+    """Reference implementation, testing each peak individually."""
+    quantifier_peak_idx = -1
+    qualifier_peak_idx = -1
+    for ion_idx, ion in enumerate(mz_array):
+        if analyte.quantifier_contains(ion):
+            quantifier_peak_idx = ion_idx
+        elif analyte.qualifier_contains(ion):
+            qualifier_peak_idx = ion_idx
+    return quantifier_peak_idx, qualifier_peak_idx
+
+
+class FragmentMatcherTests(TestCase):
+    """Function tests of FragmentMatcher class"""
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        # Wide and overlapping fragment windows, so peaks often match both
+        self.analytes = [
+            Analyte(
+                f"test{idx}",
+                100.0,
+                rng.uniform(100.0, 110.0),
+                rng.uniform(100.0, 110.0),
+                5,
+                5,
+                rng.uniform(0, 20000),
+                rng.uniform(0, 20000),
+            )
+            for idx in range(50)
+        ]
+        self.mz_arrays = [
+            np.sort(rng.uniform(95.0, 115.0, size)) for size in (0, 1, 5, 200)
+        ]
+        self.mz_arrays += [rng.uniform(95.0, 115.0, size) for size in (2, 5, 200)]
+        # duplicated m/z
+        self.mz_arrays.append(np.repeat(rng.uniform(95.0, 115.0, 50), 2))
+
+    def test_match_equal_per_peak(self):
+        """Peak selection must be identical to testing each peak"""
+        matcher = FragmentMatcher(self.analytes)
+        for mz_array in self.mz_arrays:
+            quantifier_peaks, qualifier_peaks = matcher.match(mz_array)
+            for analyte, quantifier_peak_idx, qualifier_peak_idx in zip(
+                self.analytes, quantifier_peaks, qualifier_peaks
+            ):
+                self.assertEqual(
+                    (quantifier_peak_idx, qualifier_peak_idx),
+                    match_per_peak(analyte, mz_array),
+                )
+
+    def test_match_subset(self):
+        """Only the requested analytes are matched, in the requested order"""
+        matcher = FragmentMatcher(self.analytes)
+        mz_array = self.mz_arrays[3]
+        analyte_indices = [7, 3, 42]
+        quantifier_peaks, qualifier_peaks = matcher.match(mz_array, analyte_indices)
+        self.assertEqual(len(quantifier_peaks), 3)
+        for position, analyte_idx in enumerate(analyte_indices):
+            self.assertEqual(
+                (quantifier_peaks[position], qualifier_peaks[position]),
+                match_per_peak(self.analytes[analyte_idx], mz_array),
+            )
+
+    def test_quantifier_before_qualifier(self):
+        """A peak within both ranges is used as quantifier only"""
+        analyte = Analyte("test", 100.0, 50.0, 50.0, 5, 5, 5, 5)
+        matcher = FragmentMatcher([analyte])
+        quantifier_peaks, qualifier_peaks = matcher.match(np.array([10.0, 50.0, 60.0]))
+        self.assertEqual(quantifier_peaks[0], 1)
+        self.assertEqual(qualifier_peaks[0], -1)
@@ -0,0 +1,119 @@
+"""Function tests of incremental runs"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Iterable, List
+from unittest import TestCase
+
+import pandas as pd
+
+from benchmarks.synthetic import write_analytes, write_mzml
+from macdii.analyte_match import MatchTable
+from macdii.analyte_table import AnalyteTable
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.incremental import (
+    PARTIALS_FOLDER,
+    Manifest,
+    run_parameters,
+    search_incremental,
+)
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzmls
+
+
+class IncrementalTests(TestCase):
+    """Function tests of reusing the stored matches of unchanged files"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.synthetic_analytes = write_analytes(
+            self.tmp_path.joinpath("analytes.tsv"), 50
+        )
+        self.mzml_paths = [self.tmp_path.joinpath(f"{idx}.mzML") for idx in range(3)]
+        for idx, mzml_path in enumerate(self.mzml_paths):
+            write_mzml(
+                mzml_path, self.synthetic_analytes, spectra=200, peaks=50, seed=idx
+            )
+        with self.tmp_path.joinpath("analytes.tsv").open("r", encoding="utf-8") as file:
+            self.analytes = AnalyteTable.from_tsv(file, 10.0, 10.0, 100.0, 100.0)
+        self.output_path = self.tmp_path.joinpath("output")
+        self.output_path.mkdir()
+        self.searched: List[Path] = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def search(self, mzml_paths: List[Path]) -> Iterable[MatchTable]:
+        """Search the files and record them"""
+        self.searched.extend(mzml_paths)
+        return search_mzmls(
+            mzml_paths,
+            PrecursorIndex(self.analytes),
+            FragmentMatcher(self.analytes),
+            0.0,
+            1000.0,
+        )
+
+    def run_incremental(self, rt_stop: float = 1000.0) -> pd.DataFrame:
+        """Incremental run over all files, as DataFrame"""
+        self.searched = []
+        manifest = Manifest(
+            self.output_path,
+            run_parameters(
+                self.tmp_path.joinpath("analytes.tsv"),
+                0.0,
+                rt_stop,
+                10.0,
+                10.0,
+                100.0,
+                100.0,
+            ),
+        )
+        matches = MatchTable(self.analytes)
+        for table in search_incremental(
+            self.mzml_paths, self.analytes, manifest, self.search
+        ):
+            matches.extend(table)
+        return matches.to_dataframe()
+
+    def expected(self) -> pd.DataFrame:
+        """Matches of a full run"""
+        matches = MatchTable(self.analytes)
+        for table in search_mzmls(
+            self.mzml_paths,
+            PrecursorIndex(self.analytes),
+            FragmentMatcher(self.analytes),
+            0.0,
+            1000.0,
+        ):
+            matches.extend(table)
+        return matches.to_dataframe()
+
+    def test_unchanged_files_are_reused(self):
+        """Re-runs only search changed files, with the same matches as a full run"""
+        pd.testing.assert_frame_equal(self.run_incremental(), self.expected())
+        self.assertEqual(
+            len(list(self.output_path.joinpath(PARTIALS_FOLDER).iterdir())), 3
+        )
+
+        pd.testing.assert_frame_equal(self.run_incremental(), self.expected())
+        self.assertEqual(self.searched, [])
+
+        write_mzml(
+            self.mzml_paths[1], self.synthetic_analytes, spectra=200, peaks=50, seed=5
+        )
+        pd.testing.assert_frame_equal(self.run_incremental(), self.expected())
+        self.assertEqual(self.searched, [self.mzml_paths[1]])
+        # The partial of the previous content is removed
+        self.assertEqual(
+            len(list(self.output_path.joinpath(PARTIALS_FOLDER).iterdir())), 3
+        )
+
+    def test_changed_parameters(self):
+        """Partials of other parameters are not reused"""
+        self.run_incremental()
+        self.run_incremental(rt_stop=500.0)
+        self.assertEqual(self.searched, self.mzml_paths)
+        self.run_incremental(rt_stop=500.0)
+        self.assertEqual(self.searched, [])
@@ -0,0 +1,140 @@
+"""Function tests of the columnar match table"""
+
+import csv
+import pickle
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import numpy as np
+
+from macdii.analyte import Analyte
+from macdii.analyte_match import DF_COLUMNS, AnalyteMatch, MatchTable, SpectrumMatches
+from macdii.analyte_quantification import AnalyteQuantification
+
+
+def spectrum_matches(
+    scan: int, analyte_indices, with_qualifier: bool
+) -> SpectrumMatches:
+    """Create matches for the given analytes with m/z and intensity derived from the scan."""
+    count = len(analyte_indices)
+    qualifier = np.full(count, float(scan) if with_qualifier else np.nan)
+    return SpectrumMatches(
+        f"scan={scan}",
+        100.0 + scan,
+        2 if scan % 2 else None,
+        np.asarray(analyte_indices, dtype=np.int32),
+        np.arange(count, dtype=np.float64) + scan,
+        np.full(count, 10.0 * scan, dtype=np.float32),
+        qualifier,
+        qualifier,
+    )
+
+
+class MatchTableTests(TestCase):
+    """Function tests of MatchTable class"""
+
+    def setUp(self):
+        self.analytes = [
+            Analyte(f"test{idx}", 100.0 + idx, 50.0, 60.0, 5, 5, 5, 5)
+            for idx in range(4)
+        ]
+
+    def build_table(self, chunk_size: int) -> MatchTable:
+        table = MatchTable(self.analytes, chunk_size=chunk_size)
+        foo_idx = table.add_file("foo.mzML")
+        bar_idx = table.add_file("bar.mzML")
+        for scan in range(10):
+            table.append_spectrum(
+                foo_idx if scan < 5 else bar_idx,
+                spectrum_matches(scan, [scan % 4, (scan + 1) % 4], scan % 3 == 0),
+            )
+        return table
+
+    def test_chunks(self):
+        """Chunk boundaries must not change the content"""
+        expected = self.build_table(1024).to_dataframe()
+        for chunk_size in (1, 3, 20):
+            table = self.build_table(chunk_size)
+            self.assertEqual(len(table), 20)
+            self.assertTrue(table.to_dataframe().equals(expected))
+
+    def test_to_dataframe(self):
+        """Rows are resolved to analytes, files and spectrum IDs"""
+        dataframe = self.build_table(3).to_dataframe()
+        self.assertEqual(tuple(dataframe.columns), DF_COLUMNS)
+        first = dataframe.iloc[0]
+        self.assertEqual(first["analyte"], "test0")
+        self.assertEqual(first["filename"], "foo.mzML")
+        self.assertEqual(first["spectrum_id"], "scan=0")
+        self.assertEqual(first["theoretical_precursor_mz"], 100.0)
+        self.assertTrue(dataframe["experimental_precursor_charge"].isna().iloc[0])
+        last = dataframe.iloc[-1]
+        self.assertEqual(last["analyte"], "test2")
+        self.assertEqual(last["filename"], "bar.mzML")
+        self.assertEqual(last["experimental_precursor_charge"], 2)
+        self.assertEqual(last["experimental_qualifier_mz"], 9.0)
+        self.assertTrue(np.isnan(dataframe.iloc[2]["experimental_qualifier_mz"]))
+
+    def test_to_file_tsv(self):
+        """The TSV is written without DataFrame, formatted like pandas"""
+        table = self.build_table(3)
+        with TemporaryDirectory() as tmp_dir:
+            native_path = Path(tmp_dir).joinpath("native.tsv")
+            dataframe_path = Path(tmp_dir).joinpath("dataframe.tsv")
+            AnalyteMatch.to_file(native_path, table)
+            table.to_dataframe().to_csv(
+                dataframe_path, sep="\t", quoting=csv.QUOTE_NONNUMERIC, index=False
+            )
+            self.assertEqual(
+                native_path.read_text(encoding="utf-8"),
+                dataframe_path.read_text(encoding="utf-8"),
+            )
+
+    def test_extend_and_pickle(self):
+        """Extending with (pickled) parts equals building one table"""
+        expected = self.build_table(4)
+        merged = MatchTable(self.analytes, chunk_size=4)
+        for part_start in range(0, 10, 4):
+            part = MatchTable(self.analytes, chunk_size=4)
+            for scan in range(part_start, min(part_start + 4, 10)):
+                part.append_spectrum(
+                    part.add_file("foo.mzML" if scan < 5 else "bar.mzML"),
+                    spectrum_matches(scan, [scan % 4, (scan + 1) % 4], scan % 3 == 0),
+                )
+            part = pickle.loads(pickle.dumps(part))
+            merged.extend(part)
+
+        self.assertEqual(merged.filenames, ["foo.mzML", "bar.mzML"])
+        self.assertTrue(merged.to_dataframe().equals(expected.to_dataframe()))
+
+    def test_iter_and_quantification(self):
+        """Quantification from the table equals quantification from match objects"""
+        table = self.build_table(3)
+        matches = list(table)
+        self.assertEqual(len(matches), 20)
+        self.assertEqual(matches[0].experimental_precursor.charge, None)
+        self.assertEqual(matches[-1].experimental_qualifier.mz, 9.0)
+
+        from_table = AnalyteQuantification.from_matches(table)
+        from_objects = AnalyteQuantification.from_matches(matches)
+        self.assertEqual(
+            [
+                (
+                    quant.analyte.name,
+                    quant.average_mz,
+                    quant.average_intensity,
+                    quant.count,
+                )
+                for quant in from_table
+            ],
+            [
+                (
+                    quant.analyte.name,
+                    quant.average_mz,
+                    quant.average_intensity,
+                    quant.count,
+                )
+                for quant in from_objects
+            ],
+        )
@@ -0,0 +1,200 @@
+"""Function tests of the memory limit and peak memory regression tests"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List, Tuple
+from unittest import TestCase, skipUnless
+
+import pandas as pd
+
+from benchmarks.synthetic import write_analytes, write_mzml
+from macdii.analyte_match import MatchTable
+from macdii.analyte_table import AnalyteTable
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzmls
+from macdii.spill import SpillingMatchTable
+
+RSS_CEILING_MIB: float = 256.0
+"""Peak memory of a run over the large input with a memory limit."""
+
+RSS_GROWTH_CEILING_MIB: float = 64.0
+"""Peak memory of a run over the large input with a memory limit,
+in addition to a run over the same input without matches."""
+
+MATRIX_BYTES_PER_MATCH: int = 64
+"""Peak memory per match of the quantification matrix, which keeps the intensity
+of every match for the medians, outside the memory limit."""
+
+SLOW_TESTS: bool = os.environ.get("MACDII_SLOW_TESTS", "") not in ("", "0")
+"""Run the slow peak memory regression tests, set `MACDII_SLOW_TESTS=1`."""
+
+# Every analyte is a precursor candidate of every spectrum and the quantifier
+# matches nearly always, so each spectrum has hundreds of matches
+WIDE_TOLERANCES: List[str] = ["1e6", "1e6", "20000", "20000"]
+
+
+def run_main(args: List[str]) -> Tuple[int, float]:
+    """Run MaCDII in a new process, returns the exit code and the peak RSS in MiB"""
+    process = subprocess.Popen([sys.executable, "-m", "macdii", *args])
+    _, status, resource_usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # Linux reports kilobytes
+    return process.returncode, resource_usage.ru_maxrss / 1024
+
+
+class SpillingMatchTableTests(TestCase):
+    """Function tests of spilling matches to disk"""
+
+    def test_spilling(self):
+        """Spilled matches are read back in order, spill files are removed"""
+        with TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            synthetic_analytes = write_analytes(tmp_path.joinpath("analytes.tsv"), 50)
+            mzml_paths = [tmp_path.joinpath(f"{idx}.mzML") for idx in range(2)]
+            for idx, mzml_path in enumerate(mzml_paths):
+                write_mzml(mzml_path, synthetic_analytes, spectra=300, seed=idx)
+            with tmp_path.joinpath("analytes.tsv").open("r", encoding="utf-8") as file:
+                analytes = AnalyteTable.from_tsv(file, 1e6, 1e6, 20000.0, 20000.0)
+
+            expected = MatchTable(analytes)
+            spill_path = tmp_path.joinpath("spill")
+            with SpillingMatchTable(analytes, 64 * 1024, spill_path) as spilling:
+                for table in search_mzmls(
+                    mzml_paths,
+                    PrecursorIndex(analytes),
+                    FragmentMatcher(analytes),
+                    0.0,
+                    1000.0,
+                    max_table_rows=1000,
+                ):
+                    expected.extend(table)
+                    spilling.extend(table)
+                self.assertGreater(spilling.spill_count, 1)
+                self.assertEqual(len(spilling), len(expected))
+
+                actual = MatchTable(analytes)
+                for table in spilling.tables():
+                    self.assertLess(len(table), len(expected))
+                    actual.extend(table)
+                pd.testing.assert_frame_equal(
+                    actual.to_dataframe(), expected.to_dataframe()
+                )
+            self.assertEqual(list(spill_path.iterdir()), [])
+
+
+@skipUnless(SLOW_TESTS, "slow tests are disabled, set MACDII_SLOW_TESTS=1")
+@skipUnless(hasattr(os, "wait4"), "peak RSS of child processes is not available")
+class PeakMemoryTests(TestCase):
+    """Regression tests of the peak memory of runs over large inputs"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = TemporaryDirectory()
+        cls.tmp_path = Path(cls.tmp_dir.name)
+        synthetic_analytes = write_analytes(cls.tmp_path.joinpath("analytes.tsv"), 500)
+        # About a million matches, which take roughly 180 MiB without memory limit
+        cls.large_mzml_path = cls.tmp_path.joinpath("large.mzML")
+        write_mzml(cls.large_mzml_path, synthetic_analytes, spectra=4000, peaks=100)
+        cls.small_mzml_path = cls.tmp_path.joinpath("small.mzML")
+        write_mzml(cls.small_mzml_path, synthetic_analytes, spectra=200, peaks=100)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def output_folder(self, name: str) -> Path:
+        """Create a new output folder"""
+        output_path = self.tmp_path.joinpath(name)
+        output_path.mkdir()
+        return output_path
+
+    def search_args(
+        self, tolerances: List[str], output_path: Path, mzml_path: Path
+    ) -> List[str]:
+        """Positional arguments of a search"""
+        return [
+            "0",
+            "1e9",
+            *tolerances,
+            str(self.tmp_path.joinpath("analytes.tsv")),
+            str(output_path),
+            str(mzml_path),
+        ]
+
+    def test_peak_rss(self):
+        """The peak memory with memory limit does not grow with the matches"""
+        baseline_path = self.output_folder("baseline")
+        exit_code, baseline_rss = run_main(
+            self.search_args(["1", "1", "1", "1"], baseline_path, self.large_mzml_path)
+        )
+        self.assertEqual(exit_code, 0)
+
+        limited_path = self.output_folder("limited")
+        exit_code, limited_rss = run_main(
+            ["--memory-limit", "4", "--metrics"]
+            + self.search_args(WIDE_TOLERANCES, limited_path, self.large_mzml_path)
+        )
+        self.assertEqual(exit_code, 0)
+        metrics = json.loads(limited_path.joinpath("metrics.json").read_text())
+        self.assertGreater(metrics["counters"]["matches_emitted"], 1_000_000)
+        self.assertGreater(metrics["counters"]["spill_files"], 0)
+        # Spill files are removed
+        self.assertEqual(
+            sorted(path.name for path in limited_path.iterdir()),
+            ["metrics.json", "quanitfier_matches.tsv", "quantification.tsv"],
+        )
+
+        self.assertLess(limited_rss, RSS_CEILING_MIB)
+        self.assertLess(limited_rss - baseline_rss, RSS_GROWTH_CEILING_MIB)
+
+    def test_peak_rss_quantification_matrix(self):
+        """The quantification matrix grows with the matches, but only by its intensities"""
+        limited_path = self.output_folder("limited_without_matrix")
+        exit_code, limited_rss = run_main(
+            ["--memory-limit", "4"]
+            + self.search_args(WIDE_TOLERANCES, limited_path, self.large_mzml_path)
+        )
+        self.assertEqual(exit_code, 0)
+
+        matrix_path = self.output_folder("limited_matrix")
+        exit_code, matrix_rss = run_main(
+            ["--memory-limit", "4", "--quantification-matrix", "--metrics"]
+            + self.search_args(WIDE_TOLERANCES, matrix_path, self.large_mzml_path)
+        )
+        self.assertEqual(exit_code, 0)
+        metrics = json.loads(matrix_path.joinpath("metrics.json").read_text())
+        match_count = metrics["counters"]["matches_emitted"]
+        self.assertGreater(metrics["counters"]["spill_files"], 0)
+        self.assertTrue(matrix_path.joinpath("quantification_matrix.tsv").exists())
+
+        self.assertLess(
+            matrix_rss - limited_rss, match_count * MATRIX_BYTES_PER_MATCH / 2**20
+        )
+
+    def test_identical_results(self):
+        """Results with memory limit are identical to a run without"""
+        expected_path = self.output_folder("expected")
+        actual_path = self.output_folder("actual")
+        self.assertEqual(
+            run_main(
+                self.search_args(WIDE_TOLERANCES, expected_path, self.small_mzml_path)
+            )[0],
+            0,
+        )
+        self.assertEqual(
+            run_main(
+                ["--memory-limit", "0.5", "--jobs", "2", "--spectra-per-task", "50"]
+                + self.search_args(WIDE_TOLERANCES, actual_path, self.small_mzml_path)
+            )[0],
+            0,
+        )
+        for name in ("quanitfier_matches.tsv", "quantification.tsv"):
+            self.assertEqual(
+                actual_path.joinpath(name).read_text(encoding="utf-8"),
+                expected_path.joinpath(name).read_text(encoding="utf-8"),
+            )
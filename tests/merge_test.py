@@ -0,0 +1,124 @@
+"""Function tests of merging partial results"""
+
+from importlib.util import find_spec
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import write_analytes, write_mzml
+from macdii.analyte_match import DF_DTYPES, AnalyteMatch, MatchTable
+from macdii.analyte_quantification import AnalyteQuantification
+from macdii.analyte_table import AnalyteTable
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.merge import read_partial_matches
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzmls
+
+
+class MergeTests(TestCase):
+    """Function tests of merging the matches of per file runs"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = TemporaryDirectory()
+        cls.tmp_path = Path(cls.tmp_dir.name)
+        synthetic_analytes = write_analytes(cls.tmp_path.joinpath("analytes.tsv"), 50)
+        cls.mzml_paths = [cls.tmp_path.joinpath(f"{idx}.mzML") for idx in range(3)]
+        for idx, mzml_path in enumerate(cls.mzml_paths):
+            write_mzml(mzml_path, synthetic_analytes, spectra=200, peaks=50, seed=idx)
+        with cls.tmp_path.joinpath("analytes.tsv").open("r", encoding="utf-8") as file:
+            cls.analytes = AnalyteTable.from_tsv(file, 10.0, 10.0, 100.0, 100.0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def search(self, mzml_paths) -> MatchTable:
+        """Matches of a single run over the mzML files"""
+        matches = MatchTable(self.analytes)
+        for table in search_mzmls(
+            mzml_paths,
+            PrecursorIndex(self.analytes),
+            FragmentMatcher(self.analytes),
+            0.0,
+            1e9,
+        ):
+            matches.extend(table)
+        return matches
+
+    def assert_merge(self, output_type: str, rtol: float = 0.0):
+        """Merging per file results equals a single run, up to `rtol` for file types
+        storing fewer digits"""
+        expected = self.search(self.mzml_paths)
+        partial_paths = []
+        for mzml_path in self.mzml_paths:
+            partial_path = self.tmp_path.joinpath(f"{mzml_path.name}.{output_type}")
+            partial_path.mkdir()
+            AnalyteMatch.to_file(
+                partial_path.joinpath(f"quanitfier_matches.{output_type}"),
+                self.search([mzml_path]),
+            )
+            partial_paths.append(partial_path)
+
+        merged = read_partial_matches(partial_paths)
+        pd.testing.assert_frame_equal(
+            merged.to_dataframe().astype(DF_DTYPES),
+            expected.to_dataframe().astype(DF_DTYPES),
+        )
+        merged_quantifications = AnalyteQuantification.from_matches(merged)
+        expected_quantifications = AnalyteQuantification.from_matches(expected)
+        self.assertEqual(
+            [quant.analyte.name for quant in merged_quantifications],
+            [quant.analyte.name for quant in expected_quantifications],
+        )
+        np.testing.assert_allclose(
+            [
+                (quant.average_mz, quant.average_intensity)
+                for quant in merged_quantifications
+            ],
+            [
+                (quant.average_mz, quant.average_intensity)
+                for quant in expected_quantifications
+            ],
+            rtol=rtol,
+        )
+
+    def test_merge_tsv(self):
+        """TSV partial results are merged losslessly"""
+        self.assert_merge("tsv")
+
+    def test_merge_parquet(self):
+        """Parquet partial results are merged losslessly"""
+        if find_spec("pyarrow") is None:
+            self.skipTest("pyarrow is not installed")
+        self.assert_merge("parquet")
+
+    def test_merge_xlsx(self):
+        """Excel partial results are merged, Excel keeps 16 significant digits"""
+        self.assert_merge("xlsx", rtol=1e-15)
+
+    def test_from_dataframe(self):
+        """Analytes named like missing values and missing charges survive a round trip"""
+        df = pd.DataFrame(
+            {
+                "analyte": ["NA", "x", "NA"],
+                "filename": ["a.mzML", "a.mzML", "b.mzML"],
+                "spectrum_id": ["scan=1", "scan=1", "scan=1"],
+                "theoretical_precursor_mz": [100.0, 200.0, 100.0],
+                "experimental_precursor_mz": [100.001, 200.001, 100.002],
+                "experimental_precursor_charge": pd.array([1, None, 2], dtype="Int64"),
+                "theoretical_quantifier_mz": [50.0, 60.0, 50.0],
+                "experimental_quantifier_mz": [50.001, 60.001, 50.002],
+                "experimental_quantifier_intensity": [10.0, 20.0, 30.0],
+                "theoretical_qualifier_mz": [0.0, 70.0, 0.0],
+                "experimental_qualifier_mz": [None, 70.001, None],
+                "experimental_qualifier_intensity": [None, 40.0, None],
+            }
+        ).astype(DF_DTYPES)
+        table = MatchTable.from_dataframe(df)
+        self.assertEqual(len(table.analytes), 2)
+        self.assertEqual(table.filenames, ["a.mzML", "b.mzML"])
+        pd.testing.assert_frame_equal(table.to_dataframe().astype(DF_DTYPES), df)
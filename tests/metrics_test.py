@@ -0,0 +1,45 @@
+"""Function tests of the run metrics"""
+
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from macdii.metrics import Metrics, clock, stage
+
+
+class MetricsTests(TestCase):
+    """Function tests of the run metrics"""
+
+    def test_merge_and_totals(self):
+        """Overall stages and counters include the ones of all files and merged metrics"""
+        metrics = Metrics()
+        with stage(metrics, "load_analytes"):
+            pass
+        metrics.file("a.mzML").count("spectra_read", 3)
+        metrics.file("a.mzML").add_time("parse", clock())
+
+        worker_metrics = Metrics()
+        worker_metrics.file("a.mzML").count("spectra_read", 2)
+        worker_metrics.file("b.mzML").count("spectra_read")
+        self.assertEqual(list(worker_metrics.timed("parse", [1, 2])), [1, 2])
+        metrics.merge(worker_metrics)
+
+        report = metrics.to_dict()
+        self.assertEqual(report["counters"], {"spectra_read": 6})
+        self.assertEqual(report["files"]["a.mzML"]["counters"], {"spectra_read": 5})
+        self.assertEqual(report["files"]["b.mzML"]["counters"], {"spectra_read": 1})
+        self.assertEqual(set(report["stages"]), {"load_analytes", "parse"})
+        self.assertGreaterEqual(report["stages"]["parse"]["wall_s"], 0.0)
+
+        with TemporaryDirectory() as tmp_dir:
+            metrics_path = Path(tmp_dir).joinpath("metrics.json")
+            metrics.to_file(metrics_path)
+            self.assertEqual(
+                json.loads(metrics_path.read_text(encoding="utf-8")), report
+            )
+
+    def test_disabled(self):
+        """Stages of disabled metrics are no-ops"""
+        with stage(None, "search"):
+            pass
@@ -0,0 +1,145 @@
+"""Function tests of reading mzML files and streams"""
+
+import gzip
+import io
+import os
+import threading
+from importlib.util import find_spec
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+
+from pyteomics.mzml import read as read_mzml
+
+from benchmarks.synthetic import write_analytes, write_mzml, write_mzmlb
+from macdii.mzml_reader import (
+    STDIN_PATH,
+    STREAM_HEAD_SIZE,
+    _HeadBufferedStream,
+    has_offset_index,
+    is_plain_file,
+    mzml_name,
+    open_indexed_mzml,
+    open_mzml,
+    scan_start_time,
+    scan_start_times,
+)
+
+
+def spectrum_ids(mzml_file) -> list:
+    """IDs of all spectra read sequentially from the open file"""
+    return [spectrum["id"] for spectrum in read_mzml(mzml_file, decode_binary=False)]
+
+
+class IndexOnlyReader:
+    """Reader which only provides the offset index, parsing spectra fails"""
+
+    def __init__(self, reader):
+        self.index = reader.index
+
+    def get_by_id(self, spectrum_id):
+        raise AssertionError(f"{spectrum_id} parsed")
+
+
+class MzmlReaderTests(TestCase):
+    """Function tests of opening mzML files and streams"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = TemporaryDirectory()
+        cls.tmp_path = Path(cls.tmp_dir.name)
+        cls.mzml_path = cls.tmp_path.joinpath("plain.mzML")
+        cls.analytes = write_analytes(cls.tmp_path.joinpath("analytes.tsv"), 10)
+        write_mzml(cls.mzml_path, cls.analytes, spectra=50, peaks=10)
+        cls.content = cls.mzml_path.read_bytes()
+        with cls.mzml_path.open("rb") as mzml_file:
+            cls.expected_ids = spectrum_ids(mzml_file)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_names(self):
+        """Compression suffixes are not part of the reported name"""
+        self.assertEqual(mzml_name(Path("/data/a.mzML.gz")), "a.mzML")
+        self.assertEqual(mzml_name(Path("a.mzML.zst")), "a.mzML")
+        self.assertEqual(mzml_name(Path("a.mzML")), "a.mzML")
+        self.assertEqual(mzml_name(STDIN_PATH), "stdin")
+
+    def assert_stream(self, mzml_path: Path):
+        """The file is read sequentially and yields all spectra"""
+        self.assertFalse(is_plain_file(mzml_path))
+        self.assertFalse(has_offset_index(mzml_path))
+        with open_mzml(mzml_path) as mzml_file:
+            self.assertEqual(spectrum_ids(mzml_file), self.expected_ids)
+
+    def test_scan_start_times(self):
+        """Scan start times are read without parsing the spectra"""
+        mzml_paths = [self.tmp_path.joinpath("seconds.mzML")]
+        # The second spectrum in seconds, the units have the same length
+        minute = (
+            b'value="0.01" unitCvRef="UO" unitAccession="UO:0000031" unitName="minute"'
+        )
+        content = self.mzml_path.read_bytes()
+        self.assertEqual(content.count(minute), 1)
+        mzml_paths[0].write_bytes(
+            content.replace(minute, minute.replace(b"minute", b"second"))
+        )
+        if find_spec("h5py"):
+            mzml_paths.append(self.tmp_path.joinpath("plain.mzMLb"))
+            write_mzmlb(mzml_paths[1], self.analytes, spectra=50, peaks=10)
+        for mzml_path in mzml_paths:
+            with open_indexed_mzml(mzml_path) as reader:
+                ids = list(reader.index["spectrum"].keys())
+                expected = [scan_start_time(reader.get_by_id(id_)) for id_ in ids]
+                times = scan_start_times(mzml_path, IndexOnlyReader(reader), ids)
+            self.assertEqual(times.tolist(), expected)
+            self.assertEqual(times[1], 0.01 if mzml_path == mzml_paths[0] else 0.6)
+
+    def test_gzip(self):
+        """gzip compressed files yield the same spectra"""
+        self.assertTrue(is_plain_file(self.mzml_path))
+        self.assertTrue(has_offset_index(self.mzml_path))
+        gz_path = self.tmp_path.joinpath("compressed.mzML.gz")
+        gz_path.write_bytes(gzip.compress(self.content))
+        self.assert_stream(gz_path)
+
+    @skipUnless(find_spec("zstandard"), "zstandard is not installed")
+    def test_zstandard(self):
+        """Zstandard compressed files yield the same spectra"""
+        import zstandard
+
+        zst_path = self.tmp_path.joinpath("compressed.mzML.zst")
+        zst_path.write_bytes(zstandard.ZstdCompressor().compress(self.content))
+        self.assert_stream(zst_path)
+
+    def test_fifo(self):
+        """FIFOs are read as stream"""
+        if not hasattr(os, "mkfifo"):
+            self.skipTest("FIFOs are not supported")
+        fifo_path = self.tmp_path.joinpath("fifo.mzML")
+        os.mkfifo(fifo_path)
+        writer = threading.Thread(target=fifo_path.write_bytes, args=(self.content,))
+        writer.start()
+        try:
+            self.assert_stream(fifo_path)
+        finally:
+            writer.join()
+
+    def test_stream_seek(self):
+        """Streams can seek back into their head and forward"""
+        data = bytes(range(256)) * (3 * STREAM_HEAD_SIZE // 256)
+        stream = _HeadBufferedStream(io.BytesIO(data), "stream")
+        self.assertEqual(stream.read(100), data[:100])
+        stream.seek(10)
+        self.assertEqual(stream.read(10), data[10:20])
+        stream.seek(2 * STREAM_HEAD_SIZE)
+        self.assertEqual(stream.tell(), 2 * STREAM_HEAD_SIZE)
+        self.assertEqual(stream.read(10), data[2 * STREAM_HEAD_SIZE :][:10])
+        # Still in the head
+        stream.seek(20)
+        self.assertEqual(stream.read(10), data[20:30])
+        with self.assertRaises(io.UnsupportedOperation):
+            stream.seek(STREAM_HEAD_SIZE + 10)
+        with self.assertRaises(io.UnsupportedOperation):
+            stream.seek(0, os.SEEK_END)
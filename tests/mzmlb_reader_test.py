@@ -0,0 +1,95 @@
+"""Function tests of the chunked mzMLb reader"""
+
+import inspect
+from collections import Counter
+from importlib.util import find_spec
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+
+import numpy as np
+
+from benchmarks.synthetic import write_analytes, write_mzmlb
+
+
+class CountingMapping:
+    """Mapping counting the lookups of each key"""
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.lookups: Counter = Counter()
+
+    def __getitem__(self, key):
+        self.lookups[key] += 1
+        return self.mapping[key]
+
+
+@skipUnless(find_spec("h5py"), "h5py is not installed")
+class ChunkedMzMLbTests(TestCase):
+    """Function tests of the chunked mzMLb reader"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = TemporaryDirectory()
+        tmp_path = Path(cls.tmp_dir.name)
+        synthetic_analytes = write_analytes(tmp_path.joinpath("analytes.tsv"), 50)
+        cls.mzmlb_path = tmp_path.joinpath("sample.mzMLb")
+        write_mzmlb(cls.mzmlb_path, synthetic_analytes, spectra=300, peaks=50)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_pyteomics_internals(self):
+        """The overridden internals of pyteomics are unchanged, see the `mzmlb` extra"""
+        from pyteomics.mzmlb import ExternalArrayRegistry, MzMLb
+
+        for method, parameters in (
+            (ExternalArrayRegistry._get_raw, ["self", "array_name", "start", "end"]),
+            (ExternalArrayRegistry.dtype_of, ["self", "array_name"]),
+            (MzMLb._make_mzml_parser, ["self", "kwargs"]),
+        ):
+            self.assertEqual(list(inspect.signature(method).parameters), parameters)
+
+        from macdii.mzmlb_reader import ChunkedArrayRegistry, ChunkedMzMLb
+
+        with ChunkedMzMLb(str(self.mzmlb_path)) as reader:
+            self.assertIsInstance(reader._array_registry, ChunkedArrayRegistry)
+            # The parser reads the peaks through the chunked registry
+            self.assertIs(
+                reader._mzml_parser._external_data_registry, reader._array_registry
+            )
+
+    def test_dataset_lookups(self):
+        """Each HDF5 dataset is looked up once, not per spectrum"""
+        from macdii.mzmlb_reader import ChunkedMzMLb
+
+        with ChunkedMzMLb(str(self.mzmlb_path)) as reader:
+            registry = reader._array_registry
+            # Chunks smaller than the peaks of a spectrum
+            registry.chunk_size = 10
+            registry.registry = CountingMapping(registry.registry)
+            spectrum_count = sum(1 for _ in reader)
+        self.assertEqual(spectrum_count, 300)
+        self.assertGreater(len(registry.registry.lookups), 0)
+        self.assertEqual(set(registry.registry.lookups.values()), {1})
+
+    def test_arrays_like_pyteomics(self):
+        """Spectra are read exactly like with pyteomics' reader"""
+        from pyteomics.mzmlb import MzMLb
+
+        from macdii.mzmlb_reader import ChunkedMzMLb
+
+        with (
+            ChunkedMzMLb(str(self.mzmlb_path)) as reader,
+            MzMLb(str(self.mzmlb_path)) as expected_reader,
+        ):
+            for spectrum, expected in zip(reader, expected_reader):
+                self.assertEqual(spectrum["id"], expected["id"])
+                for array_name in ("m/z array", "intensity array"):
+                    self.assertEqual(
+                        spectrum[array_name].dtype, expected[array_name].dtype
+                    )
+                    np.testing.assert_array_equal(
+                        spectrum[array_name], expected[array_name]
+                    )
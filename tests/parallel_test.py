@@ -0,0 +1,172 @@
+"""Function tests of searching mzML files in parallel"""
+
+import gzip
+import subprocess
+import sys
+from itertools import pairwise
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List
+from unittest import TestCase
+
+import pandas as pd
+
+from benchmarks.synthetic import write_analytes, write_mzml
+from macdii.analyte_match import MatchTable
+from macdii.analyte_table import AnalyteTable
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.mzml_reader import open_indexed_mzml, rt_window_range, spectrum_ids
+from macdii.parallel import (
+    _init_worker,
+    _search_task,
+    _worker_state,
+    plan_tasks,
+)
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzmls
+
+# Retention time window in seconds, the synthetic spectra are 0.6 seconds apart
+RT_START = 60.0
+RT_STOP = 150.0
+
+
+class ParallelSearchTests(TestCase):
+    """Function tests of the `--jobs` option"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = TemporaryDirectory()
+        cls.tmp_path = Path(cls.tmp_dir.name)
+        synthetic_analytes = write_analytes(cls.tmp_path.joinpath("analytes.tsv"), 50)
+        cls.mzml_paths = [cls.tmp_path.joinpath(f"{idx}.mzML") for idx in range(3)]
+        for idx, mzml_path in enumerate(cls.mzml_paths):
+            write_mzml(mzml_path, synthetic_analytes, spectra=300, peaks=50, seed=idx)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def run_main(self, options: List[str], output_name: str) -> Path:
+        """Run MaCDII with the given options, returns the output folder"""
+        output_path = self.tmp_path.joinpath(output_name)
+        output_path.mkdir()
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "macdii",
+                *options,
+                str(RT_START),
+                str(RT_STOP),
+                "10",
+                "10",
+                "100",
+                "100",
+                str(self.tmp_path.joinpath("analytes.tsv")),
+                str(output_path),
+                *(str(mzml_path) for mzml_path in self.mzml_paths),
+            ],
+            check=True,
+        )
+        return output_path
+
+    def test_jobs_like_serial(self):
+        """Results of a parallel run are identical to a single process run"""
+        expected_path = self.run_main([], "serial")
+        actual_path = self.run_main(["--jobs", "2"], "parallel")
+        for name in ("quanitfier_matches.tsv", "quantification.tsv"):
+            self.assertEqual(
+                actual_path.joinpath(name).read_text(encoding="utf-8"),
+                expected_path.joinpath(name).read_text(encoding="utf-8"),
+            )
+
+    def test_invalid_jobs(self):
+        """Less than one job is rejected"""
+        # Window and tolerances, analytes, output folder and mzML file
+        positional_args = ["0", "1", *["1"] * 4, "analytes.tsv", "out", "a.mzML"]
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            subprocess.run(
+                [sys.executable, "-m", "macdii", "--jobs", "0", *positional_args],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        self.assertEqual(context.exception.returncode, 2)
+        self.assertIn("--jobs must be at least 1", context.exception.stderr)
+
+
+class SpectrumRangeTests(TestCase):
+    """Function tests of splitting mzML files into ranges of spectra"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = TemporaryDirectory()
+        tmp_path = Path(cls.tmp_dir.name)
+        synthetic_analytes = write_analytes(tmp_path.joinpath("analytes.tsv"), 50)
+        cls.mzml_paths = [
+            tmp_path.joinpath("indexed.mzML"),
+            tmp_path.joinpath("unindexed.mzML"),
+            tmp_path.joinpath("compressed.mzML.gz"),
+        ]
+        write_mzml(cls.mzml_paths[0], synthetic_analytes, spectra=300, peaks=50)
+        write_mzml(
+            cls.mzml_paths[1], synthetic_analytes, spectra=300, indexed=False, seed=1
+        )
+        write_mzml(tmp_path.joinpath("compressed.mzML"), synthetic_analytes, seed=2)
+        cls.mzml_paths[2].write_bytes(
+            gzip.compress(tmp_path.joinpath("compressed.mzML").read_bytes())
+        )
+        with tmp_path.joinpath("analytes.tsv").open("r", encoding="utf-8") as file:
+            cls.analytes = AnalyteTable.from_tsv(file, 10.0, 10.0, 100.0, 100.0)
+
+    @classmethod
+    def tearDownClass(cls):
+        _worker_state.clear()
+        cls.tmp_dir.cleanup()
+
+    def test_plan_tasks(self):
+        """Only the window of plain files is split, the last range is marked"""
+        tasks = plan_tasks(self.mzml_paths, 40, RT_START, RT_STOP)
+        for mzml_path in self.mzml_paths[:2]:
+            with open_indexed_mzml(mzml_path) as reader:
+                window_start, window_stop = rt_window_range(
+                    mzml_path, reader, spectrum_ids(reader), RT_START, RT_STOP
+                )
+            ranges = [task for task in tasks if task[0] == mzml_path]
+            self.assertGreater(len(ranges), 1)
+            self.assertEqual(ranges[0][1], window_start)
+            self.assertEqual(ranges[-1][2], window_stop)
+            for previous, following in pairwise(ranges):
+                self.assertEqual(previous[2], following[1])
+            self.assertEqual(
+                [task[3] for task in ranges], [False] * (len(ranges) - 1) + [True]
+            )
+        # Compressed files can only be read sequentially
+        self.assertEqual(tasks[-1], (self.mzml_paths[2], None, None, True))
+        # Not split at all
+        self.assertEqual(len(plan_tasks(self.mzml_paths, 0, RT_START, RT_STOP)), 3)
+
+    def test_search_tasks(self):
+        """Searching the tasks one after another equals searching the files,
+        the reader of a split file is closed after its last range"""
+        expected = MatchTable(self.analytes)
+        for table in search_mzmls(
+            self.mzml_paths,
+            PrecursorIndex(self.analytes),
+            FragmentMatcher(self.analytes),
+            RT_START,
+            RT_STOP,
+        ):
+            expected.extend(table)
+
+        _init_worker(self.analytes, RT_START, RT_STOP, None, False, 0)
+        actual = MatchTable(self.analytes)
+        for task in plan_tasks(self.mzml_paths, 40, RT_START, RT_STOP):
+            table, _ = _search_task(task)
+            actual.extend(table)
+            if task[1] is not None and not task[3]:
+                reader = _worker_state["reader"][1]
+            if task[3]:
+                self.assertIsNone(_worker_state["reader"])
+        self.assertTrue(reader.file.closed)
+        pd.testing.assert_frame_equal(actual.to_dataframe(), expected.to_dataframe())
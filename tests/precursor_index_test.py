@@ -0,0 +1,56 @@
+"""Function tests of the precursor index"""
+
+import random
+from unittest import TestCase
+
+from macdii.analyte import Analyte
+from macdii.precursor_index import PrecursorIndex
+
+
+class PrecursorIndexTests(TestCase):
+    """Function tests of PrecursorIndex class"""
+
+    def test_candidates_equal_linear_scan(self):
+        """Candidates must be identical (including order) to testing every analyte"""
+        rng = random.Random(42)
+        analytes = [
+            Analyte(
+                f"test{idx}",
+                rng.uniform(100.0, 110.0),
+                50.0,
+                50.0,
+                rng.uniform(0.0, 5000.0),
+                rng.uniform(0.0, 5000.0),
+                5,
+                5,
+            )
+            for idx in range(500)
+        ]
+        index = PrecursorIndex(analytes)
+
+        queries = [rng.uniform(95.0, 115.0) for _ in range(2000)]
+        # on the limits
+        queries += [analyte.precursor_mz_range[0] for analyte in analytes]
+        queries += [analyte.precursor_mz_range[1] for analyte in analytes]
+
+        for mz in queries:
+            expected = [
+                analyte for analyte in analytes if analyte.precursor_contains(mz)
+            ]
+            self.assertEqual(index.candidates(mz), expected)
+
+    def test_overlapping_windows(self):
+        """A wide window must not hide narrow windows starting after it"""
+        wide = Analyte("wide", 100.0, 50.0, 50.0, 10000, 10000, 5, 5)
+        narrow = Analyte("narrow", 100.5, 50.0, 50.0, 5, 5, 5, 5)
+        index = PrecursorIndex([wide, narrow])
+
+        self.assertEqual(index.candidates(100.5), [wide, narrow])
+        self.assertEqual(index.candidates(100.9), [wide])
+        self.assertEqual(index.candidates(101.1), [])
+
+    def test_empty(self):
+        """Empty index returns no candidates"""
+        index = PrecursorIndex([])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.candidates(100.0), [])
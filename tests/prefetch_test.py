@@ -0,0 +1,63 @@
+"""Function tests of reading ahead in background threads"""
+
+import threading
+import time
+from unittest import TestCase
+
+from macdii.prefetch import prefetch
+
+
+class PrefetchTests(TestCase):
+    """Function tests of prefetch"""
+
+    def test_order(self):
+        """Items are transformed and yielded in order"""
+        for threads in (1, 3):
+            self.assertEqual(
+                list(prefetch(range(100), lambda x: x * 2, threads, queue_size=4)),
+                [x * 2 for x in range(100)],
+            )
+        self.assertEqual(list(prefetch(iter([]))), [])
+
+    def test_error(self):
+        """Errors of the background thread are raised in the caller"""
+
+        def items():
+            yield 1
+            raise ValueError("broken")
+
+        prefetched = prefetch(items())
+        self.assertEqual(next(prefetched), 1)
+        with self.assertRaises(ValueError):
+            next(prefetched)
+
+    def test_exit(self):
+        """SystemExit of the background thread is raised in the caller as well"""
+
+        def items():
+            yield 1
+            raise SystemExit(3)
+
+        prefetched = prefetch(items())
+        self.assertEqual(next(prefetched), 1)
+        with self.assertRaises(SystemExit):
+            next(prefetched)
+
+    def test_backpressure_and_close(self):
+        """At most the queue size is read ahead and closing stops the thread"""
+        produced = []
+
+        def items():
+            for item in range(1000):
+                produced.append(item)
+                yield item
+
+        threads_before = threading.active_count()
+        prefetched = prefetch(items(), queue_size=5)
+        self.assertEqual(next(prefetched), 0)
+        # 5 items in the queue, the next one waits for free space
+        time.sleep(0.5)
+        self.assertEqual(len(produced), 7)
+        prefetched.close()
+        self.assertLessEqual(len(produced), 7)
+        self.assertEqual(threading.active_count(), threads_before)
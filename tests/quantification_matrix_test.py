@@ -0,0 +1,84 @@
+"""Function tests of the per file quantification matrix"""
+
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from macdii.analyte import Analyte
+from macdii.analyte_match import MatchTable, SpectrumMatches
+from macdii.analyte_quantification import MATRIX_STATISTICS, QuantificationMatrix
+
+
+def random_table(analytes, filenames, rng: np.random.Generator) -> MatchTable:
+    """Match table with random matches of random analytes in the given files"""
+    table = MatchTable(analytes)
+    for scan in range(200):
+        count = int(rng.integers(1, 4))
+        table.append_spectrum(
+            table.add_file(filenames[int(rng.integers(len(filenames)))]),
+            SpectrumMatches(
+                f"scan={scan}",
+                100.0,
+                None,
+                rng.choice(len(analytes), count, replace=False).astype(np.int32),
+                np.full(count, 50.0),
+                rng.integers(1, 1000, count).astype(np.float64),
+                np.full(count, np.nan),
+                np.full(count, np.nan),
+            ),
+        )
+    return table
+
+
+class QuantificationMatrixTests(TestCase):
+    """Function tests of QuantificationMatrix class"""
+
+    def setUp(self):
+        # Two analytes share a name and are quantified together
+        self.analytes = [
+            Analyte(name, 100.0 + idx, 50.0, 60.0, 5, 5, 5, 5)
+            for idx, name in enumerate(["a", "b", "c", "a", "d", "unmatched"])
+        ]
+        rng = np.random.default_rng(0)
+        self.tables = [
+            random_table(self.analytes[:-1], ["x.mzML", "y.mzML"], rng),
+            random_table(self.analytes[:-1], ["z.mzML", "x.mzML"], rng),
+        ]
+        for table in self.tables:
+            table.analytes = self.analytes
+
+    def test_same_as_groupby(self):
+        """Statistics equal a pandas groupby of all matches by analyte and file"""
+        matrix = QuantificationMatrix(self.analytes, ["empty.mzML", "x.mzML"])
+        for table in self.tables:
+            matrix.add_table(table)
+        df = matrix.to_dataframe()
+
+        self.assertEqual(matrix.filenames, ["empty.mzML", "x.mzML", "y.mzML", "z.mzML"])
+        self.assertEqual(df["analyte"].tolist(), ["a", "b", "c", "d", "unmatched"])
+        self.assertEqual(
+            len(df.columns), 1 + len(MATRIX_STATISTICS) * len(matrix.filenames)
+        )
+
+        matches = pd.concat([table.to_dataframe() for table in self.tables])
+        expected = matches.groupby(["analyte", "filename"])[
+            "experimental_quantifier_intensity"
+        ].agg(["mean", "sum", "median", "count"])
+        for (analyte, filename), row in expected.iterrows():
+            actual = df[df["analyte"] == analyte].iloc[0]
+            self.assertAlmostEqual(actual[f"mean_intensity:{filename}"], row["mean"])
+            self.assertAlmostEqual(actual[f"sum_intensity:{filename}"], row["sum"])
+            self.assertEqual(actual[f"median_intensity:{filename}"], row["median"])
+            self.assertEqual(actual[f"count:{filename}"], row["count"])
+
+        # Cells without matches
+        self.assertEqual(df["count:empty.mzML"].tolist(), [0] * 5)
+        self.assertTrue(df["median_intensity:empty.mzML"].isna().all())
+        self.assertEqual(df.iloc[-1]["sum_intensity:x.mzML"], 0.0)
+
+    def test_empty(self):
+        """Without matches the table has only the analyte column"""
+        df = QuantificationMatrix(self.analytes).to_dataframe()
+        self.assertEqual(list(df.columns), ["analyte"])
+        self.assertEqual(len(df), 5)
@@ -0,0 +1,476 @@
+"""Function tests of searching synthetic mzML files"""
+
+import gzip
+from importlib.util import find_spec
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Iterable, List
+from unittest import TestCase, skipUnless
+
+import pandas as pd
+from pyteomics.mzml import read as read_mzml
+
+from benchmarks.synthetic import write_analytes, write_mzml, write_mzmlb
+from macdii.analyte import Analyte
+from macdii.analyte_match import MatchTable
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.metrics import Metrics
+from macdii.mzml_reader import (
+    has_offset_index,
+    is_mzmlb,
+    open_indexed_mzml,
+    rt_window_range,
+    scan_start_time,
+    spectrum_ids,
+)
+from macdii.parallel import search_mzmls_parallel
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzmls, search_spectra
+
+# Retention time window in seconds, the synthetic spectra are 0.6 seconds apart
+RT_START = 60.0
+RT_STOP = 150.0
+
+
+def concat(tables: Iterable[MatchTable], analytes: List[Analyte]) -> pd.DataFrame:
+    """Concatenate the match tables and convert them to a DataFrame"""
+    matches = MatchTable(analytes)
+    for table in tables:
+        matches.extend(table)
+    return matches.to_dataframe()
+
+
+class SearchTests(TestCase):
+    """Function tests of the different ways of searching mzML files"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = TemporaryDirectory()
+        tmp_path = Path(cls.tmp_dir.name)
+        synthetic_analytes = write_analytes(tmp_path.joinpath("analytes.tsv"), 50)
+        cls.mzml_paths = [
+            tmp_path.joinpath("sorted.mzML"),
+            tmp_path.joinpath("unsorted.mzML"),
+            tmp_path.joinpath("unindexed.mzML"),
+        ]
+        write_mzml(cls.mzml_paths[0], synthetic_analytes, spectra=300, peaks=50)
+        write_mzml(
+            cls.mzml_paths[1],
+            synthetic_analytes,
+            spectra=300,
+            peaks=50,
+            unsorted=True,
+            seed=1,
+        )
+        write_mzml(
+            cls.mzml_paths[2],
+            synthetic_analytes,
+            spectra=300,
+            peaks=50,
+            indexed=False,
+            seed=2,
+        )
+
+        with tmp_path.joinpath("analytes.tsv").open("r", encoding="utf-8") as file:
+            cls.analytes = Analyte.from_tsv(file, 10.0, 10.0, 100.0, 100.0)
+        cls.precursor_index = PrecursorIndex(cls.analytes)
+        cls.fragment_matcher = FragmentMatcher(cls.analytes)
+
+        # Reference: every spectrum of every file, read sequentially and fully decoded
+        tables = []
+        for mzml_path in cls.mzml_paths:
+            table = MatchTable(cls.analytes)
+            file_idx = table.add_file(mzml_path.name)
+            with read_mzml(str(mzml_path)) as reader:
+                for matches in search_spectra(
+                    reader,
+                    cls.precursor_index,
+                    cls.fragment_matcher,
+                    RT_START,
+                    RT_STOP,
+                ):
+                    table.append_spectrum(file_idx, matches)
+            tables.append(table)
+        cls.expected = concat(tables, cls.analytes)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_reference_has_matches(self):
+        """The synthetic files must produce matches of spectra within the window"""
+        self.assertGreater(len(self.expected), 50)
+        self.assertEqual(
+            set(self.expected["filename"]), {p.name for p in self.mzml_paths}
+        )
+
+    def test_rt_window_range(self):
+        """The window range spans the same spectra as a linear scan"""
+        self.assertTrue(has_offset_index(self.mzml_paths[0]))
+        self.assertFalse(has_offset_index(self.mzml_paths[2]))
+        with open_indexed_mzml(self.mzml_paths[0]) as reader:
+            ids = spectrum_ids(reader)
+            start, stop = rt_window_range(
+                self.mzml_paths[0], reader, ids, RT_START, RT_STOP
+            )
+        with read_mzml(str(self.mzml_paths[0])) as reader:
+            in_window = [
+                idx
+                for idx, spectrum in enumerate(reader)
+                if RT_START <= scan_start_time(spectrum) <= RT_STOP
+            ]
+        self.assertEqual((start, stop), (in_window[0], in_window[-1] + 1))
+
+    def test_search_mzmls(self):
+        """Searching with seeking and lazy decoding yields the reference matches"""
+        pd.testing.assert_frame_equal(
+            concat(
+                search_mzmls(
+                    self.mzml_paths,
+                    self.precursor_index,
+                    self.fragment_matcher,
+                    RT_START,
+                    RT_STOP,
+                    max_table_rows=7,
+                ),
+                self.analytes,
+            ),
+            self.expected,
+        )
+
+    def test_decode_candidates_only(self):
+        """Peaks are only decoded for spectra in the window with precursor candidates"""
+        decoded_ids = []
+
+        class DecodeRecorder:
+            """Binary array record, recording which spectrum was decoded"""
+
+            def __init__(self, record, spectrum_id):
+                self.record = record
+                self.spectrum_id = spectrum_id
+
+            def decode(self):
+                decoded_ids.append(self.spectrum_id)
+                return self.record.decode()
+
+        def recorded(spectra):
+            for spectrum in spectra:
+                for array_name in ("m/z array", "intensity array"):
+                    spectrum[array_name] = DecodeRecorder(
+                        spectrum[array_name], spectrum["id"]
+                    )
+                yield spectrum
+
+        mzml_path = self.mzml_paths[0]
+        table = MatchTable(self.analytes)
+        file_idx = table.add_file(mzml_path.name)
+        with read_mzml(str(mzml_path), decode_binary=False) as reader:
+            for matches in search_spectra(
+                recorded(reader),
+                self.precursor_index,
+                self.fragment_matcher,
+                RT_START,
+                RT_STOP,
+            ):
+                table.append_spectrum(file_idx, matches)
+
+        expected_ids = []
+        spectrum_count = 0
+        with read_mzml(str(mzml_path)) as reader:
+            for spectrum in reader:
+                spectrum_count += 1
+                if not RT_START <= scan_start_time(spectrum) <= RT_STOP:
+                    continue
+                if spectrum["ms level"] != 2:
+                    continue
+                precursor_mz = spectrum["precursorList"]["precursor"][0][
+                    "selectedIonList"
+                ]["selectedIon"][0]["selected ion m/z"]
+                if self.precursor_index.candidate_indices(precursor_mz):
+                    # m/z and intensity array
+                    expected_ids.extend([spectrum["id"]] * 2)
+        self.assertGreater(len(expected_ids), 0)
+        self.assertLess(len(expected_ids), 2 * spectrum_count)
+        self.assertEqual(decoded_ids, expected_ids)
+        pd.testing.assert_frame_equal(
+            table.to_dataframe(),
+            self.expected[self.expected["filename"] == mzml_path.name],
+        )
+
+    def test_unordered_scan_times(self):
+        """Files read sequentially are searched completely, even if a spectrum after
+        the window precedes the spectra within it"""
+        with TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            # The first spectrum of the unindexed file is moved after the window
+            content = (
+                self.mzml_paths[2]
+                .read_bytes()
+                .replace(
+                    b'name="scan start time" value="0.0"',
+                    b'name="scan start time" value="1000.0"',
+                    1,
+                )
+            )
+            mzml_paths = [
+                tmp_path.joinpath("unindexed.mzML"),
+                tmp_path.joinpath("compressed.mzML.gz"),
+            ]
+            mzml_paths[0].write_bytes(content)
+            mzml_paths[1].write_bytes(gzip.compress(content))
+            expected = self.expected[self.expected["filename"] == "unindexed.mzML"]
+            self.assertGreater(len(expected), 0)
+
+            for mzml_path in mzml_paths:
+                for reader_threads in (0, 1):
+                    with TemporaryDirectory() as cache_dir:
+                        for search_cache_dir in (None, Path(cache_dir)):
+                            matches = concat(
+                                search_mzmls(
+                                    [mzml_path],
+                                    self.precursor_index,
+                                    self.fragment_matcher,
+                                    RT_START,
+                                    RT_STOP,
+                                    cache_dir=search_cache_dir,
+                                    reader_threads=reader_threads,
+                                ),
+                                self.analytes,
+                            )
+                            matches["filename"] = "unindexed.mzML"
+                            pd.testing.assert_frame_equal(
+                                matches, expected.reset_index(drop=True)
+                            )
+
+    def test_unordered_scan_times_indexed(self):
+        """Indexed files, also when split into tasks, are searched completely,
+        even if spectra within the window are outside the ordered window"""
+        with TemporaryDirectory() as tmp_dir:
+            mzml_path = Path(tmp_dir).joinpath("indexed.mzML")
+            content = self.mzml_paths[0].read_bytes()
+            # Values of the same length, so the offset index stays valid
+            for old_time, new_time in (
+                (b'value="0.05"', b'value="1.05"'),
+                (b'value="1.5"', b'value="9.5"'),
+                (b'value="2.98"', b'value="1.98"'),
+            ):
+                self.assertEqual(content.count(old_time), 1)
+                content = content.replace(old_time, new_time)
+            mzml_path.write_bytes(content)
+            self.assertTrue(has_offset_index(mzml_path))
+
+            with open_indexed_mzml(mzml_path) as reader:
+                ids = spectrum_ids(reader)
+                self.assertEqual(
+                    rt_window_range(mzml_path, reader, ids, RT_START, RT_STOP),
+                    (5, 299),
+                )
+
+            table = MatchTable(self.analytes)
+            file_idx = table.add_file(mzml_path.name)
+            with read_mzml(str(mzml_path)) as reader:
+                for matches in search_spectra(
+                    reader,
+                    self.precursor_index,
+                    self.fragment_matcher,
+                    RT_START,
+                    RT_STOP,
+                ):
+                    table.append_spectrum(file_idx, matches)
+            expected = table.to_dataframe()
+            self.assertTrue((expected["spectrum_id"].str.endswith("scan=299")).any())
+
+            pd.testing.assert_frame_equal(
+                concat(
+                    search_mzmls(
+                        [mzml_path],
+                        self.precursor_index,
+                        self.fragment_matcher,
+                        RT_START,
+                        RT_STOP,
+                    ),
+                    self.analytes,
+                ),
+                expected,
+            )
+            pd.testing.assert_frame_equal(
+                concat(
+                    search_mzmls_parallel(
+                        [mzml_path],
+                        self.analytes,
+                        RT_START,
+                        RT_STOP,
+                        jobs=2,
+                        spectra_per_task=40,
+                    ),
+                    self.analytes,
+                ),
+                expected,
+            )
+
+    def test_search_reader_threads(self):
+        """Reading ahead in background threads yields the reference matches"""
+        for reader_threads in (1, 2):
+            pd.testing.assert_frame_equal(
+                concat(
+                    search_mzmls(
+                        self.mzml_paths,
+                        self.precursor_index,
+                        self.fragment_matcher,
+                        RT_START,
+                        RT_STOP,
+                        reader_threads=reader_threads,
+                    ),
+                    self.analytes,
+                ),
+                self.expected,
+            )
+
+    def test_search_cached(self):
+        """Searching the spectrum caches, when building and when reading them"""
+        with TemporaryDirectory() as cache_dir:
+            for _ in range(2):
+                pd.testing.assert_frame_equal(
+                    concat(
+                        search_mzmls(
+                            self.mzml_paths,
+                            self.precursor_index,
+                            self.fragment_matcher,
+                            RT_START,
+                            RT_STOP,
+                            cache_dir=Path(cache_dir),
+                        ),
+                        self.analytes,
+                    ),
+                    self.expected,
+                )
+
+    def test_search_parallel(self):
+        """Searching in parallel and split into spectrum ranges yields the reference matches"""
+        pd.testing.assert_frame_equal(
+            concat(
+                search_mzmls_parallel(
+                    self.mzml_paths,
+                    self.analytes,
+                    RT_START,
+                    RT_STOP,
+                    jobs=2,
+                    spectra_per_task=40,
+                ),
+                self.analytes,
+            ),
+            self.expected,
+        )
+
+    def test_metrics(self):
+        """Counters are the same when reading the mzML files or their caches"""
+        with TemporaryDirectory() as cache_dir:
+            counters = []
+            for search_cache_dir in (None, Path(cache_dir)):
+                metrics = Metrics()
+                for _ in search_mzmls(
+                    self.mzml_paths,
+                    self.precursor_index,
+                    self.fragment_matcher,
+                    RT_START,
+                    RT_STOP,
+                    cache_dir=search_cache_dir,
+                    metrics=metrics,
+                ):
+                    pass
+                counters.append(metrics.to_dict()["counters"])
+        self.assertEqual(counters[0]["matches_emitted"], len(self.expected))
+        self.assertEqual(
+            counters[0]["spectra_skipped_ms_level"],
+            counters[1]["spectra_skipped_ms_level"],
+        )
+        self.assertEqual(
+            counters[0]["candidate_analytes_tested"],
+            counters[1]["candidate_analytes_tested"],
+        )
+        self.assertEqual(counters[0]["matches_emitted"], counters[1]["matches_emitted"])
+
+
+@skipUnless(find_spec("h5py"), "h5py is not installed")
+class MzmlbSearchTests(TestCase):
+    """Function tests of searching mzMLb files"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = TemporaryDirectory()
+        cls.tmp_path = Path(cls.tmp_dir.name)
+        synthetic_analytes = write_analytes(cls.tmp_path.joinpath("analytes.tsv"), 50)
+        # Same spectra in both formats
+        cls.mzml_path = cls.tmp_path.joinpath("sample.mzML")
+        write_mzml(cls.mzml_path, synthetic_analytes, spectra=300, peaks=50)
+        cls.mzmlb_path = cls.tmp_path.joinpath("sample.mzMLb")
+        write_mzmlb(cls.mzmlb_path, synthetic_analytes, spectra=300, peaks=50)
+
+        with cls.tmp_path.joinpath("analytes.tsv").open("r", encoding="utf-8") as file:
+            cls.analytes = Analyte.from_tsv(file, 10.0, 10.0, 100.0, 100.0)
+        cls.precursor_index = PrecursorIndex(cls.analytes)
+        cls.fragment_matcher = FragmentMatcher(cls.analytes)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def search(self, mzml_path: Path, rt_start: float, **kwargs) -> pd.DataFrame:
+        """Matches of the file, with the filename of the mzML file"""
+        matches = concat(
+            search_mzmls(
+                [mzml_path],
+                self.precursor_index,
+                self.fragment_matcher,
+                rt_start,
+                RT_STOP,
+                **kwargs,
+            ),
+            self.analytes,
+        )
+        return matches.assign(
+            filename=matches["filename"].str.replace(".mzMLb", ".mzML", regex=False)
+        )
+
+    def test_search(self):
+        """mzMLb files yield the matches of the same mzML file, read fully or seeking"""
+        self.assertTrue(is_mzmlb(self.mzmlb_path))
+        self.assertTrue(has_offset_index(self.mzmlb_path))
+        # Reading from the beginning and seeking to the window
+        for rt_start in (0.0, RT_START):
+            expected = self.search(self.mzml_path, rt_start)
+            self.assertGreater(len(expected), 0)
+            pd.testing.assert_frame_equal(
+                self.search(self.mzmlb_path, rt_start), expected
+            )
+            with TemporaryDirectory() as cache_dir:
+                pd.testing.assert_frame_equal(
+                    self.search(self.mzmlb_path, rt_start, cache_dir=Path(cache_dir)),
+                    expected,
+                )
+
+    def test_search_parallel(self):
+        """mzMLb files are split into spectrum ranges like mzML files"""
+        pd.testing.assert_frame_equal(
+            concat(
+                search_mzmls_parallel(
+                    [self.mzmlb_path],
+                    self.analytes,
+                    RT_START,
+                    RT_STOP,
+                    jobs=2,
+                    spectra_per_task=40,
+                ),
+                self.analytes,
+            ),
+            concat(
+                search_mzmls(
+                    [self.mzmlb_path],
+                    self.precursor_index,
+                    self.fragment_matcher,
+                    RT_START,
+                    RT_STOP,
+                ),
+                self.analytes,
+            ),
+        )
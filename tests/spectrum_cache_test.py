@@ -0,0 +1,84 @@
+"""Function tests of the on-disk spectrum cache"""
+
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+import numpy as np
+from pyteomics.mzml import read as read_mzml
+
+from benchmarks.synthetic import write_analytes, write_mzml
+from macdii.mzml_reader import scan_start_time
+from macdii.spectrum_cache import CACHE_SUFFIX, META_FILE, SpectrumCache, cache_key
+
+
+class SpectrumCacheTests(TestCase):
+    """Function tests of building, reusing and rebuilding spectrum caches"""
+
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.synthetic_analytes = write_analytes(
+            self.tmp_path.joinpath("analytes.tsv"), 20
+        )
+        self.mzml_path = self.tmp_path.joinpath("sample.mzML")
+        write_mzml(self.mzml_path, self.synthetic_analytes, spectra=100, peaks=20)
+        self.cache_dir = self.tmp_path.joinpath("cache")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_content(self):
+        """The cache holds the metadata of every spectrum and the peaks of MS2 spectra"""
+        cache = SpectrumCache.open(self.mzml_path, self.cache_dir)
+        with read_mzml(str(self.mzml_path)) as reader:
+            spectra = list(reader)
+        self.assertEqual(len(cache), len(spectra))
+        self.assertEqual(cache.spectrum_ids, [spectrum["id"] for spectrum in spectra])
+        for spectrum_idx, spectrum in enumerate(spectra):
+            self.assertEqual(
+                cache.scan_start_times[spectrum_idx], scan_start_time(spectrum)
+            )
+            self.assertEqual(cache.ms_levels[spectrum_idx], spectrum["ms level"])
+            mz_array, intensity_array = cache.peaks(spectrum_idx)
+            if spectrum["ms level"] == 2:
+                np.testing.assert_array_equal(mz_array, spectrum["m/z array"])
+                np.testing.assert_array_equal(
+                    intensity_array, spectrum["intensity array"]
+                )
+            else:
+                self.assertTrue(np.isnan(cache.precursor_mzs[spectrum_idx]))
+                self.assertEqual(len(mz_array), 0)
+
+    def test_reuse_and_rebuild(self):
+        """An unchanged file reuses its cache, a changed file gets a new one"""
+        cache = SpectrumCache.open(self.mzml_path, self.cache_dir)
+        meta_mtime = cache.path.joinpath(META_FILE).stat().st_mtime_ns
+        self.assertEqual(
+            SpectrumCache.open(self.mzml_path, self.cache_dir).path, cache.path
+        )
+        self.assertEqual(cache.path.joinpath(META_FILE).stat().st_mtime_ns, meta_mtime)
+
+        # Rewritten with other spectra and a later modification time
+        key = cache_key(self.mzml_path)
+        write_mzml(
+            self.mzml_path, self.synthetic_analytes, spectra=100, peaks=20, seed=1
+        )
+        os.utime(self.mzml_path, ns=(0, meta_mtime + 1))
+        self.assertNotEqual(cache_key(self.mzml_path), key)
+        rebuilt = SpectrumCache.open(self.mzml_path, self.cache_dir)
+        self.assertNotEqual(rebuilt.path, cache.path)
+        self.assertEqual(
+            sorted(path.name for path in self.cache_dir.iterdir()),
+            sorted([cache.path.name, rebuilt.path.name]),
+        )
+        self.assertTrue(rebuilt.path.name.endswith(CACHE_SUFFIX))
+        with read_mzml(str(self.mzml_path)) as reader:
+            spectra = list(reader)
+        ms2_idx = next(
+            idx for idx, spectrum in enumerate(spectra) if spectrum["ms level"] == 2
+        )
+        np.testing.assert_array_equal(
+            rebuilt.peaks(ms2_idx)[0], spectra[ms2_idx]["m/z array"]
+        )
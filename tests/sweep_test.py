@@ -0,0 +1,94 @@
+"""Function tests of the parameter sweep"""
+
+import io
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from benchmarks.synthetic import write_analytes, write_mzml
+from macdii.analyte import Analyte
+from macdii.analyte_quantification import RunningQuantification
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzmls
+from macdii.sweep import SweepConfiguration, sweep_mzmls
+
+
+class SweepTests(TestCase):
+    """Function tests of the parameter sweep"""
+
+    def test_grid(self):
+        """The grid contains all combinations once"""
+        configurations = SweepConfiguration.grid(
+            [(0.0, 100.0), (10.0, 50.0)], [(5.0, 5.0), (5.0, 5.0)], [(10.0, 20.0)]
+        )
+        self.assertEqual(len(configurations), 2)
+        self.assertEqual(configurations[1].name, "rt10-50_prec5-5_frag10-20")
+
+    def test_same_as_single_runs(self):
+        """Each configuration is quantified like a run with its parameters"""
+        with TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            analytes_path = tmp_path.joinpath("analytes.tsv")
+            synthetic_analytes = write_analytes(analytes_path, 50)
+            mzml_paths = [tmp_path.joinpath("a.mzML"), tmp_path.joinpath("b.mzML")]
+            write_mzml(mzml_paths[0], synthetic_analytes, spectra=300, peaks=50)
+            write_mzml(
+                mzml_paths[1],
+                synthetic_analytes,
+                spectra=300,
+                peaks=50,
+                indexed=False,
+                seed=1,
+            )
+            # Read sequentially, with the first spectrum moved after all windows
+            mzml_paths.append(tmp_path.joinpath("c.mzML"))
+            mzml_paths[2].write_bytes(
+                mzml_paths[1]
+                .read_bytes()
+                .replace(
+                    b'name="scan start time" value="0.0"',
+                    b'name="scan start time" value="1000.0"',
+                    1,
+                )
+            )
+            analytes_tsv = analytes_path.read_text(encoding="utf-8")
+
+            configurations = SweepConfiguration.grid(
+                [(0.0, 200.0), (60.0, 150.0)],
+                [(2.0, 2.0), (10.0, 10.0)],
+                [(20.0, 20.0), (100.0, 50.0)],
+            )
+            quantifications = sweep_mzmls(mzml_paths, analytes_tsv, configurations)
+
+            for configuration, sweep_quantifications in zip(
+                configurations, quantifications
+            ):
+                analytes = Analyte.from_tsv(
+                    io.StringIO(analytes_tsv),
+                    configuration.precursor_tol_lower,
+                    configuration.precursor_tol_upper,
+                    configuration.fragment_tol_lower,
+                    configuration.fragment_tol_upper,
+                )
+                expected = RunningQuantification(analytes)
+                for table in search_mzmls(
+                    mzml_paths,
+                    PrecursorIndex(analytes),
+                    FragmentMatcher(analytes),
+                    configuration.rt_start,
+                    configuration.rt_stop,
+                ):
+                    expected.add_table(table)
+
+                self.assertEqual(
+                    [
+                        (quant.analyte.name, quant.average_intensity, quant.count)
+                        for quant in sweep_quantifications
+                    ],
+                    [
+                        (quant.analyte.name, quant.average_intensity, quant.count)
+                        for quant in expected.quantifications()
+                    ],
+                    configuration.name,
+                )
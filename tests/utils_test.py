@@ -0,0 +1,207 @@
+"""Function tests of utility functions"""
+
+import csv
+from importlib.util import find_spec
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+
+import numpy as np
+import pandas as pd
+
+from macdii.utils import (
+    XLSX_MAX_COLUMNS,
+    TableWriter,
+    XlsxTableWriter,
+    columns_to_dataframe,
+    columns_to_file,
+    dataframe_from_file,
+    open_table_writer,
+)
+
+COLUMNS = ("name", "mz", "charge", "intensity", "optional")
+
+DTYPES = {
+    "name": "string",
+    "mz": "float64",
+    "charge": "Int64",
+    "intensity": "float64",
+    "optional": "float64",
+}
+
+ROWS = [
+    ["foo", 100.123456789, 2, np.float32(6599.517), None],
+    ["bar", np.float64(200.5), np.int64(1), np.float32(1.0), 0.5],
+]
+
+COLUMN_VALUES = {
+    "name": np.array(["foo", "bar"], dtype=object),
+    "mz": np.array([100.123456789, 200.5]),
+    "charge": np.ma.MaskedArray([2, 0], [False, True]),
+    "intensity": [6599.517, 1.0],
+    "optional": np.array([np.nan, 0.5]),
+}
+
+
+class TableWriterTests(TestCase):
+    """Function tests of the table writers"""
+
+    def test_tsv_like_dataframe(self):
+        """Writing columns in parts must produce the same TSV as pandas"""
+        with TemporaryDirectory() as tmp_dir:
+            dataframe_path = Path(tmp_dir).joinpath("dataframe.tsv")
+            columns_path = Path(tmp_dir).joinpath("columns.tsv")
+
+            pd.DataFrame(ROWS, columns=COLUMNS).to_csv(
+                dataframe_path, sep="\t", quoting=csv.QUOTE_NONNUMERIC, index=False
+            )
+            with open_table_writer(columns_path, COLUMNS) as writer:
+                for row in ROWS:
+                    writer.write_columns(
+                        {column: [value] for column, value in zip(COLUMNS, row)}
+                    )
+
+            self.assertEqual(
+                columns_path.read_text(encoding="utf-8"),
+                dataframe_path.read_text(encoding="utf-8"),
+            )
+
+    @skipUnless(find_spec("pyarrow"), "pyarrow is not installed")
+    def test_arrow_like_dataframe(self):
+        """Parquet and Arrow IPC files have typed columns, written in parts or at once"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        expected = pd.DataFrame(ROWS, columns=COLUMNS).astype(DTYPES)
+        with TemporaryDirectory() as tmp_dir:
+            for suffix in (".parquet", ".feather"):
+                columns_path = Path(tmp_dir).joinpath(f"columns{suffix}")
+                parts_path = Path(tmp_dir).joinpath(f"parts{suffix}")
+
+                columns_to_file(
+                    {
+                        column: [row[column_idx] for row in ROWS]
+                        for column_idx, column in enumerate(COLUMNS)
+                    },
+                    columns_path,
+                    DTYPES,
+                )
+                with open_table_writer(parts_path, COLUMNS, DTYPES) as writer:
+                    for row in ROWS:
+                        writer.write_columns(
+                            {column: [value] for column, value in zip(COLUMNS, row)}
+                        )
+
+                for path in (columns_path, parts_path):
+                    if suffix == ".parquet":
+                        table = pq.read_table(path)
+                    else:
+                        table = pa.ipc.open_file(str(path)).read_all()
+                    self.assertEqual(table.schema.field("name").type, pa.string())
+                    self.assertEqual(table.schema.field("charge").type, pa.int64())
+                    pd.testing.assert_frame_equal(
+                        table.to_pandas().astype(DTYPES), expected
+                    )
+
+    def test_columns_like_dataframe(self):
+        """Writing columns must produce the same TSV as pandas"""
+        dataframe = columns_to_dataframe(COLUMN_VALUES)
+        self.assertEqual(dataframe["charge"].dtype, "Int64")
+        self.assertTrue(dataframe["charge"].isna().iloc[1])
+        with TemporaryDirectory() as tmp_dir:
+            dataframe_path = Path(tmp_dir).joinpath("dataframe.tsv")
+            columns_path = Path(tmp_dir).joinpath("columns.tsv")
+
+            dataframe.to_csv(
+                dataframe_path, sep="\t", quoting=csv.QUOTE_NONNUMERIC, index=False
+            )
+            columns_to_file(COLUMN_VALUES, columns_path)
+
+            self.assertEqual(
+                columns_path.read_text(encoding="utf-8"),
+                dataframe_path.read_text(encoding="utf-8"),
+            )
+
+    @skipUnless(find_spec("pyarrow"), "pyarrow is not installed")
+    def test_arrow_columns_like_dataframe(self):
+        """Columns written to Parquet and Arrow IPC files have nulls for missing values"""
+        expected = columns_to_dataframe(COLUMN_VALUES).astype(DTYPES)
+        with TemporaryDirectory() as tmp_dir:
+            for suffix in (".parquet", ".feather"):
+                columns_path = Path(tmp_dir).joinpath(f"columns{suffix}")
+                columns_to_file(COLUMN_VALUES, columns_path, DTYPES)
+                dataframe = (
+                    pd.read_parquet(columns_path)
+                    if suffix == ".parquet"
+                    else pd.read_feather(columns_path)
+                )
+                pd.testing.assert_frame_equal(dataframe.astype(DTYPES), expected)
+
+    def test_xlsx_like_dataframe(self):
+        """Excel files written in parts or as columns read back like pandas' file"""
+        expected = pd.DataFrame(ROWS, columns=COLUMNS).astype(DTYPES)
+        with TemporaryDirectory() as tmp_dir:
+            dataframe_path = Path(tmp_dir).joinpath("dataframe.xlsx")
+            parts_path = Path(tmp_dir).joinpath("parts.xlsx")
+            columns_path = Path(tmp_dir).joinpath("columns.xlsx")
+
+            pd.DataFrame(ROWS, columns=COLUMNS).to_excel(dataframe_path, index=False)
+            with open_table_writer(parts_path, COLUMNS) as writer:
+                for row in ROWS:
+                    writer.write_columns(
+                        {column: [value] for column, value in zip(COLUMNS, row)}
+                    )
+            columns_to_file(COLUMN_VALUES, columns_path)
+
+            for path in (dataframe_path, parts_path):
+                pd.testing.assert_frame_equal(
+                    dataframe_from_file(path, DTYPES), expected
+                )
+            pd.testing.assert_frame_equal(
+                dataframe_from_file(columns_path, DTYPES),
+                columns_to_dataframe(COLUMN_VALUES).astype(DTYPES),
+            )
+
+    def test_xlsx_sheet_rollover(self):
+        """Rows beyond the sheet limit continue on new sheets with the header"""
+        rows = [[f"row{idx}", float(idx), idx, 1.0, None] for idx in range(10)]
+        with TemporaryDirectory() as tmp_dir:
+            file_path = Path(tmp_dir).joinpath("table.xlsx")
+            with XlsxTableWriter(file_path, COLUMNS, max_sheet_rows=4) as writer:
+                writer.write_columns(
+                    {column: [value] for column, value in zip(COLUMNS, rows[0])}
+                )
+                writer.write_columns(
+                    {
+                        column: [row[column_idx] for row in rows[1:]]
+                        for column_idx, column in enumerate(COLUMNS)
+                    }
+                )
+                # 3 rows and the header per sheet
+                self.assertEqual(writer.sheet_count, 4)
+
+            sheets = pd.read_excel(file_path, sheet_name=None)
+            self.assertEqual(list(sheets), ["Sheet1", "Sheet2", "Sheet3", "Sheet4"])
+            self.assertEqual([len(sheet) for sheet in sheets.values()], [3, 3, 3, 1])
+            pd.testing.assert_frame_equal(
+                dataframe_from_file(file_path, DTYPES),
+                pd.DataFrame(rows, columns=COLUMNS).astype(DTYPES),
+            )
+
+    def test_xlsx_column_limit(self):
+        """Tables wider than an Excel sheet are rejected"""
+        with TemporaryDirectory() as tmp_dir, self.assertRaises(ValueError):
+            open_table_writer(
+                Path(tmp_dir).joinpath("table.xlsx"),
+                [f"column{idx}" for idx in range(XLSX_MAX_COLUMNS + 1)],
+            )
+
+    def test_abstract_writer(self):
+        """Only the writers of the file types can be created"""
+        with self.assertRaises(TypeError):
+            TableWriter(Path("table.tsv"), COLUMNS)
+
+    def test_unknown_type(self):
+        """Unknown file types are rejected"""
+        with TemporaryDirectory() as tmp_dir, self.assertRaises(ValueError):
+            open_table_writer(Path(tmp_dir).joinpath("table.foo"), COLUMNS)
@@ -0,0 +1,192 @@
+"""Function tests of watching a folder for mzML files"""
+
+import gzip
+import io
+import os
+import shutil
+from contextlib import redirect_stderr
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from benchmarks.synthetic import write_analytes, write_mzml
+from macdii.analyte_match import AnalyteMatch, MatchTable
+from macdii.analyte_quantification import AnalyteQuantification
+from macdii.analyte_table import AnalyteTable
+from macdii.fragment_matcher import FragmentMatcher
+from macdii.precursor_index import PrecursorIndex
+from macdii.search import search_mzmls
+from macdii.watch import FolderWatcher, LiveQuantification, watch_folder
+
+
+class WatchTests(TestCase):
+    """Function tests of the folder watcher and the live quantification"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = TemporaryDirectory()
+        cls.tmp_path = Path(cls.tmp_dir.name)
+        synthetic_analytes = write_analytes(cls.tmp_path.joinpath("analytes.tsv"), 50)
+        cls.mzml_paths = [cls.tmp_path.joinpath(f"{idx}.mzML") for idx in range(3)]
+        for idx, mzml_path in enumerate(cls.mzml_paths):
+            write_mzml(mzml_path, synthetic_analytes, spectra=200, peaks=50, seed=idx)
+        with cls.tmp_path.joinpath("analytes.tsv").open("r", encoding="utf-8") as file:
+            cls.analytes = AnalyteTable.from_tsv(file, 10.0, 10.0, 100.0, 100.0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_folder_watcher(self):
+        """Files are reported once, after they are complete and unchanged"""
+        with TemporaryDirectory() as watch_dir:
+            watcher = FolderWatcher(Path(watch_dir), settle_time=0.0)
+            partial_path = Path(watch_dir).joinpath("0.mzML")
+            content = self.mzml_paths[0].read_bytes()
+            partial_path.write_bytes(content[: len(content) // 2])
+            Path(watch_dir).joinpath(".1.mzML").write_bytes(content)
+
+            self.assertEqual(watcher.poll(), [])
+            # Unchanged, but without closing tag
+            self.assertEqual(watcher.poll(), [])
+
+            partial_path.write_bytes(content)
+            # Changed since the previous poll
+            self.assertEqual(watcher.poll(), [])
+            self.assertEqual(watcher.poll(), [partial_path])
+            self.assertEqual(watcher.poll(), [])
+
+    def test_settle_time(self):
+        """Recently modified files are not reported"""
+        with TemporaryDirectory() as watch_dir:
+            watcher = FolderWatcher(Path(watch_dir), settle_time=3600.0)
+            shutil.copy(self.mzml_paths[0], watch_dir)
+            self.assertEqual(watcher.poll(), [])
+            self.assertEqual(watcher.poll(), [])
+
+    def test_watch_folder(self):
+        """Files landing one by one are quantified like a single run over all files"""
+        with TemporaryDirectory() as watch_dir, TemporaryDirectory() as output_dir:
+            # Older files first, the watcher searches them in order of modification
+            for idx, mzml_path in enumerate(self.mzml_paths):
+                copy_path = Path(shutil.copy(mzml_path, watch_dir))
+                os.utime(copy_path, (1000.0 + idx, 1000.0 + idx))
+
+            with LiveQuantification(
+                self.analytes, Path(output_dir), "tsv", 0.0, 1000.0
+            ) as live_quantification:
+                watch_folder(
+                    FolderWatcher(Path(watch_dir), settle_time=0.0),
+                    live_quantification,
+                    poll_interval=0.01,
+                    idle_timeout=0.2,
+                )
+            self.assertEqual(
+                live_quantification.filenames,
+                [mzml_path.name for mzml_path in self.mzml_paths],
+            )
+
+            matches = MatchTable(self.analytes)
+            for table in search_mzmls(
+                self.mzml_paths,
+                PrecursorIndex(self.analytes),
+                FragmentMatcher(self.analytes),
+                0.0,
+                1000.0,
+            ):
+                matches.extend(table)
+            expected_path = Path(output_dir).joinpath("expected")
+            expected_path.mkdir()
+            AnalyteMatch.to_file(expected_path.joinpath("matches.tsv"), matches)
+            AnalyteQuantification.to_file(
+                expected_path.joinpath("quantification.tsv"),
+                AnalyteQuantification.from_matches(matches),
+            )
+
+            for actual_name, expected_name in (
+                ("quanitfier_matches.tsv", "matches.tsv"),
+                ("quantification.tsv", "quantification.tsv"),
+            ):
+                self.assertEqual(
+                    Path(output_dir).joinpath(actual_name).read_text(encoding="utf-8"),
+                    expected_path.joinpath(expected_name).read_text(encoding="utf-8"),
+                )
+
+    def test_truncated_file(self):
+        """Files failing to be searched are reported and skipped, watching goes on,
+        the outputs contain nothing of the skipped file"""
+        with TemporaryDirectory() as watch_dir, TemporaryDirectory() as output_dir:
+            # Compressed files are assumed to be complete
+            compressed = gzip.compress(self.mzml_paths[0].read_bytes())
+            truncated_path = Path(watch_dir).joinpath("truncated.mzML.gz")
+            truncated_path.write_bytes(compressed[: len(compressed) // 2])
+            os.utime(truncated_path, (1000.0, 1000.0))
+            copy_path = Path(shutil.copy(self.mzml_paths[1], watch_dir))
+            os.utime(copy_path, (1001.0, 1001.0))
+
+            # Small tables, so the truncated file yields matches before failing
+            yielded_filenames = []
+
+            def search_small_tables(*args, **kwargs):
+                for table in search_mzmls(*args, **kwargs, max_table_rows=10):
+                    yielded_filenames.extend(table.filenames)
+                    yield table
+
+            watcher = FolderWatcher(Path(watch_dir), settle_time=0.0)
+            stderr = io.StringIO()
+            with (
+                patch("macdii.watch.search_mzmls", search_small_tables),
+                LiveQuantification(
+                    self.analytes,
+                    Path(output_dir),
+                    "tsv",
+                    0.0,
+                    1000.0,
+                    quantification_matrix=True,
+                ) as live_quantification,
+                redirect_stderr(stderr),
+            ):
+                watch_folder(
+                    watcher, live_quantification, poll_interval=0.01, idle_timeout=0.2
+                )
+            self.assertIn("truncated.mzML", yielded_filenames)
+            self.assertEqual(live_quantification.filenames, [copy_path.name])
+            self.assertIn("truncated.mzML.gz: skipped", stderr.getvalue())
+            self.assertEqual(stderr.getvalue().count("truncated.mzML.gz"), 1)
+            # Not retried
+            self.assertEqual(watcher.poll(), [])
+
+            matrix_header = (
+                Path(output_dir)
+                .joinpath("quantification_matrix.tsv")
+                .read_text(encoding="utf-8")
+                .splitlines()[0]
+            )
+            self.assertIn(copy_path.name, matrix_header)
+            self.assertNotIn("truncated", matrix_header)
+            matches = Path(output_dir).joinpath("quanitfier_matches.tsv")
+            self.assertIn(copy_path.name, matches.read_text(encoding="utf-8"))
+            self.assertNotIn("truncated", matches.read_text(encoding="utf-8"))
+
+    def test_unexpected_error(self):
+        """Errors other than reading errors stop watching"""
+
+        def search_failing(*args, **kwargs):
+            raise TypeError("unexpected")
+
+        with TemporaryDirectory() as watch_dir, TemporaryDirectory() as output_dir:
+            shutil.copy(self.mzml_paths[0], watch_dir)
+            with (
+                patch("macdii.watch.search_mzmls", search_failing),
+                LiveQuantification(
+                    self.analytes, Path(output_dir), "tsv", 0.0, 1000.0
+                ) as live_quantification,
+                self.assertRaises(TypeError),
+            ):
+                watch_folder(
+                    FolderWatcher(Path(watch_dir), settle_time=0.0),
+                    live_quantification,
+                    poll_interval=0.01,
+                    idle_timeout=0.2,
+                )